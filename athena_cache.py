@@ -0,0 +1,321 @@
+"""
+Athena result cache
+
+Sits in front of ``athena_client`` so repeated analytics and dashboard queries
+do not rescan (and rebill) unchanged data. Results are keyed by the normalized
+SQL text plus the watermark of every table the query reads:
+
+    athena-cache/{sha256(database, sql, watermarks)}.parquet
+
+A table's watermark is the ETag of its commit pointer: the snapshot log's
+``current.json`` for processed tables (see ``table_commits``), the CDC state
+file for external source tables, or the refresh state of a materialized
+QuickSight table (see ``materialized_views``). Any commit that lands new partitions changes
+the ETag, so the next lookup misses and stale entries are simply never read
+again (expire the prefix with an S3 lifecycle rule). Results live as Parquet
+in S3, shared by every Lambda and script, with a size-bounded LRU copy on
+local disk (``/tmp`` in Lambda, which survives warm invocations).
+
+The analytics Lambdas (drought, water security, NDVI, community and carbon)
+run the same SQL on every scheduled invocation; they read through
+``cached_query``, which keeps one cache per warm container.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+from athena_client import DEFAULT_TIMEOUT_SECONDS, AthenaClient
+from materialized_views import TABLE_PREFIX as MATERIALIZED_TABLE_PREFIX, state_key as materialized_state_key
+from table_commits import manifest_prefix
+
+logger = logging.getLogger()
+
+CACHE_BUCKET = 'africlimate-analytics-lake'
+CACHE_PREFIX = 'athena-cache/'
+LOCAL_CACHE_DIR = os.environ.get('ATHENA_CACHE_DIR', '/tmp/athena_cache')
+LOCAL_CACHE_MAX_BYTES = int(os.environ.get('ATHENA_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+# Commit pointer of the external source tables (scripts/source_cdc.py)
+CDC_STATE_PREFIX = 'real-data/_cdc/'
+EXTERNAL_TABLE_PREFIX = 'external_'
+
+CACHEABLE_STATEMENTS = ('select', 'with')
+
+# Functions whose arguments use FROM without reading a table, e.g. extract(year FROM d)
+FROM_ARGUMENT_FUNCTIONS = ('extract', 'substring', 'trim', 'overlay')
+
+
+def normalize_sql(sql):
+    """
+    Canonical form of a query: comments dropped, whitespace collapsed,
+    lower-cased outside string literals, no trailing semicolon
+    """
+    parts = re.split(r"('(?:[^']|'')*')", sql)
+    normalized = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            normalized.append(part)
+            continue
+        part = re.sub(r'--[^\n]*', ' ', part)
+        part = re.sub(r'/\*.*?\*/', ' ', part, flags=re.DOTALL)
+        normalized.append(re.sub(r'\s+', ' ', part.lower()))
+    return ''.join(normalized).strip().rstrip(';').strip()
+
+
+def referenced_tables(normalized_sql):
+    """Tables a normalized query reads (without database prefix), CTE names excluded"""
+    unquoted = re.sub(r"'(?:[^']|'')*'", "''", normalized_sql).replace('"', '').replace('`', '')
+    ctes = set(re.findall(r'(?:\bwith|,)\s*([a-z_]\w*)\s+as\s*\(', unquoted))
+    tables = set()
+    for match in re.finditer(r'\b(?:from|join)\s+([a-z_][\w.]*)', unquoted):
+        table = match.group(1).split('.')[-1]
+        if table not in ctes and not _in_from_argument(unquoted, match.start()):
+            tables.add(table)
+    return sorted(tables)
+
+
+def _in_from_argument(sql, index):
+    """True when position ``index`` sits directly inside a call like extract(... from ...)"""
+    depth = 0
+    for i in range(index - 1, -1, -1):
+        if sql[i] == ')':
+            depth += 1
+        elif sql[i] == '(':
+            if depth == 0:
+                function = re.search(r'(\w+)\s*$', sql[:i])
+                return bool(function) and function.group(1) in FROM_ARGUMENT_FUNCTIONS
+            depth -= 1
+    return False
+
+
+def watermark_keys(table_name):
+    """Objects whose ETag changes whenever the table gets new data"""
+    keys = [f"{manifest_prefix(table_name)}current.json"]
+    if table_name.startswith(EXTERNAL_TABLE_PREFIX):
+        dataset = table_name[len(EXTERNAL_TABLE_PREFIX):]
+        if dataset.endswith('_latest'):
+            dataset = dataset[:-len('_latest')]
+        keys.append(f"{CDC_STATE_PREFIX}{dataset}/state.json")
+    if table_name.startswith(MATERIALIZED_TABLE_PREFIX):
+        keys.append(materialized_state_key(table_name[len(MATERIALIZED_TABLE_PREFIX):]))
+    return keys
+
+
+class QueryResultCache:
+    """
+    Cached query execution
+
+    ``query`` returns ``(table, info)``. ``info['cache']`` is 'local' or 's3'
+    for hits (no query started), 'miss' when the query ran and was stored,
+    or 'bypass' for statements that are not cacheable: anything other than
+    SELECT/WITH, or reads of a table without a watermark unless the caller
+    accepts a ``ttl_seconds`` staleness bound instead.
+    """
+
+    def __init__(self, athena=None, s3_client=None, bucket=CACHE_BUCKET,
+                 local_dir=LOCAL_CACHE_DIR, max_local_bytes=LOCAL_CACHE_MAX_BYTES):
+        import boto3
+
+        self.athena = athena or AthenaClient()
+        self.s3 = s3_client or boto3.client('s3')
+        self.bucket = bucket
+        self.local_dir = local_dir
+        self.max_local_bytes = max_local_bytes
+        os.makedirs(local_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.counts = {'local': 0, 's3': 0, 'miss': 0, 'bypass': 0, 'bytes_saved': 0}
+
+    def table_watermark(self, table_name):
+        """ETag of the table's commit pointer, or None if it has none"""
+        for key in watermark_keys(table_name):
+            try:
+                return self.s3.head_object(Bucket=self.bucket, Key=key)['ETag'].strip('"')
+            except ClientError as e:
+                if e.response['Error']['Code'] not in ('404', 'NoSuchKey', 'NotFound'):
+                    raise
+        return None
+
+    def cache_key(self, sql, ttl_seconds=None):
+        """
+        (key, watermarks) for a query, or (None, watermarks) if it cannot be
+        cached
+        """
+        normalized = normalize_sql(sql)
+        if not normalized.startswith(CACHEABLE_STATEMENTS):
+            return None, {}
+
+        watermarks = {table: self.table_watermark(table) for table in referenced_tables(normalized)}
+        if None in watermarks.values():
+            if not ttl_seconds:
+                return None, watermarks
+            # Tables without commits are bounded by time instead
+            bucket = int(time.time() // ttl_seconds)
+            watermarks = {t: w or f"ttl-{ttl_seconds}-{bucket}" for t, w in watermarks.items()}
+
+        material = json.dumps({
+            'database': self.athena.database,
+            'sql': normalized,
+            'watermarks': watermarks
+        }, sort_keys=True)
+        return hashlib.sha256(material.encode()).hexdigest(), watermarks
+
+    def query(self, sql, ttl_seconds=None, timeout=DEFAULT_TIMEOUT_SECONDS, output_location=None):
+        """Results of ``sql`` as an Arrow table, from the cache when the inputs are unchanged"""
+        key, watermarks = self.cache_key(sql, ttl_seconds)
+        info = {'cache': 'bypass', 'key': key, 'watermarks': watermarks,
+                'query_execution_id': None, 'bytes_scanned': 0}
+
+        if key is None:
+            table, stats = self.athena.query_arrow(sql, output_location, timeout)
+            self._count('bypass')
+            return table, {**info, 'query_execution_id': stats['query_execution_id'],
+                           'bytes_scanned': stats['bytes_scanned']}
+
+        cached = self._read_local(key)
+        if cached is not None:
+            return self._hit('local', cached, info)
+        cached = self._read_s3(key)
+        if cached is not None:
+            self._write_local(key, cached)
+            return self._hit('s3', cached, info)
+
+        table, stats = self.athena.query_arrow(sql, output_location, timeout)
+        body = self._encode(table, stats, watermarks)
+        self.s3.put_object(
+            Bucket=self.bucket, Key=f"{CACHE_PREFIX}{key}.parquet", Body=body,
+            ContentType='application/vnd.apache.parquet'
+        )
+        self._write_local(key, body)
+        self._count('miss')
+        return table, {**info, 'cache': 'miss', 'query_execution_id': stats['query_execution_id'],
+                       'bytes_scanned': stats['bytes_scanned']}
+
+    def query_many(self, queries, ttl_seconds=None, timeout=DEFAULT_TIMEOUT_SECONDS):
+        """
+        ``query`` for many queries at once, at most the client's
+        ``max_concurrency`` at a time. Each query is SQL or a dict with
+        ``sql`` and optional ``output_location``. Returns one entry per
+        query, in order: ``(table, info)``, or the exception it raised.
+        """
+        def run(query):
+            if isinstance(query, str):
+                query = {'sql': query}
+            try:
+                return self.query(query['sql'], ttl_seconds, timeout, query.get('output_location'))
+            except Exception as e:
+                logger.error(f"Athena query failed: {str(e)}")
+                return e
+
+        queries = list(queries)
+        if not queries:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.athena.max_concurrency, len(queries))) as executor:
+            return list(executor.map(run, queries))
+
+    def _hit(self, tier, body, info):
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(io.BytesIO(body))
+        metadata = table.schema.metadata or {}
+        saved = int(metadata.get(b'bytes_scanned', b'0'))
+        with self._lock:
+            self.counts[tier] += 1
+            self.counts['bytes_saved'] += saved
+        logger.info(f"Athena cache {tier} hit {info['key'][:12]} ({saved} bytes not rescanned)")
+        return table.replace_schema_metadata(None), {
+            **info, 'cache': tier,
+            'query_execution_id': metadata.get(b'query_execution_id', b'').decode() or None
+        }
+
+    def _encode(self, table, stats, watermarks):
+        import pyarrow.parquet as pq
+
+        table = table.replace_schema_metadata({
+            'query_execution_id': stats['query_execution_id'],
+            'bytes_scanned': str(stats['bytes_scanned']),
+            'watermarks': json.dumps(watermarks, sort_keys=True),
+            'cached_at': str(time.time())
+        })
+        buffer = io.BytesIO()
+        pq.write_table(table, buffer, compression='snappy')
+        return buffer.getvalue()
+
+    def _count(self, status):
+        with self._lock:
+            self.counts[status] += 1
+
+    def _local_path(self, key):
+        return os.path.join(self.local_dir, f"{key}.parquet")
+
+    def _read_local(self, key):
+        path = self._local_path(key)
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)  # mark as recently used
+        return body
+
+    def _read_s3(self, key):
+        try:
+            response = self.s3.get_object(Bucket=self.bucket, Key=f"{CACHE_PREFIX}{key}.parquet")
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return None
+            raise
+        return response['Body'].read()
+
+    def _write_local(self, key, body):
+        path = self._local_path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(body)
+        os.replace(temp_path, path)
+        self._evict()
+
+    def _evict(self):
+        """Drop the least recently used local entries until the tier fits in max_local_bytes"""
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.local_dir):
+                if not name.endswith('.parquet'):
+                    continue
+                stat = os.stat(os.path.join(self.local_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_local_bytes:
+                    break
+                os.remove(os.path.join(self.local_dir, name))
+                total -= size
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def cached_query(sql, ttl_seconds=None, timeout=DEFAULT_TIMEOUT_SECONDS):
+    """
+    ``QueryResultCache.query`` on a cache created on first use and reused by
+    later invocations of a warm Lambda, so repeated reads of unchanged tables
+    start no query and the local tier stays populated
+    """
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = QueryResultCache()
+    return _shared_cache.query(sql, ttl_seconds, timeout)
@@ -0,0 +1,276 @@
+"""
+Shared Athena query client
+
+Starts queries, waits for them with exponential backoff (the first check comes
+after a fraction of a second, later ones back off to a few seconds), and
+streams results page by page into Arrow record batches. A semaphore caps how
+many queries run at once so callers fanning out many queries stay within the
+workgroup's active-query quota instead of collecting TooManyRequests errors.
+Every execution is recorded with its queue and engine time and bytes scanned.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+DATABASE = os.environ.get('ATHENA_DATABASE', 'africlimate_climate_db')
+OUTPUT_LOCATION = os.environ.get('ATHENA_OUTPUT_LOCATION', 's3://africlimate-analytics-lake/athena-results/')
+WORKGROUP = os.environ.get('ATHENA_WORKGROUP', 'primary')
+
+# Keep at or below the workgroup's active DML query quota
+MAX_CONCURRENT_QUERIES = int(os.environ.get('ATHENA_MAX_CONCURRENT_QUERIES', '20'))
+
+POLL_INITIAL_SECONDS = 0.2
+POLL_MAX_SECONDS = 5.0
+POLL_MULTIPLIER = 2.0
+DEFAULT_TIMEOUT_SECONDS = 300
+
+# GetQueryResults returns at most this many rows per call
+RESULT_PAGE_SIZE = 1000
+
+# Throttled StartQueryExecution calls are retried with backoff
+START_ATTEMPTS = 5
+THROTTLE_ERROR_CODES = ('TooManyRequestsException', 'ThrottlingException')
+
+TERMINAL_STATES = ('SUCCEEDED', 'FAILED', 'CANCELLED')
+
+# Athena column types and the Arrow types their string values are cast to;
+# anything else (arrays, maps, rows, json) stays a string
+ARROW_TYPES = {
+    'boolean': 'bool',
+    'tinyint': 'int8',
+    'smallint': 'int16',
+    'integer': 'int32',
+    'int': 'int32',
+    'bigint': 'int64',
+    'float': 'float32',
+    'real': 'float32',
+    'double': 'float64',
+    'decimal': 'float64',
+    'date': 'date32',
+    'timestamp': 'timestamp[ms]'
+}
+
+
+class QueryFailed(RuntimeError):
+    """
+    A query ended FAILED or CANCELLED, or did not finish in time; carries
+    the last QueryExecution seen (with Athena's statistics) and the polls
+    """
+
+    def __init__(self, execution_id, state, reason, execution=None, polls=None):
+        super().__init__(f"Athena query {execution_id} {state}: {reason}")
+        self.execution_id = execution_id
+        self.state = state
+        self.reason = reason
+        self.execution = execution
+        self.polls = polls
+
+
+class AthenaClient:
+    """
+    Athena access for scripts and analytics Lambdas
+
+    ``execute`` runs one query to completion and returns its statistics;
+    ``iter_batches`` and ``query_arrow`` read the results; ``run_many`` fans
+    a list of queries out over a thread pool sized to the concurrency cap.
+    Statistics of every query run through the client accumulate in
+    ``self.executions`` and are totalled by ``summary()``.
+    """
+
+    def __init__(self, athena_client=None, database=DATABASE, output_location=OUTPUT_LOCATION,
+                 workgroup=WORKGROUP, max_concurrency=MAX_CONCURRENT_QUERIES, region_name=None):
+        self.client = athena_client or boto3.client('athena', region_name=region_name)
+        self.database = database
+        self.output_location = output_location
+        self.workgroup = workgroup
+        self.max_concurrency = max_concurrency
+        self.executions = []
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+
+    def start(self, sql, output_location=None):
+        """Submit a query and return its execution id"""
+        request = {
+            'QueryString': sql,
+            'WorkGroup': self.workgroup,
+            'ResultConfiguration': {'OutputLocation': output_location or self.output_location}
+        }
+        if self.database:
+            request['QueryExecutionContext'] = {'Database': self.database}
+
+        for attempt in range(1, START_ATTEMPTS + 1):
+            try:
+                return self.client.start_query_execution(**request)['QueryExecutionId']
+            except ClientError as e:
+                if e.response['Error']['Code'] not in THROTTLE_ERROR_CODES or attempt == START_ATTEMPTS:
+                    raise
+                time.sleep(min(POLL_MAX_SECONDS, POLL_INITIAL_SECONDS * POLL_MULTIPLIER ** attempt))
+
+    def wait(self, execution_id, timeout=DEFAULT_TIMEOUT_SECONDS):
+        """
+        Poll until the query reaches a terminal state; returns the final
+        QueryExecution and the number of polls. Raises QueryFailed unless it
+        succeeded, stopping the query first if it ran out of time.
+        """
+        deadline = time.monotonic() + timeout
+        interval = POLL_INITIAL_SECONDS
+        polls = 0
+
+        while True:
+            execution = self.client.get_query_execution(QueryExecutionId=execution_id)['QueryExecution']
+            polls += 1
+            status = execution['Status']
+            if status['State'] in TERMINAL_STATES:
+                break
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.client.stop_query_execution(QueryExecutionId=execution_id)
+                raise QueryFailed(execution_id, 'TIMED_OUT', f"still {status['State']} after {timeout}s",
+                                  execution, polls)
+            time.sleep(min(interval, remaining))
+            interval = min(interval * POLL_MULTIPLIER, POLL_MAX_SECONDS)
+
+        if status['State'] != 'SUCCEEDED':
+            raise QueryFailed(execution_id, status['State'], status.get('StateChangeReason', 'no reason given'),
+                              execution, polls)
+        return execution, polls
+
+    def execute(self, sql, output_location=None, timeout=DEFAULT_TIMEOUT_SECONDS):
+        """
+        Run a query to completion within the concurrency cap; returns its
+        statistics. Failures are recorded too (with Athena's statistics for
+        queries that ran, as NOT_STARTED if submission failed) and re-raised.
+        """
+        started = time.monotonic()
+        with self._slots:
+            try:
+                execution_id = self.start(sql, output_location)
+            except Exception as e:
+                self._record(self._stats(None, sql, 'NOT_STARTED', started, polls=0, error=e))
+                raise
+            try:
+                execution, polls = self.wait(execution_id, timeout)
+            except QueryFailed as e:
+                self._record(self._stats(execution_id, sql, e.state, started, e.polls, e.execution, error=e))
+                raise
+            except Exception as e:
+                self._record(self._stats(execution_id, sql, 'UNKNOWN', started, polls=None, error=e))
+                raise
+
+        stats = self._stats(execution_id, sql, 'SUCCEEDED', started, polls, execution)
+        self._record(stats)
+        logger.info(
+            f"Athena query {execution_id}: {stats['engine_ms']} ms engine, {stats['queue_ms']} ms queued, "
+            f"{stats['bytes_scanned'] / 1024 ** 2:.1f} MiB scanned, {polls} polls"
+        )
+        return stats
+
+    def _stats(self, execution_id, sql, state, started, polls, execution=None, error=None):
+        statistics = (execution or {}).get('Statistics', {})
+        return {
+            'query_execution_id': execution_id,
+            'sql': sql,
+            'state': state,
+            'wall_seconds': round(time.monotonic() - started, 3),
+            'polls': polls,
+            'engine_ms': statistics.get('EngineExecutionTimeInMillis', 0),
+            'queue_ms': statistics.get('QueryQueueTimeInMillis', 0),
+            'total_ms': statistics.get('TotalExecutionTimeInMillis', 0),
+            'bytes_scanned': statistics.get('DataScannedInBytes', 0),
+            'output_location': (execution or {}).get('ResultConfiguration', {}).get('OutputLocation'),
+            'error': str(error) if error else None
+        }
+
+    def _record(self, stats):
+        with self._lock:
+            self.executions.append(stats)
+
+    def iter_batches(self, execution_id, page_size=RESULT_PAGE_SIZE):
+        """
+        Stream a finished query's results as Arrow record batches, one per
+        result page, typed from the result set metadata
+        """
+        import pyarrow as pa
+
+        paginator = self.client.get_paginator('get_query_results')
+        schema = None
+        first_page = True
+
+        for page in paginator.paginate(QueryExecutionId=execution_id, PaginationConfig={'PageSize': page_size}):
+            result_set = page['ResultSet']
+            if schema is None:
+                columns = result_set['ResultSetMetadata']['ColumnInfo']
+                schema = pa.schema([
+                    (c['Name'], pa.type_for_alias(ARROW_TYPES.get(c['Type'].lower(), 'string'))) for c in columns
+                ])
+
+            rows = [[cell.get('VarCharValue') for cell in row['Data']] for row in result_set['Rows']]
+            # SELECT results repeat the column names as their first row
+            if first_page and rows and rows[0] == schema.names:
+                rows = rows[1:]
+            first_page = False
+
+            if rows:
+                arrays = [
+                    pa.array([row[i] if i < len(row) else None for row in rows], pa.string()).cast(field.type)
+                    for i, field in enumerate(schema)
+                ]
+                yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    def query_arrow(self, sql, output_location=None, timeout=DEFAULT_TIMEOUT_SECONDS):
+        """Run a query and collect its results into an Arrow table"""
+        import pyarrow as pa
+
+        stats = self.execute(sql, output_location, timeout)
+        batches = list(self.iter_batches(stats['query_execution_id']))
+        if not batches:
+            return pa.table({}), stats
+        return pa.Table.from_batches(batches), stats
+
+    def run_many(self, queries, timeout=DEFAULT_TIMEOUT_SECONDS):
+        """
+        Run queries concurrently, at most ``max_concurrency`` at a time
+
+        Each query is SQL or a dict with ``sql`` and optional
+        ``output_location``. Returns one entry per query, in order: its
+        statistics, or the exception it raised.
+        """
+        def run(query):
+            if isinstance(query, str):
+                query = {'sql': query}
+            try:
+                return self.execute(query['sql'], query.get('output_location'), timeout)
+            except Exception as e:
+                logger.error(f"Athena query failed: {str(e)}")
+                return e
+
+        queries = list(queries)
+        if not queries:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(queries))) as executor:
+            return list(executor.map(run, queries))
+
+    def summary(self):
+        """Totals over every query run through this client"""
+        with self._lock:
+            executions = list(self.executions)
+        succeeded = [e for e in executions if e['state'] == 'SUCCEEDED']
+        return {
+            'queries': len(executions),
+            'succeeded': len(succeeded),
+            'failed': len(executions) - len(succeeded),
+            'not_started': sum(1 for e in executions if e['state'] == 'NOT_STARTED'),
+            'bytes_scanned': sum(e['bytes_scanned'] for e in executions),
+            'engine_ms': sum(e['engine_ms'] for e in executions),
+            'queue_ms': sum(e['queue_ms'] for e in executions),
+            'wall_seconds': round(sum(e['wall_seconds'] for e in executions), 3)
+        }
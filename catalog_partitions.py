@@ -0,0 +1,265 @@
+"""
+Direct partition registration for the Glue catalog
+
+Writers know exactly which partitions they just committed, so they register
+those partitions themselves instead of waiting for a crawler to rediscover
+them. Catalog work is proportional to the new partitions, not to the objects
+under the table:
+
+- values already registered by this process (e.g. a warm Lambda) or repeated
+  within a call are skipped before any API call;
+- new partitions go out through BatchCreatePartition, 100 per request, and
+  throttled or conflicting calls are retried with jittered backoff;
+- each partition records the writer's ``schema_version``, a fingerprint of its
+  columns. A partition that already exists with a different version is
+  updated in place. When the fingerprint differs from the table's, the
+  table's columns are updated, so Glue keeps the previous schema as a table
+  version.
+- writers that commit snapshots (see ``table_commits``) pass the directory
+  and sequence number of the commit, and the partition is re-pointed at the
+  newest commit's directory, never back at an older one.
+
+Tables that use partition projection (see scripts/table_definitions.py) are
+read by Athena without these entries, but Spark, Glue jobs and Spectrum still
+read them from the catalog. Snapshot-committed tables are never projected, so
+for them these entries are what every engine reads.
+"""
+
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 5
+RETRYABLE_ERROR_CODES = (
+    'ThrottlingException',
+    'InternalServiceException',
+    'ConcurrentModificationException',
+    'OperationTimeoutException'
+)
+
+# Arrow type names and the Glue types they are declared as
+GLUE_TYPES = {
+    'bool': 'boolean',
+    'int8': 'tinyint',
+    'int16': 'smallint',
+    'int32': 'int',
+    'int64': 'bigint',
+    'float': 'float',
+    'double': 'double',
+    'string': 'string',
+    'large_string': 'string',
+    'date32[day]': 'date'
+}
+
+_registered = set()
+_tables = {}
+_lock = threading.Lock()
+
+
+def glue_columns(arrow_schema, exclude=()):
+    """(name, Glue type) pairs of an Arrow schema, skipping partition columns"""
+    columns = []
+    for field in arrow_schema:
+        if field.name in exclude:
+            continue
+        type_name = str(field.type)
+        columns.append((field.name, 'timestamp' if type_name.startswith('timestamp') else GLUE_TYPES[type_name]))
+    return columns
+
+
+def schema_version(columns):
+    """Short fingerprint of a column list"""
+    return hashlib.sha256(json.dumps([list(c) for c in columns]).encode()).hexdigest()[:12]
+
+
+def _with_retries(call, **kwargs):
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            return call(**kwargs)
+        except ClientError as e:
+            if e.response['Error']['Code'] not in RETRYABLE_ERROR_CODES or attempt == MAX_ATTEMPTS:
+                raise
+            time.sleep(random.uniform(0, 0.2 * 2 ** attempt))
+
+
+def _get_table(glue_client, database, table_name):
+    key = (database, table_name)
+    with _lock:
+        if key in _tables:
+            return _tables[key]
+    table = _with_retries(glue_client.get_table, DatabaseName=database, Name=table_name)['Table']
+    with _lock:
+        _tables[key] = table
+    return table
+
+
+def _update_table_schema(glue_client, database, table, columns, version):
+    """Point the table at the writer's columns; Glue archives the old definition as a table version"""
+    table_input = {k: table[k] for k in ('Name', 'Description', 'TableType', 'Parameters',
+                                         'PartitionKeys', 'StorageDescriptor') if k in table}
+    table_input['StorageDescriptor'] = {**table['StorageDescriptor'],
+                                        'Columns': [{'Name': n, 'Type': t} for n, t in columns]}
+    table_input['Parameters'] = {**table.get('Parameters', {}), 'schema_version': version}
+    _with_retries(glue_client.update_table, DatabaseName=database, TableInput=table_input)
+    with _lock:
+        _tables[(database, table['Name'])] = {**table, **table_input}
+    logger.info(f"Updated {database}.{table['Name']} to schema version {version}")
+
+
+def _partition_input(table, values, columns, version, commit=None):
+    parameters = {'schema_version': version}
+    if commit:
+        location, parameters['commit_sequence'] = commit[0], str(commit[1])
+    else:
+        location = table['StorageDescriptor']['Location'].rstrip('/') + '/'
+        for key, value in zip(table['PartitionKeys'], values):
+            location += f"{key['Name']}={value}/"
+    return {
+        'Values': list(values),
+        'Parameters': parameters,
+        'StorageDescriptor': {
+            **table['StorageDescriptor'],
+            'Columns': [{'Name': n, 'Type': t} for n, t in columns],
+            'Location': location
+        }
+    }
+
+
+def register_partitions(glue_client, database, table_name, partitions, columns=None, commits=None):
+    """
+    Register written partitions of a table
+
+    ``partitions`` are dicts of partition column to value (e.g.
+    ``{'year': 2024, 'month': 3}``), formatted into the path the same way
+    the writers lay them out (month zero-padded). ``columns`` are the
+    writer's (name, Glue type) data columns; the table's are used when
+    omitted. ``commits`` gives, in the order of ``partitions``, the
+    ``(location, sequence_number)`` of the snapshot commit that wrote each
+    one; without it partitions sit at the table location plus their path.
+    Returns the number of partitions created or updated.
+    """
+    table = _get_table(glue_client, database, table_name)
+    columns = columns or [(c['Name'], c['Type']) for c in table['StorageDescriptor']['Columns']]
+    version = schema_version(columns)
+
+    if table.get('Parameters', {}).get('schema_version') != version:
+        _update_table_schema(glue_client, database, table, columns, version)
+        table = _get_table(glue_client, database, table_name)
+
+    keys = [k['Name'] for k in table['PartitionKeys']]
+    commits = commits or [None] * len(partitions)
+    values_list = []
+    markers = []
+    partition_commits = {}
+    for partition, commit in zip(partitions, commits):
+        values = tuple(
+            f"{partition[k]:02d}" if k == 'month' and isinstance(partition[k], int) else str(partition[k])
+            for k in keys
+        )
+        marker = (database, table_name, values, version, commit)
+        with _lock:
+            if marker in _registered:
+                continue
+            _registered.add(marker)
+        markers.append(marker)
+        if values not in values_list:
+            values_list.append(values)
+        if commit and (values not in partition_commits or commit[1] > partition_commits[values][1]):
+            partition_commits[values] = commit
+
+    changed = 0
+    try:
+        for start in range(0, len(values_list), BATCH_SIZE):
+            chunk = values_list[start:start + BATCH_SIZE]
+            changed += _create_chunk(glue_client, database, table, chunk, columns, version, partition_commits)
+    except Exception:
+        # Let a later call try these again
+        with _lock:
+            _registered.difference_update(markers)
+        raise
+
+    if changed:
+        logger.info(f"Registered {changed} partition(s) of {database}.{table_name}")
+    return changed
+
+
+def _create_chunk(glue_client, database, table, chunk, columns, version, commits):
+    pending = chunk
+    existing = []
+    created = 0
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        response = _with_retries(
+            glue_client.batch_create_partition,
+            DatabaseName=database,
+            TableName=table['Name'],
+            PartitionInputList=[_partition_input(table, values, columns, version, commits.get(values))
+                                for values in pending]
+        )
+        failed = {tuple(e['PartitionValues']): e['ErrorDetail'] for e in response.get('Errors', [])}
+        created += len(pending) - len(failed)
+        existing += [v for v, detail in failed.items() if detail.get('ErrorCode') == 'AlreadyExistsException']
+        pending = [v for v, detail in failed.items() if detail.get('ErrorCode') in RETRYABLE_ERROR_CODES]
+        fatal = {v: d for v, d in failed.items()
+                 if d.get('ErrorCode') not in RETRYABLE_ERROR_CODES + ('AlreadyExistsException',)}
+        if fatal:
+            raise RuntimeError(f"Could not register partitions of {table['Name']}: {fatal}")
+        if not pending:
+            break
+        time.sleep(random.uniform(0, 0.2 * 2 ** attempt))
+    else:
+        raise RuntimeError(f"Could not register {len(pending)} partition(s) of {table['Name']} "
+                           f"after {MAX_ATTEMPTS} attempts")
+
+    return created + _update_stale(glue_client, database, table, existing, columns, version, commits)
+
+
+def _is_stale(partition, version, commit):
+    parameters = partition.get('Parameters', {})
+    if commit:
+        registered = int(parameters.get('commit_sequence', 0))
+        if registered > commit[1]:
+            return False
+        if registered < commit[1] or partition['StorageDescriptor']['Location'] != commit[0]:
+            return True
+    return parameters.get('schema_version') != version
+
+
+def _update_stale(glue_client, database, table, existing, columns, version, commits):
+    """
+    Re-point existing partitions that were registered with another schema
+    version or by an older commit
+    """
+    if not existing:
+        return 0
+    response = _with_retries(
+        glue_client.batch_get_partition,
+        DatabaseName=database,
+        TableName=table['Name'],
+        PartitionsToGet=[{'Values': list(v)} for v in existing]
+    )
+    stale = [tuple(p['Values']) for p in response.get('Partitions', [])
+             if _is_stale(p, version, commits.get(tuple(p['Values'])))]
+    if not stale:
+        return 0
+    response = _with_retries(
+        glue_client.batch_update_partition,
+        DatabaseName=database,
+        TableName=table['Name'],
+        Entries=[
+            {'PartitionValueList': list(v),
+             'PartitionInput': _partition_input(table, v, columns, version, commits.get(v))}
+            for v in stale
+        ]
+    )
+    for error in response.get('Errors', []):
+        logger.error(f"Partition {error['PartitionValueList']} of {table['Name']}: "
+                     f"{error['ErrorDetail'].get('ErrorMessage')}")
+    return len(stale) - len(response.get('Errors', []))
@@ -2,6 +2,19 @@ import subprocess
 import os
 import zipfile
 
+# Modules shipped alongside the handler
+LAMBDA_MODULES = [
+    'lambda_etl_function.py',
+    'athena_cache.py',
+    'athena_client.py',
+    'catalog_partitions.py',
+    'etl_pipeline.py',
+    'materialized_views.py',
+    'quality_stats.py',
+    'raster_datasets.py',
+    'table_commits.py'
+]
+
 def create_lambda_deployment_package():
     """
     Create deployment package for Lambda function
@@ -15,12 +28,10 @@ def create_lambda_deployment_package():
         '-t', 'lambda_package'
     ], check=True)
     
-    # Copy Lambda function
+    # Copy Lambda function and its modules
     print("Copying Lambda function...")
     os.makedirs('lambda_package', exist_ok=True)
-    subprocess.run([
-        'cp', 'lambda_etl_function.py', 'lambda_package/'
-    ], check=True)
+    subprocess.run(['cp', *LAMBDA_MODULES, 'lambda_package/'], check=True)
     
     # Create ZIP file
     print("Creating ZIP file...")
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Pipelined ETL for batches and backfills
+
+Runs the raster ETL as four stages connected by bounded queues:
+
+    fetch (S3 download) -> decode (window read + metrics) -> encode (Parquet) -> publish (upload + commit)
+
+While file N is being decoded, file N+1 is already downloading and file N-1
+is uploading. The bounded queues provide backpressure so at most a few files
+are in flight per stage. Decode hands each file to encode as soon as it
+starts reading and streams the metric batches through a small per-file
+queue, so a raster is never held in memory whole. Queue depths are sampled while the pipeline runs:
+a queue that sits full points at a slow consumer, one that sits empty points
+at a slow producer.
+"""
+
+import argparse
+import logging
+import os
+import queue
+import threading
+import time
+
+import lambda_etl_function as etl
+from quality_stats import new_stats
+from raster_datasets import match_dataset
+
+logger = logging.getLogger()
+
+# Default workers per stage; decode/encode are CPU-bound, fetch/publish wait on the network
+STAGE_WORKERS = {
+    'fetch': 2,
+    'decode': 1,
+    'encode': 1,
+    'publish': 2
+}
+QUEUE_SIZE = 2
+# Metric batches buffered between the decode and encode of one file
+BATCH_QUEUE_SIZE = 4
+SAMPLE_INTERVAL_SECONDS = 0.2
+
+_DONE = object()
+
+
+class _BatchStream:
+    """Bounded hand-off of one raster's metric batches from decode to encode"""
+
+    def __init__(self, maxsize=BATCH_QUEUE_SIZE):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._closed = threading.Event()
+
+    def put(self, columns):
+        """Queue a batch; False once the consumer has stopped reading"""
+        while not self._closed.is_set():
+            try:
+                self._queue.put(columns, timeout=SAMPLE_INTERVAL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def finish(self, error=None):
+        self.put(error if error is not None else _DONE)
+
+    def close(self):
+        self._closed.set()
+
+    def __iter__(self):
+        while True:
+            columns = self._queue.get()
+            if columns is _DONE:
+                return
+            if isinstance(columns, Exception):
+                raise columns
+            yield columns
+
+
+def _fetch(item):
+    item['local_path'] = etl.download_raster(item['bucket'], item['object_key'])
+    return item
+
+
+def _decode(item, forward):
+    """
+    Stream the raster's batches to encode; the item is forwarded before the
+    first read, and read errors surface in the encode stage
+    """
+    local_path = item.pop('local_path')
+    try:
+        stream = _BatchStream()
+        item['batches'] = stream
+        item['stats'] = new_stats(item['dataset'])
+        forward(item)
+
+        try:
+            for columns in etl.iter_raster_batches(local_path, item['dataset'], item['partition'], item['stats']):
+                if not stream.put(columns):
+                    break
+            stream.finish()
+        except Exception as e:
+            stream.finish(e)
+    finally:
+        os.remove(local_path)
+
+
+def _encode(item):
+    stream = item.pop('batches')
+    try:
+        item['parquet_path'], item['row_count'] = etl.write_parquet_file(
+            stream, item['dataset'], item['partition']
+        )
+    finally:
+        # Unblocks the decoder if encoding stopped early
+        stream.close()
+    return item
+
+
+def _publish(item):
+    try:
+        if item['row_count']:
+            item['output_key'] = etl.publish_parquet_file(
+                item['parquet_path'], item['dataset'], item['partition']
+            )
+        etl.publish_quality_stats(item['stats'], item['partition'], item['object_key'], item['row_count'])
+    finally:
+        if item['parquet_path'] and os.path.exists(item['parquet_path']):
+            os.remove(item['parquet_path'])
+    return item
+
+
+# Stages that forward their item themselves while they keep working on it
+STREAMING_STAGES = {'decode'}
+
+STAGES = [
+    ('fetch', _fetch),
+    ('decode', _decode),
+    ('encode', _encode),
+    ('publish', _publish)
+]
+
+
+def _cleanup(item):
+    """Remove any local files left by an item that failed mid-pipeline"""
+    for field in ('local_path', 'parquet_path'):
+        path = item.get(field)
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+def _stage_worker(name, func, inbox, outbox, stage_metrics, results, lock):
+    while True:
+        item = inbox.get()
+        if item is _DONE:
+            return
+
+        started = time.perf_counter()
+        try:
+            if name in STREAMING_STAGES:
+                func(item, outbox.put)
+                continue
+            item = func(item)
+        except Exception as e:
+            logger.error(f"[{name}] failed on {item['object_key']}: {str(e)}")
+            _cleanup(item)
+            with lock:
+                results['failed'].append(item['object_key'])
+            continue
+        finally:
+            with lock:
+                stage_metrics[name]['items'] += 1
+                stage_metrics[name]['busy_seconds'] += time.perf_counter() - started
+
+        if outbox is not None:
+            outbox.put(item)
+        else:
+            with lock:
+                key = 'processed' if item['row_count'] else 'empty'
+                results[key].append(item['object_key'])
+
+
+def _sample_queues(queues, samples, stop):
+    while not stop.is_set():
+        for name, q in queues.items():
+            samples[name].append(q.qsize())
+        stop.wait(SAMPLE_INTERVAL_SECONDS)
+
+
+def _queue_report(queues, samples):
+    report = {}
+    for name, q in queues.items():
+        depths = samples[name] or [0]
+        report[name] = {
+            'capacity': q.maxsize,
+            'mean_depth': round(sum(depths) / len(depths), 2),
+            'max_depth': max(depths),
+            'full_fraction': round(sum(1 for d in depths if d >= q.maxsize) / len(depths), 2)
+        }
+    return report
+
+
+def run_pipeline(bucket_name, object_keys, stage_workers=None, queue_size=QUEUE_SIZE):
+    """
+    Process many rasters with overlapping transfer, decode, encode and upload
+
+    Returns a report with processed/empty/failed/skipped keys, per-stage busy
+    time and per-queue depth statistics.
+    """
+    etl._load_runtime()
+    workers = dict(STAGE_WORKERS, **(stage_workers or {}))
+    started = time.perf_counter()
+
+    results = {'processed': [], 'empty': [], 'failed': [], 'skipped': []}
+    stage_metrics = {name: {'workers': workers[name], 'items': 0, 'busy_seconds': 0.0} for name, _ in STAGES}
+    lock = threading.Lock()
+
+    # Inbox queue of every stage; the first one is fed from the key list
+    queues = {name: queue.Queue(maxsize=queue_size) for name, _ in STAGES}
+    samples = {name: [] for name in queues}
+    stop_sampling = threading.Event()
+    sampler = threading.Thread(target=_sample_queues, args=(queues, samples, stop_sampling), daemon=True)
+    sampler.start()
+
+    stage_threads = []
+    for index, (name, func) in enumerate(STAGES):
+        outbox = queues[STAGES[index + 1][0]] if index + 1 < len(STAGES) else None
+        threads = [
+            threading.Thread(
+                target=_stage_worker,
+                args=(name, func, queues[name], outbox, stage_metrics, results, lock),
+                name=f"etl-{name}-{i}",
+                daemon=True
+            )
+            for i in range(workers[name])
+        ]
+        for thread in threads:
+            thread.start()
+        stage_threads.append((name, threads))
+
+    for object_key in object_keys:
+        dataset, partition = match_dataset(object_key)
+        if dataset is None:
+            results['skipped'].append(object_key)
+            continue
+        queues['fetch'].put({
+            'bucket': bucket_name,
+            'object_key': object_key,
+            'dataset': dataset,
+            'partition': partition
+        })
+
+    # Drain stage by stage: a stage is told to stop only after its producers have finished
+    for name, threads in stage_threads:
+        for _ in threads:
+            queues[name].put(_DONE)
+        for thread in threads:
+            thread.join()
+
+    stop_sampling.set()
+    sampler.join()
+
+    elapsed = time.perf_counter() - started
+    for metrics in stage_metrics.values():
+        metrics['utilization'] = round(metrics['busy_seconds'] / (elapsed * metrics['workers']), 2) if elapsed else 0.0
+        metrics['busy_seconds'] = round(metrics['busy_seconds'], 2)
+
+    report = {
+        'elapsed_seconds': round(elapsed, 2),
+        'counts': {key: len(value) for key, value in results.items()},
+        'stages': stage_metrics,
+        'queues': _queue_report(queues, samples),
+        'bottleneck': max(stage_metrics, key=lambda n: stage_metrics[n]['utilization']),
+        **results
+    }
+    logger.info(
+        f"Pipeline finished in {report['elapsed_seconds']}s: {report['counts']}, "
+        f"busiest stage: {report['bottleneck']}"
+    )
+    return report
+
+
+def list_object_keys(bucket_name, prefix):
+    """List every key under a prefix"""
+    keys = []
+    paginator = etl.S3_CLIENT.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        keys.extend(obj['Key'] for obj in page.get('Contents', []))
+    return keys
+
+
+def main():
+    """Backfill every raster under a prefix through the pipeline"""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description='Pipelined raster ETL backfill')
+    parser.add_argument('--bucket', default=etl.PROCESSED_BUCKET)
+    parser.add_argument('--prefix', default='raw/chirps_monthly/')
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE)
+    for name in STAGE_WORKERS:
+        parser.add_argument(f'--{name}-workers', type=int, default=STAGE_WORKERS[name])
+    args = parser.parse_args()
+
+    keys = list_object_keys(args.bucket, args.prefix)
+    logger.info(f"Found {len(keys)} objects under s3://{args.bucket}/{args.prefix}")
+
+    report = run_pipeline(
+        args.bucket, keys,
+        stage_workers={name: getattr(args, f'{name}_workers') for name in STAGE_WORKERS},
+        queue_size=args.queue_size
+    )
+
+    for name, metrics in report['stages'].items():
+        logger.info(f"Stage {name}: {metrics['items']} items, {metrics['utilization']:.0%} utilization")
+    for name, metrics in report['queues'].items():
+        logger.info(
+            f"Queue -> {name}: mean depth {metrics['mean_depth']}/{metrics['capacity']}, "
+            f"full {metrics['full_fraction']:.0%} of the time"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -7,84 +7,10 @@ Creates all SQL queries needed for the AfriClimate Analytics Lake dashboard
 import json
 from datetime import datetime
 
-# SQL Queries for QuickSight Datasets
-QUICKSIGHT_QUERIES = {
-    'drought_early_warning': '''
--- Drought Early Warning Dataset
-SELECT 
-    year,
-    month,
-    province,
-    region,
-    drought_level,
-    risk_level,
-    monthly_precip,
-    avg_spi,
-    farmer_message,
-    analysis_date
-FROM africlimate_climate_db.drought_alerts
-ORDER BY analysis_date DESC
-    ''',
-    
-    'water_security': '''
--- Water Security Dataset
-SELECT 
-    dam_name,
-    province,
-    current_capacity_percent,
-    rainfall_status,
-    overall_security_score,
-    risk_level,
-    days_until_critical,
-    recommendations,
-    analysis_date
-FROM africlimate_climate_db.water_security_metrics
-ORDER BY analysis_date DESC
-    ''',
-    
-    'ndvi_impact_tracker': '''
--- NDVI Impact Tracker Dataset
-SELECT 
-    area_name,
-    ecosystem,
-    overall_metrics,
-    risk_level,
-    biodiversity_impact,
-    key_threats,
-    recommendations,
-    assessment_date
-FROM africlimate_climate_db.biodiversity_risk_assessments
-ORDER BY assessment_date DESC
-    ''',
-    
-    'community_adaptation': '''
--- Community Adaptation Dataset
-SELECT 
-    settlement_name,
-    population,
-    overall_risk_level,
-    primary_risks,
-    requires_immediate_action,
-    vulnerability_factors,
-    assessment_date
-FROM africlimate_climate_db.community_vulnerability_assessments
-ORDER BY assessment_date DESC
-    ''',
-    
-    'carbon_footprint': '''
--- Carbon Footprint Dataset
-SELECT 
-    energy_type,
-    carbon_intensity_trend,
-    climate_resilience,
-    transition_opportunities,
-    carbon_risk_score,
-    key_insights,
-    assessment_date
-FROM africlimate_climate_db.carbon_impact_assessments
-ORDER BY assessment_date DESC
-    '''
-}
+from materialized_views import MATERIALIZED_TABLES, quicksight_sql
+
+# SQL Queries for QuickSight Datasets, generated from the materialized table definitions
+QUICKSIGHT_QUERIES = {dataset_name: quicksight_sql(dataset_name) for dataset_name in MATERIALIZED_TABLES}
 
 # Dashboard Visualization Specifications
 DASHBOARD_VISUALIZATIONS = {
@@ -208,7 +134,8 @@ def save_quicksight_queries():
             f.write(f"-- {dataset_name.replace('_', ' ').title()}\n")
             f.write(f"-- AfriClimate Analytics Lake\n")
             f.write(f"-- Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-            f.write(query)
+            f.write(f"-- {dataset_name.replace('_', ' ').title()} Dataset\n")
+            f.write(f"{query}\n")
         
         print(f"✅ Saved: {filename}")
     
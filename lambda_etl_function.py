@@ -1,15 +1,27 @@
+import time
+_INIT_STARTED = time.perf_counter()
+
 import json
 import boto3
-import rasterio
-import numpy as np
-import pandas as pd
-import pyarrow as pa
-import pyarrow.parquet as pq
-from rasterio.transform import from_bounds
+import importlib
 from datetime import datetime
 import os
+import threading
+import uuid
 import logging
 
+from catalog_partitions import glue_columns, register_partitions
+from quality_stats import (
+    QUALITY_STATS_COLUMNS,
+    QUALITY_STATS_TABLE,
+    finalize_stats,
+    new_stats,
+    update_stats,
+    write_partition_stats
+)
+from raster_datasets import match_dataset
+from table_commits import collect_file_stats, commit_files, new_commit_id, partition_directory
+
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -17,46 +29,124 @@ logger.setLevel(logging.INFO)
 # Configuration
 S3_CLIENT = boto3.client('s3')
 PROCESSED_BUCKET = 'africlimate-analytics-lake'
-PROCESSED_PREFIX = 'processed/enriched_climate/'
+GLUE_DATABASE = os.environ.get('ATHENA_DATABASE', 'africlimate_climate_db')
+
+# Register written partitions in the Glue catalog right after each commit
+REGISTER_PARTITIONS = os.environ.get('ETL_REGISTER_PARTITIONS', 'true').lower() == 'true'
+# Created on first use (keeps init lean); the pipeline's publish workers share it
+_GLUE_CLIENT = None
+_GLUE_CLIENT_LOCK = threading.Lock()
+
+# Raster rows decoded and written per Parquet row group
+ROWS_PER_BATCH = 256
+
+# Object metadata set on raw rasters that were already converted at ingest time
+CONVERTED_METADATA_KEY = 'etl-converted'
+
+# 'lean' defers numpy/rasterio/pyarrow until a file is actually processed;
+# 'eager' loads them during init (useful with provisioned concurrency)
+RUNTIME_MODE = os.environ.get('ETL_RUNTIME_MODE', 'lean')
+HEAVY_MODULES = ['numpy', 'pyarrow', 'pyarrow.parquet', 'rasterio', 'rasterio.windows']
+
+# Heavy modules, bound by _load_runtime()
+np = None
+pa = None
+pq = None
+rasterio = None
+Window = None
 
-# Southern Africa bounding box
-LAT_MIN, LAT_MAX = -35, -22
-LON_MIN, LON_MAX = 16, 33
+IMPORT_TIMINGS_MS = {}
+_COLD_START = True
+
+def _load_runtime():
+    """
+    Import the heavy processing modules once, recording how long each took
+    """
+    global np, pa, pq, rasterio, Window
+    if np is not None:
+        return
+
+    modules = {}
+    for name in HEAVY_MODULES:
+        started = time.perf_counter()
+        modules[name] = importlib.import_module(name)
+        IMPORT_TIMINGS_MS[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    np = modules['numpy']
+    pa = modules['pyarrow']
+    pq = modules['pyarrow.parquet']
+    rasterio = modules['rasterio']
+    Window = modules['rasterio.windows'].Window
+
+def get_runtime_report():
+    """
+    Init duration and per-module import times for this execution environment
+    """
+    return {
+        'runtime_mode': RUNTIME_MODE,
+        'init_ms': INIT_DURATION_MS,
+        'import_ms': dict(IMPORT_TIMINGS_MS),
+        'heavy_modules_loaded': np is not None
+    }
 
 def lambda_handler(event, context):
     """
-    Lambda ETL function for CHIRPS climate data processing
+    Lambda ETL function for registered raster datasets (CHIRPS, NDVI, ...)
     Converts COG to Parquet and calculates climate metrics
     """
+    global _COLD_START
     try:
         logger.info(f"Processing event: {json.dumps(event)}")
-        
+        cold_start = _COLD_START
+        _COLD_START = False
+
+        # Batch / backfill invocation: {"bucket": ..., "object_keys": [...]}
+        if 'object_keys' in event:
+            from etl_pipeline import run_pipeline
+            report = run_pipeline(event.get('bucket', PROCESSED_BUCKET), event['object_keys'])
+            return {
+                'statusCode': 200,
+                'body': json.dumps({
+                    'message': 'Batch ETL processing completed',
+                    'counts': report['counts'],
+                    'bottleneck': report['bottleneck']
+                })
+            }
+
         # Extract S3 event information
         for record in event['Records']:
             if record['eventSource'] == 'aws:s3':
                 bucket_name = record['s3']['bucket']['name']
                 object_key = record['s3']['object']['key']
-                
-                # Only process CHIRPS files
-                if not object_key.endswith('.tif'):
-                    logger.info(f"Skipping non-TIFF file: {object_key}")
+
+                # Only process keys claimed by a registered dataset
+                dataset, partition = match_dataset(object_key)
+                if dataset is None:
+                    logger.info(f"Skipping unregistered file: {object_key}")
+                    continue
+                if is_converted_upstream(bucket_name, object_key):
+                    logger.info(f"Skipping {object_key}: already converted during ingestion")
                     continue
-                
-                logger.info(f"Processing file: s3://{bucket_name}/{object_key}")
-                
+
+                logger.info(f"Processing {dataset['name']} file: s3://{bucket_name}/{object_key}")
+                _load_runtime()
+
                 # Process the file
-                result = process_chirps_file(bucket_name, object_key)
-                
+                result = process_raster_file(bucket_name, object_key, dataset, partition)
+
                 if result:
                     logger.info(f"Successfully processed {object_key}")
                 else:
                     logger.error(f"Failed to process {object_key}")
-        
+
+        if cold_start:
+            logger.info(f"Cold start report: {json.dumps(get_runtime_report())}")
+
         return {
             'statusCode': 200,
             'body': json.dumps({'message': 'ETL processing completed'})
         }
-        
+
     except Exception as e:
         logger.error(f"Error in lambda_handler: {str(e)}")
         return {
@@ -68,130 +158,283 @@ def process_chirps_file(bucket_name, object_key):
     """
     Process individual CHIRPS file: convert to Parquet and calculate metrics
     """
+    dataset, partition = match_dataset(object_key)
+    if dataset is None or dataset['name'] != 'chirps_monthly':
+        logger.error(f"Not a CHIRPS monthly file: {object_key}")
+        return False
+    _load_runtime()
+    return process_raster_file(bucket_name, object_key, dataset, partition)
+
+def process_raster_file(bucket_name, object_key, dataset, partition):
+    """
+    Process one raster of a registered dataset: windowed read over the
+    dataset grid, vectorized metrics, streamed Parquet output and a
+    quality-stats record gathered in the same pass
+    """
+    temp_file = None
     try:
-        # Extract date from filename
-        filename = os.path.basename(object_key)
-        year, month = extract_date_from_filename(filename)
-        
-        # Download file temporarily
-        temp_file = f"/tmp/{filename}"
-        S3_CLIENT.download_file(bucket_name, object_key, temp_file)
-        
-        # Process with rasterio
-        with rasterio.open(temp_file) as src:
-            # Read precipitation data
-            precipitation_data = src.read(1)
-            
-            # Get coordinates
-            bounds = src.bounds
-            transform = src.transform
-            
-            # Create coordinate grids
-            height, width = precipitation_data.shape
-            cols, rows = np.meshgrid(np.arange(width), np.arange(height))
-            lons, lats = rasterio.transform.xy(transform, rows, cols)
-            
-            # Filter to Southern Africa region
-            mask = ((lats >= LAT_MIN) & (lats <= LAT_MAX) & 
-                   (lons >= LON_MIN) & (lons <= LON_MAX))
-            
-            if np.any(mask):
-                # Extract data for Southern Africa
-                sa_lats = lats[mask]
-                sa_lons = lons[mask]
-                sa_precip = precipitation_data[mask]
-                
-                # Calculate climate metrics
-                climate_metrics = calculate_climate_metrics(
-                    sa_precip, sa_lats, sa_lons, year, month
-                )
-                
-                # Convert to DataFrame
-                df = pd.DataFrame(climate_metrics)
-                
-                # Save as Parquet
-                save_to_parquet(df, year, month)
-                
-                logger.info(f"Processed {len(df)} data points for {year}-{month:02d}")
-                return True
-            else:
-                logger.warning(f"No data points in Southern Africa region for {filename}")
-                return False
-                
+        temp_file = download_raster(bucket_name, object_key)
+        return convert_raster(temp_file, object_key, dataset, partition) > 0
+
     except Exception as e:
         logger.error(f"Error processing {object_key}: {str(e)}")
         return False
     finally:
         # Clean up temporary file
-        if os.path.exists(temp_file):
+        if temp_file and os.path.exists(temp_file):
             os.remove(temp_file)
 
-def extract_date_from_filename(filename):
+def convert_raster(source, object_key, dataset, partition):
     """
-    Extract year and month from CHIRPS filename
-    Example: chirps-v2.0_2024.01.tif -> 2024, 1
+    Convert an already-fetched raster (local path or binary file object) and
+    publish its Parquet file and quality stats; returns the row count
     """
-    try:
-        # Remove extension and prefix
-        base = filename.replace('.tif', '').replace('chirps-v2.0_', '')
-        year, month = base.split('.')
-        return int(year), int(month)
-    except Exception as e:
-        logger.error(f"Error parsing filename {filename}: {str(e)}")
-        return None, None
-
-def calculate_climate_metrics(precipitation, lats, lons, year, month):
-    """
-    Calculate climate metrics for precipitation data
-    """
-    metrics = []
-    
-    for i in range(len(precipitation)):
-        precip_value = precipitation[i]
-        lat = lats[i]
-        lon = lons[i]
-        
-        # Basic metrics
-        metrics.append({
-            'year': year,
-            'month': month,
-            'latitude': lat,
-            'longitude': lon,
-            'precipitation_mm': float(precip_value) if precip_value >= 0 else 0.0,
-            'region_code': 'SOUTHERN_AFRICA',
-            'data_quality': 'VALID' if precip_value >= 0 else 'INVALID'
-        })
-    
-    return metrics
-
-def save_to_parquet(df, year, month):
-    """
-    Save DataFrame to Parquet with partitioning
+    stats = new_stats(dataset)
+    batches = iter_raster_batches(source, dataset, partition, stats)
+    row_count = save_to_parquet(batches, dataset, partition)
+
+    publish_quality_stats(stats, partition, object_key, row_count)
+
+    if row_count:
+        logger.info(
+            f"Processed {row_count} data points for {dataset['name']} "
+            f"{partition['year']}-{partition['month']:02d}"
+        )
+    else:
+        logger.warning(f"No data points in {dataset['grid']['region_code']} region for {object_key}")
+    return row_count
+
+def is_converted_upstream(bucket_name, object_key):
+    """
+    True when the raw object was written by fused ingestion, which has
+    already produced its Parquet output
+    """
+    response = S3_CLIENT.head_object(Bucket=bucket_name, Key=object_key)
+    return response.get('Metadata', {}).get(CONVERTED_METADATA_KEY) == 'true'
+
+def download_raster(bucket_name, object_key):
+    """
+    Download a raster to Lambda /tmp and return the local path
+    """
+    temp_file = f"/tmp/{uuid.uuid4().hex[:8]}-{os.path.basename(object_key)}"
+    S3_CLIENT.download_file(bucket_name, object_key, temp_file)
+    return temp_file
+
+def iter_raster_batches(source, dataset, partition, stats=None):
     """
+    Yield metric columns for the dataset grid, ROWS_PER_BATCH raster rows at a time
+
+    Only the window covering the grid bounding box is read from the file.
+    Pixel-centre coordinates assume a north-up raster. ``source`` is a local
+    path or a binary file object. If a quality-stats accumulator is given it
+    is updated with every batch.
+    """
+    grid = dataset['grid']
+
+    with rasterio.open(source) as src:
+        transform = src.transform
+
+        # Pixel window covering the grid bounding box
+        inverse = ~transform
+        col_a, row_a = inverse * (grid['lon_min'], grid['lat_max'])
+        col_b, row_b = inverse * (grid['lon_max'], grid['lat_min'])
+        row_start = max(int(np.floor(min(row_a, row_b))), 0)
+        row_stop = min(int(np.ceil(max(row_a, row_b))), src.height)
+        col_start = max(int(np.floor(min(col_a, col_b))), 0)
+        col_stop = min(int(np.ceil(max(col_a, col_b))), src.width)
+
+        if row_start >= row_stop or col_start >= col_stop:
+            return
+
+        lons_1d = transform.c + (np.arange(col_start, col_stop) + 0.5) * transform.a
+
+        for batch_start in range(row_start, row_stop, ROWS_PER_BATCH):
+            batch_stop = min(batch_start + ROWS_PER_BATCH, row_stop)
+            window = Window(col_start, batch_start, col_stop - col_start, batch_stop - batch_start)
+            raw = src.read(dataset['band'], window=window)
+
+            lats_1d = transform.f + (np.arange(batch_start, batch_stop) + 0.5) * transform.e
+            lons, lats = np.meshgrid(lons_1d, lats_1d)
+
+            # Exact grid filter (window edges may overhang the bounding box)
+            mask = ((lats >= grid['lat_min']) & (lats <= grid['lat_max']) &
+                   (lons >= grid['lon_min']) & (lons <= grid['lon_max']))
+
+            if not np.any(mask):
+                continue
+
+            values, valid, is_nodata = classify_pixels(raw[mask], dataset, src.nodata)
+            if stats is not None:
+                update_stats(stats, values, valid, is_nodata)
+
+            yield calculate_climate_metrics(values, valid, lats[mask], lons[mask], partition, dataset)
+
+def classify_pixels(raw_values, dataset, nodata=None):
+    """
+    Scale raw pixels to physical units and flag valid and nodata pixels
+    """
+    values = raw_values.astype(np.float64) * dataset['scale'] + dataset['offset']
+
+    is_nodata = np.zeros(values.shape, dtype=bool) if nodata is None else (raw_values == nodata)
+    valid = np.isfinite(values) & ~is_nodata
+    low, high = dataset['valid_range']
+    if low is not None:
+        valid &= values >= low
+    if high is not None:
+        valid &= values <= high
+
+    return values, valid, is_nodata
+
+def calculate_climate_metrics(values, valid, lats, lons, partition, dataset):
+    """
+    Calculate climate metrics for a batch of pixels, vectorized over numpy arrays
+    """
+    fill = np.nan if dataset['invalid_fill'] is None else dataset['invalid_fill']
+    count = len(values)
+
+    return {
+        'year': np.full(count, partition['year'], dtype=np.int64),
+        'month': np.full(count, partition['month'], dtype=np.int64),
+        'latitude': lats,
+        'longitude': lons,
+        dataset['variable']: np.where(valid, values, fill),
+        'region_code': np.full(count, dataset['grid']['region_code'], dtype=object),
+        'data_quality': np.where(valid, 'VALID', 'INVALID').astype(object)
+    }
+
+def save_to_parquet(batches, dataset, partition):
+    """
+    Stream metric batches to Parquet with partitioning and commit the file
+    to the table snapshot log. Returns the number of rows written.
+    """
+    temp_file = None
     try:
-        # Create partitioned path
-        partition_path = f"{PROCESSED_PREFIX}year={year}/month={month:02d}/"
-        filename = f"chirps_enriched_{year}_{month:02d}.parquet"
-        s3_key = f"{partition_path}{filename}"
-        
-        # Convert to PyArrow Table
-        table = pa.Table.from_pandas(df, preserve_index=False)
-        
-        # Write to temporary file
-        temp_file = f"/tmp/chirps_{year}_{month:02d}.parquet"
-        pq.write_table(table, temp_file, compression='snappy')
-        
-        # Upload to S3
-        S3_CLIENT.upload_file(temp_file, PROCESSED_BUCKET, s3_key)
-        
-        logger.info(f"Saved Parquet file: s3://{PROCESSED_BUCKET}/{s3_key}")
-        
-        # Clean up
-        os.remove(temp_file)
-        
+        temp_file, row_count = write_parquet_file(batches, dataset, partition)
+        if row_count:
+            publish_parquet_file(temp_file, dataset, partition)
+        return row_count
+
     except Exception as e:
         logger.error(f"Error saving Parquet: {str(e)}")
         raise
+    finally:
+        # Clean up
+        if temp_file and os.path.exists(temp_file):
+            os.remove(temp_file)
+
+def write_parquet_file(batches, dataset, partition):
+    """
+    Encode metric batches into a local Parquet file, one row group per batch.
+    Returns (local_path, row_count); no file is left behind when there are no
+    rows or encoding fails.
+    """
+    year, month = partition['year'], partition['month']
+    temp_file = f"/tmp/{dataset['file_stem']}_{year}_{month:02d}-{uuid.uuid4().hex[:8]}.parquet"
+    writer = None
+    row_count = 0
+
+    try:
+        for columns in batches:
+            table = pa.table(columns)
+            if writer is None:
+                writer = pq.ParquetWriter(temp_file, table.schema, compression='snappy')
+            writer.write_table(table)
+            row_count += table.num_rows
+        if writer is not None:
+            writer.close()
+    except Exception:
+        # The caller never learns the path of a partial file; /tmp outlives the invocation
+        if writer is not None and writer.is_open:
+            writer.close()
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
+    if writer is None:
+        return None, 0
+    return temp_file, row_count
+
+def publish_parquet_file(local_path, dataset, partition):
+    """
+    Upload an encoded Parquet file into a fresh commit directory of its
+    partition and commit it to the table snapshot log
+    """
+    year, month = partition['year'], partition['month']
+    partition = {'year': year, 'month': month}
+
+    # A new directory per commit; the catalog is pointed at it once the commit lands
+    directory = partition_directory(dataset['output_prefix'], partition, new_commit_id())
+    s3_key = f"{directory}{dataset['file_stem']}_{year}_{month:02d}.parquet"
+
+    # Upload to S3
+    S3_CLIENT.upload_file(local_path, PROCESSED_BUCKET, s3_key)
+
+    logger.info(f"Saved Parquet file: s3://{PROCESSED_BUCKET}/{s3_key}")
+
+    # Record the file and its column stats in a new snapshot
+    data_file = {
+        'key': s3_key,
+        'partition': partition,
+        'size_bytes': os.path.getsize(local_path),
+        **collect_file_stats(local_path)
+    }
+    try:
+        snapshot = commit_files(
+            S3_CLIENT, PROCESSED_BUCKET, dataset['table'],
+            f"s3://{PROCESSED_BUCKET}/{dataset['output_prefix']}", [data_file]
+        )
+    except Exception:
+        # No snapshot references the upload; do not leave it for prefix readers
+        S3_CLIENT.delete_object(Bucket=PROCESSED_BUCKET, Key=s3_key)
+        raise
+    register_written_partition(
+        dataset['table'], partition,
+        glue_columns(pq.read_schema(local_path), exclude=('year', 'month')),
+        (f"s3://{PROCESSED_BUCKET}/{directory}", snapshot['sequence_number'])
+    )
+    return s3_key
+
+def publish_quality_stats(stats, partition, object_key, row_count):
+    """
+    Write the quality-stats record of a processed file and log its summary
+    """
+    record = finalize_stats(stats, partition, object_key, row_count)
+    write_partition_stats(S3_CLIENT, PROCESSED_BUCKET, record)
+    register_written_partition(
+        QUALITY_STATS_TABLE,
+        {'dataset': record['dataset'], 'year': record['year'], 'month': record['month']},
+        QUALITY_STATS_COLUMNS
+    )
+    logger.info(
+        f"Quality: {record['valid_count']}/{record['pixel_count']} valid "
+        f"({record['coverage_pct']}% coverage), {record['nodata_count']} nodata, "
+        f"{record['invalid_count']} invalid"
+    )
+    return record
+
+def register_written_partition(table_name, partition, columns, commit=None):
+    """
+    Add a just-committed partition to the Glue catalog, pointed at the
+    ``(location, sequence_number)`` of its commit when given. The data is
+    already committed, so a catalog failure is logged rather than failing
+    the file.
+    """
+    global _GLUE_CLIENT
+    if not REGISTER_PARTITIONS:
+        return
+    with _GLUE_CLIENT_LOCK:
+        if _GLUE_CLIENT is None:
+            _GLUE_CLIENT = boto3.client('glue')
+    try:
+        register_partitions(_GLUE_CLIENT, GLUE_DATABASE, table_name, [partition], columns,
+                            [commit] if commit else None)
+    except Exception as e:
+        logger.warning(f"Could not register partition {partition} of {table_name}: {str(e)}")
+
+if RUNTIME_MODE == 'eager':
+    _load_runtime()
+
+INIT_DURATION_MS = round((time.perf_counter() - _INIT_STARTED) * 1000, 1)
 
 # Test function for local development
 def test_local_processing():
@@ -209,11 +452,11 @@ def test_local_processing():
             }
         ]
     }
-    
+
     # Mock context
     class MockContext:
         pass
-    
+
     return lambda_handler(test_event, MockContext())
 
 if __name__ == "__main__":
@@ -0,0 +1,369 @@
+"""
+Incremental materialized tables for the QuickSight datasets
+
+Each QuickSight dataset reads a precomputed Parquet table (``mv_{dataset}``)
+holding just its columns, instead of scanning the full assessment table on
+every SPICE refresh. Tables are partitioned by the day of their date column
+and maintained with Athena:
+
+- the first refresh creates the table with CTAS ... WITH NO DATA, lists the
+  source's days once and appends them with INSERT INTO, at most 100 days
+  (partitions) per statement;
+- later refreshes clear every partition from the watermark day on and
+  append everything from that day on, in 100-day windows - usually a single
+  statement. The watermark day may have gained rows since, and later days
+  may hold rows of a failed refresh that never recorded them;
+- the watermark (last materialized day) is stored next to the table in
+  ``processed/_materialized/{table}/state.json``. A refresh first swaps the
+  state to ``refreshing`` with a conditional PUT, which is its lock, and
+  advances the watermark after every statement, so a failed refresh resumes
+  from the last recorded window and two refreshes never write the same days.
+
+Every statement selects from the source with a range predicate on the raw
+date column, which Athena pushes down: Parquet sources skip row groups
+outside the range, and sources partitioned (or projected) on the date skip
+whole partitions. The assessment tables are currently neither, so each
+statement still reads the whole source: a routine refresh costs one source
+scan plus a scan of the new ``mv_`` partitions, the first build one scan per
+100 days. The saving is on the read side, where SPICE refreshes and
+dashboard queries read only the small ``mv_`` tables. Every summary reports
+the bytes actually scanned.
+
+``--rebuild`` drops a table and materializes it from scratch, which also
+compacts the small files left by frequent refreshes.
+"""
+
+import argparse
+import json
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from botocore.exceptions import ClientError
+
+from athena_client import DATABASE, AthenaClient
+
+logger = logging.getLogger()
+
+BUCKET_NAME = 'africlimate-analytics-lake'
+MATERIALIZED_PREFIX = 'processed/materialized/'
+STATE_PREFIX = 'processed/_materialized/'
+TABLE_PREFIX = 'mv_'
+PARTITION_COLUMN = 'partition_day'
+
+# Athena writes at most this many partitions per CTAS / INSERT INTO
+MAX_PARTITIONS_PER_WRITE = 100
+
+# A refresh lock older than this is taken to belong to a refresh that died
+LOCK_EXPIRY_SECONDS = 2 * 60 * 60
+
+# Literal of a day in the type of a source date column; the assessment
+# tables store ISO date strings
+DAY_LITERALS = {
+    'string': "'{day}'",
+    'date': "DATE '{day}'",
+    'timestamp': "TIMESTAMP '{day} 00:00:00'"
+}
+
+
+class RefreshInProgress(RuntimeError):
+    """Another refresh holds the table's state lock"""
+
+
+MATERIALIZED_TABLES = {
+    'drought_early_warning': {
+        'source': 'drought_alerts',
+        'date_column': 'analysis_date',
+        'date_type': 'string',
+        'columns': ['year', 'month', 'province', 'region', 'drought_level', 'risk_level',
+                    'monthly_precip', 'avg_spi', 'farmer_message', 'analysis_date']
+    },
+    'water_security': {
+        'source': 'water_security_metrics',
+        'date_column': 'analysis_date',
+        'date_type': 'string',
+        'columns': ['dam_name', 'province', 'current_capacity_percent', 'rainfall_status',
+                    'overall_security_score', 'risk_level', 'days_until_critical',
+                    'recommendations', 'analysis_date']
+    },
+    'ndvi_impact_tracker': {
+        'source': 'biodiversity_risk_assessments',
+        'date_column': 'assessment_date',
+        'date_type': 'string',
+        'columns': ['area_name', 'ecosystem', 'overall_metrics', 'risk_level', 'biodiversity_impact',
+                    'key_threats', 'recommendations', 'assessment_date']
+    },
+    'community_adaptation': {
+        'source': 'community_vulnerability_assessments',
+        'date_column': 'assessment_date',
+        'date_type': 'string',
+        'columns': ['settlement_name', 'population', 'overall_risk_level', 'primary_risks',
+                    'requires_immediate_action', 'vulnerability_factors', 'assessment_date']
+    },
+    'carbon_footprint': {
+        'source': 'carbon_impact_assessments',
+        'date_column': 'assessment_date',
+        'date_type': 'string',
+        'columns': ['energy_type', 'carbon_intensity_trend', 'climate_resilience',
+                    'transition_opportunities', 'carbon_risk_score', 'key_insights', 'assessment_date']
+    }
+}
+
+
+def table_name(dataset_name):
+    return f"{TABLE_PREFIX}{dataset_name}"
+
+
+def table_prefix(dataset_name):
+    return f"{MATERIALIZED_PREFIX}{table_name(dataset_name)}/"
+
+
+def state_key(dataset_name):
+    return f"{STATE_PREFIX}{table_name(dataset_name)}/state.json"
+
+
+def day_expression(column):
+    """Day (yyyy-MM-dd) of a date, timestamp or ISO string column"""
+    return f"substr(CAST({column} AS varchar), 1, 10)"
+
+
+def day_literal(spec, day):
+    return DAY_LITERALS[spec.get('date_type', 'string')].format(day=day)
+
+
+def day_range(spec, start, stop=None):
+    """Predicate on the raw date column (so it can be pushed down) for days in [start, stop)"""
+    column = spec['date_column']
+    predicate = f"{column} >= {day_literal(spec, start)}"
+    return f"{predicate} AND {column} < {day_literal(spec, stop)}" if stop else predicate
+
+
+def select_sql(spec, where=None):
+    """The dataset's columns plus the partition day, from its source table"""
+    columns = ', '.join(spec['columns'])
+    sql = (f"SELECT {columns}, {day_expression(spec['date_column'])} AS {PARTITION_COLUMN} "
+           f"FROM {DATABASE}.{spec['source']}")
+    return f"{sql} WHERE {where}" if where else sql
+
+
+def quicksight_sql(dataset_name):
+    """Dataset query for QuickSight, reading the materialized table"""
+    spec = MATERIALIZED_TABLES[dataset_name]
+    columns = ',\n'.join(f"    {column}" for column in spec['columns'])
+    return (f"SELECT \n{columns}\n"
+            f"FROM {DATABASE}.{table_name(dataset_name)}\n"
+            f"ORDER BY {spec['date_column']} DESC")
+
+
+def load_state(s3_client, dataset_name, bucket=BUCKET_NAME):
+    """(state, etag) of a materialized table, or (None, None) if it was never built"""
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=state_key(dataset_name))
+    except s3_client.exceptions.NoSuchKey:
+        return None, None
+    return json.loads(response['Body'].read()), response['ETag']
+
+
+def save_state(s3_client, dataset_name, state, etag, bucket=BUCKET_NAME):
+    """
+    Replace the state only if nothing else has written it since ``etag``
+    (None: only if there is no state yet); returns the new ETag
+    """
+    condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+    response = s3_client.put_object(
+        Bucket=bucket,
+        Key=state_key(dataset_name),
+        Body=json.dumps(state, default=str),
+        ContentType='application/json',
+        **condition
+    )
+    return response['ETag']
+
+
+def acquire_lock(s3_client, dataset_name, bucket=BUCKET_NAME):
+    """
+    Mark the table as refreshing before anything is deleted or written;
+    returns (state, etag). Raises RefreshInProgress if another refresh
+    holds the lock or takes it first.
+    """
+    state, etag = load_state(s3_client, dataset_name, bucket)
+    now = datetime.utcnow()
+    if state and state.get('status') == 'refreshing':
+        age = (now - datetime.fromisoformat(state['refreshing_since'])).total_seconds()
+        if age < LOCK_EXPIRY_SECONDS:
+            raise RefreshInProgress(f"{table_name(dataset_name)} is being refreshed since {state['refreshing_since']}")
+        logger.warning(f"Taking over the refresh lock of {table_name(dataset_name)} held since {state['refreshing_since']}")
+
+    state = {'watermark': None, 'created_at': now.isoformat(), **(state or {}),
+             'status': 'refreshing', 'refreshing_since': now.isoformat(), 'refresh_id': uuid.uuid4().hex}
+    try:
+        return state, save_state(s3_client, dataset_name, state, etag, bucket)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict'):
+            raise RefreshInProgress(f"Another refresh of {table_name(dataset_name)} started first") from e
+        raise
+
+
+def _delete_prefix(s3_client, prefix, bucket=BUCKET_NAME, start_after=''):
+    """Delete the objects under ``prefix``, only those whose keys sort after ``start_after`` if given"""
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix, StartAfter=start_after):
+        objects = [{'Key': obj['Key']} for obj in page.get('Contents', [])]
+        if objects:
+            s3_client.delete_objects(Bucket=bucket, Delete={'Objects': objects, 'Quiet': True})
+
+
+def create_table(athena, s3_client, dataset_name, bucket=BUCKET_NAME):
+    """(Re)create an empty materialized table with the dataset's columns"""
+    spec = MATERIALIZED_TABLES[dataset_name]
+    athena.execute(f"DROP TABLE IF EXISTS {DATABASE}.{table_name(dataset_name)}")
+    _delete_prefix(s3_client, table_prefix(dataset_name), bucket)
+    athena.execute(
+        f"CREATE TABLE {DATABASE}.{table_name(dataset_name)} WITH ("
+        f"format = 'PARQUET', write_compression = 'SNAPPY', "
+        f"external_location = 's3://{bucket}/{table_prefix(dataset_name)}', "
+        f"partitioned_by = ARRAY['{PARTITION_COLUMN}']"
+        f") AS {select_sql(spec)} WITH NO DATA"
+    )
+
+
+def _next_day(day, days=1):
+    return (date.fromisoformat(day) + timedelta(days=days)).isoformat()
+
+
+def plan_windows(athena, spec, watermark=None, today=None):
+    """
+    [start, stop) day ranges to append, each holding at most
+    MAX_PARTITIONS_PER_WRITE days, and the statistics of any planning query.
+    The last range is open-ended so rows dated after ``today`` are included.
+
+    From a watermark the ranges are calendar windows and need no query;
+    a first build lists the source's days once.
+    """
+    if watermark:
+        today = (today or date.today()).isoformat()
+        starts = [watermark]
+        while _next_day(starts[-1], MAX_PARTITIONS_PER_WRITE) <= today:
+            starts.append(_next_day(starts[-1], MAX_PARTITIONS_PER_WRITE))
+        return list(zip(starts, starts[1:] + [None])), None
+
+    day = day_expression(spec['date_column'])
+    table, stats = athena.query_arrow(
+        f"SELECT DISTINCT {day} AS day FROM {DATABASE}.{spec['source']} "
+        f"WHERE {spec['date_column']} IS NOT NULL ORDER BY 1"
+    )
+    days = table.column('day').to_pylist() if table.num_rows else []
+    starts = days[::MAX_PARTITIONS_PER_WRITE]
+    return list(zip(starts, starts[1:] + [None])), stats
+
+
+def last_materialized_day(athena, dataset_name, since):
+    """Latest partition day of the materialized table from ``since`` on (reads only those partitions)"""
+    table, stats = athena.query_arrow(
+        f"SELECT max({PARTITION_COLUMN}) AS day FROM {DATABASE}.{table_name(dataset_name)} "
+        f"WHERE {PARTITION_COLUMN} >= '{since}'"
+    )
+    return (table.column('day')[0].as_py() if table.num_rows else None), stats
+
+
+def refresh_table(athena, s3_client, dataset_name, rebuild=False, bucket=BUCKET_NAME):
+    """
+    Bring one materialized table up to date with its source; returns a
+    summary with the days covered, statements run and bytes scanned
+    """
+    spec = MATERIALIZED_TABLES[dataset_name]
+    state, etag = acquire_lock(s3_client, dataset_name, bucket)
+    previous_watermark = state['watermark']
+    statements = []
+
+    try:
+        if rebuild or not previous_watermark:
+            create_table(athena, s3_client, dataset_name, bucket)
+            state['watermark'] = None
+
+        windows, plan_stats = plan_windows(athena, spec, state['watermark'])
+        if plan_stats:
+            statements.append(plan_stats)
+        if state['watermark']:
+            # Everything from the watermark day on is rewritten: that day may have gained rows, and an
+            # INSERT that failed part-way or whose watermark was never saved may have left later days.
+            # Day keys sort by date, so only these partitions are listed.
+            prefix = table_prefix(dataset_name)
+            _delete_prefix(s3_client, prefix, bucket, start_after=f"{prefix}{PARTITION_COLUMN}={state['watermark']}")
+
+        for start, stop in windows:
+            statements.append(athena.execute(
+                f"INSERT INTO {DATABASE}.{table_name(dataset_name)} {select_sql(spec, day_range(spec, start, stop))}"
+            ))
+            written, stats = last_materialized_day(athena, dataset_name, start)
+            statements.append(stats)
+            if written:
+                # Later windows only run once this one is recorded, so a retry resumes here
+                state['watermark'] = written
+                etag = save_state(s3_client, dataset_name, state, etag, bucket)
+    except Exception as e:
+        state.update({'status': 'failed', 'error': str(e), 'failed_at': datetime.utcnow().isoformat()})
+        try:
+            save_state(s3_client, dataset_name, state, etag, bucket)
+        except Exception:
+            logger.error(f"Could not release the refresh lock of {table_name(dataset_name)}; it expires on its own")
+        raise
+
+    summary = {
+        'table': table_name(dataset_name),
+        'previous_watermark': previous_watermark,
+        'watermark': state['watermark'],
+        'windows': len(windows),
+        'statements': len(statements),
+        'bytes_scanned': sum(s['bytes_scanned'] for s in statements)
+    }
+    state.update({
+        'status': 'idle',
+        'error': None,
+        'refreshed_at': datetime.utcnow().isoformat(),
+        'last_refresh': {k: summary[k] for k in ('windows', 'statements', 'bytes_scanned')}
+    })
+    save_state(s3_client, dataset_name, state, etag, bucket)
+    logger.info(f"Refreshed {summary['table']}: up to {summary['watermark']} in {len(windows)} window(s), "
+                f"{summary['bytes_scanned'] / 1024 ** 2:.1f} MiB scanned")
+    return summary
+
+
+def refresh_all(athena=None, s3_client=None, datasets=None, rebuild=False, bucket=BUCKET_NAME):
+    """Refresh the given (default: all) materialized tables concurrently; returns {dataset: summary or error}"""
+    import boto3
+
+    athena = athena or AthenaClient()
+    s3_client = s3_client or boto3.client('s3')
+    datasets = list(datasets or MATERIALIZED_TABLES)
+
+    def refresh(dataset_name):
+        try:
+            return refresh_table(athena, s3_client, dataset_name, rebuild, bucket)
+        except Exception as e:
+            logger.error(f"Refresh of {table_name(dataset_name)} failed: {str(e)}")
+            return e
+
+    with ThreadPoolExecutor(max_workers=min(len(datasets), athena.max_concurrency) or 1) as executor:
+        return dict(zip(datasets, executor.map(refresh, datasets)))
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Refresh the materialized QuickSight tables')
+    parser.add_argument('--datasets', nargs='+', choices=sorted(MATERIALIZED_TABLES), help='Default: all')
+    parser.add_argument('--rebuild', action='store_true', help='Drop and rebuild from the full source tables')
+    args = parser.parse_args()
+
+    print("🧱 Refreshing materialized QuickSight tables...")
+    for dataset_name, result in refresh_all(datasets=args.datasets, rebuild=args.rebuild).items():
+        if isinstance(result, Exception):
+            print(f"❌ {table_name(dataset_name)}: {result}")
+        else:
+            print(f"✅ {result['table']}: {result['windows']} window(s) appended, watermark {result['watermark']}, "
+                  f"{result['bytes_scanned'] / 1024 ** 2:.1f} MiB scanned")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Cold Start Measurement for the ETL Lambda
+Imports lambda_etl_function in fresh interpreters and reports init and import times
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RUNS = 5
+
+# Executed in a fresh interpreter for every sample
+PROBE = """
+import json, time
+started = time.perf_counter()
+import lambda_etl_function as etl
+module_ms = (time.perf_counter() - started) * 1000
+etl._load_runtime()
+report = etl.get_runtime_report()
+report['module_import_ms'] = round(module_ms, 1)
+report['first_use_ms'] = round((time.perf_counter() - started) * 1000 - module_ms, 1)
+print(json.dumps(report))
+"""
+
+# Cost of the pandas import the handler no longer pays
+PANDAS_PROBE = """
+import time
+started = time.perf_counter()
+import pandas
+print(round((time.perf_counter() - started) * 1000, 1))
+"""
+
+
+def run_probe(code, env):
+    """Run a probe in a new interpreter and return its last stdout line"""
+    result = subprocess.run(
+        [sys.executable, '-c', code],
+        capture_output=True, text=True, env=env,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+    return result.stdout.strip().splitlines()[-1]
+
+
+def measure_mode(mode):
+    """Median timings over RUNS fresh interpreters for one runtime mode"""
+    env = dict(os.environ, ETL_RUNTIME_MODE=mode)
+    env.setdefault('AWS_DEFAULT_REGION', 'af-south-1')
+
+    samples = [json.loads(run_probe(PROBE, env)) for _ in range(RUNS)]
+
+    imports = {}
+    for name in samples[0]['import_ms']:
+        imports[name] = statistics.median(s['import_ms'][name] for s in samples)
+
+    return {
+        'mode': mode,
+        'init_ms': statistics.median(s['init_ms'] for s in samples),
+        'module_import_ms': statistics.median(s['module_import_ms'] for s in samples),
+        'first_use_ms': statistics.median(s['first_use_ms'] for s in samples),
+        'import_ms': imports
+    }
+
+
+def main():
+    """Print a cold start report for lean and eager modes"""
+    print("AfriClimate ETL Lambda - Cold Start Report")
+    print("=" * 50)
+
+    reports = [measure_mode('lean'), measure_mode('eager')]
+
+    for report in reports:
+        print(f"\nMode: {report['mode']} (median of {RUNS} runs)")
+        print(f"  Init duration:      {report['init_ms']:.1f} ms")
+        print(f"  Module import:      {report['module_import_ms']:.1f} ms")
+        print(f"  First-use loading:  {report['first_use_ms']:.1f} ms")
+        for name, ms in report['import_ms'].items():
+            print(f"    {name:<20} {ms:.1f} ms")
+
+    try:
+        pandas_ms = float(run_probe(PANDAS_PROBE, dict(os.environ)))
+        print(f"\npandas import avoided per cold start: {pandas_ms:.1f} ms")
+    except RuntimeError:
+        print("\npandas not installed; skipping pandas import measurement")
+
+    print("\n" + json.dumps(reports))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Per-partition data-quality statistics for the raster ETL
+
+Statistics are accumulated batch by batch while the ETL streams a raster, so
+they cost no extra pass over the data. Each processed file leaves one small
+JSON record at:
+
+    processed/quality_stats/dataset={name}/year={yyyy}/month={mm}/stats.json
+
+Freshness and quality dashboards, and the DataIngestionCheck validator, read
+these records instead of scanning the enriched tables.
+"""
+
+import json
+from datetime import datetime
+
+STATS_PREFIX = 'processed/quality_stats/'
+QUALITY_STATS_TABLE = 'quality_stats'
+
+# Glue columns of a stats record; dataset, year and month are partition keys
+QUALITY_STATS_COLUMNS = [
+    ('variable', 'string'),
+    ('source_key', 'string'),
+    ('processed_at', 'string'),
+    ('row_count', 'bigint'),
+    ('pixel_count', 'bigint'),
+    ('valid_count', 'bigint'),
+    ('nodata_count', 'bigint'),
+    ('invalid_count', 'bigint'),
+    ('coverage_pct', 'double'),
+    ('min', 'double'),
+    ('max', 'double'),
+    ('mean', 'double'),
+    ('stddev', 'double'),
+    ('histogram_edges', 'array<double>'),
+    ('histogram_counts', 'array<bigint>')
+]
+
+
+def new_stats(dataset):
+    """Empty accumulator for one raster of a dataset"""
+    edges = dataset['histogram_edges']
+    return {
+        'dataset': dataset['name'],
+        'variable': dataset['variable'],
+        'pixel_count': 0,
+        'valid_count': 0,
+        'nodata_count': 0,
+        'invalid_count': 0,
+        'min': None,
+        'max': None,
+        'sum': 0.0,
+        'sum_sq': 0.0,
+        'histogram_edges': list(edges),
+        'histogram_counts': [0] * (len(edges) - 1)
+    }
+
+
+def update_stats(stats, values, valid, is_nodata):
+    """
+    Fold one batch into the accumulator
+
+    ``values`` are in physical units; ``valid`` and ``is_nodata`` are boolean
+    masks of the same shape. Values outside the histogram edges are counted
+    in the first or last bin.
+    """
+    import numpy as np
+
+    stats['pixel_count'] += int(values.size)
+    stats['nodata_count'] += int(np.count_nonzero(is_nodata))
+    stats['invalid_count'] += int(np.count_nonzero(~valid & ~is_nodata))
+
+    good = values[valid]
+    if good.size == 0:
+        return
+
+    stats['valid_count'] += int(good.size)
+    batch_min, batch_max = float(good.min()), float(good.max())
+    stats['min'] = batch_min if stats['min'] is None else min(stats['min'], batch_min)
+    stats['max'] = batch_max if stats['max'] is None else max(stats['max'], batch_max)
+    stats['sum'] += float(good.sum())
+    stats['sum_sq'] += float(np.square(good).sum())
+
+    edges = stats['histogram_edges']
+    counts, _ = np.histogram(np.clip(good, edges[0], edges[-1]), bins=edges)
+    stats['histogram_counts'] = [a + int(b) for a, b in zip(stats['histogram_counts'], counts)]
+
+
+def finalize_stats(stats, partition, source_key, row_count):
+    """Turn an accumulator into the record written to the stats table"""
+    valid = stats['valid_count']
+    mean = stats['sum'] / valid if valid else None
+    variance = max(stats['sum_sq'] / valid - mean * mean, 0.0) if valid else None
+
+    return {
+        'dataset': stats['dataset'],
+        'variable': stats['variable'],
+        'year': partition['year'],
+        'month': partition['month'],
+        'source_key': source_key,
+        'processed_at': datetime.utcnow().isoformat() + 'Z',
+        'row_count': row_count,
+        'pixel_count': stats['pixel_count'],
+        'valid_count': valid,
+        'nodata_count': stats['nodata_count'],
+        'invalid_count': stats['invalid_count'],
+        'coverage_pct': round(100.0 * valid / stats['pixel_count'], 3) if stats['pixel_count'] else 0.0,
+        'min': stats['min'],
+        'max': stats['max'],
+        'mean': mean,
+        'stddev': variance ** 0.5 if variance is not None else None,
+        'histogram_edges': stats['histogram_edges'],
+        'histogram_counts': stats['histogram_counts']
+    }
+
+
+def stats_key(dataset_name, year, month):
+    """S3 key of the stats record for one partition"""
+    return f"{STATS_PREFIX}dataset={dataset_name}/year={year}/month={month:02d}/stats.json"
+
+
+def write_partition_stats(s3_client, bucket, record):
+    """Write a finalized stats record as a single JSON line"""
+    key = stats_key(record['dataset'], record['year'], record['month'])
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=json.dumps(record) + '\n',
+        ContentType='application/json'
+    )
+    return key
+
+
+def read_partition_stats(s3_client, bucket, dataset_name, year, month):
+    """Fetch the stats record of one partition, or None if it was never processed"""
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=stats_key(dataset_name, year, month))
+    except s3_client.exceptions.NoSuchKey:
+        return None
+    return json.loads(response['Body'].read())
@@ -1,7 +1,6 @@
 -- Carbon Footprint
 -- AfriClimate Analytics Lake
--- Generated: 2026-02-05 13:39:45
-
+-- Generated: 2026-10-19 03:01:22
 
 -- Carbon Footprint Dataset
 SELECT 
@@ -12,6 +11,5 @@ SELECT
     carbon_risk_score,
     key_insights,
     assessment_date
-FROM africlimate_climate_db.carbon_impact_assessments
+FROM africlimate_climate_db.mv_carbon_footprint
 ORDER BY assessment_date DESC
-    
\ No newline at end of file
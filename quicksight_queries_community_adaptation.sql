@@ -1,7 +1,6 @@
 -- Community Adaptation
 -- AfriClimate Analytics Lake
--- Generated: 2026-02-05 13:39:45
-
+-- Generated: 2026-10-19 03:01:22
 
 -- Community Adaptation Dataset
 SELECT 
@@ -12,6 +11,5 @@ SELECT
     requires_immediate_action,
     vulnerability_factors,
     assessment_date
-FROM africlimate_climate_db.community_vulnerability_assessments
+FROM africlimate_climate_db.mv_community_adaptation
 ORDER BY assessment_date DESC
-    
\ No newline at end of file
@@ -1,7 +1,6 @@
 -- Drought Early Warning
 -- AfriClimate Analytics Lake
--- Generated: 2026-02-05 13:39:45
-
+-- Generated: 2026-10-19 03:01:22
 
 -- Drought Early Warning Dataset
 SELECT 
@@ -15,6 +14,5 @@ SELECT
     avg_spi,
     farmer_message,
     analysis_date
-FROM africlimate_climate_db.drought_alerts
+FROM africlimate_climate_db.mv_drought_early_warning
 ORDER BY analysis_date DESC
-    
\ No newline at end of file
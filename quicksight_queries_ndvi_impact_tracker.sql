@@ -1,9 +1,8 @@
 -- Ndvi Impact Tracker
 -- AfriClimate Analytics Lake
--- Generated: 2026-02-05 13:39:45
+-- Generated: 2026-10-19 03:01:22
 
-
--- NDVI Impact Tracker Dataset
+-- Ndvi Impact Tracker Dataset
 SELECT 
     area_name,
     ecosystem,
@@ -13,6 +12,5 @@ SELECT
     key_threats,
     recommendations,
     assessment_date
-FROM africlimate_climate_db.biodiversity_risk_assessments
+FROM africlimate_climate_db.mv_ndvi_impact_tracker
 ORDER BY assessment_date DESC
-    
\ No newline at end of file
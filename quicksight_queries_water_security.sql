@@ -1,7 +1,6 @@
 -- Water Security
 -- AfriClimate Analytics Lake
--- Generated: 2026-02-05 13:39:45
-
+-- Generated: 2026-10-19 03:01:22
 
 -- Water Security Dataset
 SELECT 
@@ -14,6 +13,5 @@ SELECT
     days_until_critical,
     recommendations,
     analysis_date
-FROM africlimate_climate_db.water_security_metrics
+FROM africlimate_climate_db.mv_water_security
 ORDER BY analysis_date DESC
-    
\ No newline at end of file
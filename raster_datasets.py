@@ -0,0 +1,117 @@
+"""
+Raster dataset registry for the ETL engine
+
+Each dataset declares where its rasters land, how to parse a date out of the
+filename, which band holds the variable and how raw values map to physical
+units. The ETL handler looks datasets up here, so adding NDVI, temperature or
+soil moisture is a registry entry rather than another copy of the pipeline.
+"""
+
+import os
+import re
+
+# Southern Africa bounding box shared by all regional products
+SOUTHERN_AFRICA_GRID = {
+    'region_code': 'SOUTHERN_AFRICA',
+    'lat_min': -35,
+    'lat_max': -22,
+    'lon_min': 16,
+    'lon_max': 33
+}
+
+DATASETS = {
+    'chirps_monthly': {
+        'description': 'CHIRPS v2.0 monthly precipitation',
+        'raw_prefix': 'raw/chirps_monthly/',
+        'filename_pattern': r'^chirps-v2\.0_(?P<year>\d{4})\.(?P<month>\d{2})\.tif$',
+        'band': 1,
+        'scale': 1.0,
+        'offset': 0.0,
+        'valid_range': (0.0, None),
+        'invalid_fill': 0.0,
+        'variable': 'precipitation_mm',
+        'histogram_edges': [0, 1, 5, 10, 25, 50, 100, 200, 400, 1000],
+        'table': 'enriched_climate',
+        'output_prefix': 'processed/enriched_climate/',
+        'file_stem': 'chirps_enriched',
+        'grid': SOUTHERN_AFRICA_GRID
+    },
+    'ndvi_monthly': {
+        'description': 'Monthly NDVI composite (int16, scaled by 1e-4)',
+        'raw_prefix': 'external/ndvi-data/',
+        'filename_pattern': r'^ndvi_(?P<year>\d{4})\.(?P<month>\d{2})\.tif$',
+        'band': 1,
+        'scale': 0.0001,
+        'offset': 0.0,
+        'valid_range': (-1.0, 1.0),
+        'invalid_fill': None,
+        'variable': 'ndvi',
+        'histogram_edges': [-1.0, -0.2, 0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.8, 1.0],
+        'table': 'ndvi_enriched',
+        'output_prefix': 'processed/ndvi_enriched/',
+        'file_stem': 'ndvi_enriched',
+        'grid': SOUTHERN_AFRICA_GRID
+    },
+    'temperature_monthly': {
+        'description': 'Monthly land surface temperature (Kelvin, scaled by 0.02)',
+        'raw_prefix': 'external/temperature-data/',
+        'filename_pattern': r'^lst_(?P<year>\d{4})\.(?P<month>\d{2})\.tif$',
+        'band': 1,
+        'scale': 0.02,
+        'offset': -273.15,
+        'valid_range': (-60.0, 80.0),
+        'invalid_fill': None,
+        'variable': 'temperature_c',
+        'histogram_edges': [-60, -10, 0, 5, 10, 15, 20, 25, 30, 35, 40, 80],
+        'table': 'temperature_enriched',
+        'output_prefix': 'processed/temperature_enriched/',
+        'file_stem': 'temperature_enriched',
+        'grid': SOUTHERN_AFRICA_GRID
+    },
+    'soil_moisture_monthly': {
+        'description': 'Monthly volumetric soil moisture (m3/m3)',
+        'raw_prefix': 'external/soil-moisture-data/',
+        'filename_pattern': r'^soil_moisture_(?P<year>\d{4})\.(?P<month>\d{2})\.tif$',
+        'band': 1,
+        'scale': 1.0,
+        'offset': 0.0,
+        'valid_range': (0.0, 1.0),
+        'invalid_fill': None,
+        'variable': 'soil_moisture_m3m3',
+        'histogram_edges': [0.0, 0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.4, 0.5, 1.0],
+        'table': 'soil_moisture_enriched',
+        'output_prefix': 'processed/soil_moisture_enriched/',
+        'file_stem': 'soil_moisture_enriched',
+        'grid': SOUTHERN_AFRICA_GRID
+    }
+}
+
+_COMPILED_PATTERNS = {name: re.compile(spec['filename_pattern']) for name, spec in DATASETS.items()}
+
+
+def get_dataset(name):
+    """Return the spec of a registered dataset, with its name attached"""
+    if name not in DATASETS:
+        raise KeyError(f"Unknown raster dataset: {name}")
+    return {'name': name, **DATASETS[name]}
+
+
+def match_dataset(object_key):
+    """
+    Find the dataset an S3 key belongs to
+
+    Returns (dataset, partition) where partition holds the integer date
+    fields captured by the filename pattern, or (None, None) if no
+    registered dataset claims the key.
+    """
+    filename = os.path.basename(object_key)
+
+    for name, spec in DATASETS.items():
+        if not object_key.startswith(spec['raw_prefix']):
+            continue
+        match = _COMPILED_PATTERNS[name].match(filename)
+        if match:
+            partition = {field: int(value) for field, value in match.groupdict().items()}
+            return get_dataset(name), partition
+
+    return None, None
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Adaptive Transfer Control
+Retry backoff, AIMD concurrency and per-host token-bucket rate limiting for S3 transfers
+"""
+
+import logging
+import random
+import statistics
+import threading
+import time
+
+from botocore.exceptions import (
+    ClientError,
+    ConnectionClosedError,
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+    ResponseStreamingError
+)
+
+from transfer_integrity import ChecksumMismatch
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_CAP_SECONDS = 30.0
+
+THROTTLE_CODES = {'SlowDown', 'Throttling', 'ThrottlingException', 'RequestLimitExceeded', '503'}
+TRANSIENT_CODES = {'RequestTimeout', 'InternalError', 'ServiceUnavailable', '500', '502', '504'}
+TRANSIENT_EXCEPTIONS = (
+    ConnectionClosedError,
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ReadTimeoutError,
+    ResponseStreamingError
+)
+
+
+def classify_error(error):
+    """
+    Classify a transfer exception as 'throttle', 'transient', 'integrity'
+    (checksum mismatch, worth a fresh copy) or None (permanent)
+    """
+    if isinstance(error, ChecksumMismatch):
+        return 'integrity'
+    if isinstance(error, ClientError):
+        code = error.response.get('Error', {}).get('Code', '')
+        if code in THROTTLE_CODES:
+            return 'throttle'
+        if code in TRANSIENT_CODES:
+            return 'transient'
+        return None
+    if isinstance(error, TRANSIENT_EXCEPTIONS):
+        return 'transient'
+    return None
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE_SECONDS, cap=BACKOFF_CAP_SECONDS):
+    """Exponential backoff with full jitter for a 1-based attempt number"""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class TokenBucket:
+    """
+    Request-rate limiter for one host
+
+    The refill rate itself adapts: it is halved on throttling and grows by
+    ``increase_step`` requests per second for each ``quiet_interval`` of
+    successful requests without a throttle, so it settles just under the
+    rate the host will sustain.
+    """
+
+    def __init__(self, rate, burst=None, min_rate=1.0, max_rate=3500.0, increase_step=5.0, quiet_interval=1.0):
+        self.rate = rate
+        self.burst = burst or max(rate, 1.0)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.quiet_interval = quiet_interval
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._last_throttle = 0.0
+        self._last_increase = self._updated
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Block until one request may start"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def on_throttle(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._last_throttle = time.monotonic()
+
+    def on_success(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - max(self._last_throttle, self._last_increase) >= self.quiet_interval:
+                self._refill(now)
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+                self._last_increase = now
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on concurrent transfers
+
+    Every ``window`` completions the controller compares the window with
+    what it has seen so far: if the error rate exceeds ``max_error_rate`` or
+    the median seconds-per-MiB has degraded past ``latency_tolerance`` times
+    the best window, the limit is halved; otherwise it grows by one. The
+    best-window baseline drifts up slowly so one lucky window does not pin
+    the limit down forever. Workers call ``acquire``/``release`` around
+    each transfer.
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=64, window=20,
+                 max_error_rate=0.05, latency_tolerance=2.0, baseline_drift=1.05):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.window = window
+        self.max_error_rate = max_error_rate
+        self.latency_tolerance = latency_tolerance
+        self.baseline_drift = baseline_drift
+
+        self._active = 0
+        self._samples = []
+        self._errors = 0
+        self._best_latency = None
+        self._condition = threading.Condition()
+        self.history = [(time.time(), initial)]
+
+    def acquire(self):
+        with self._condition:
+            while self._active >= self.limit:
+                self._condition.wait()
+            self._active += 1
+
+    def release(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify()
+
+    def record(self, seconds, nbytes, error_kind=None):
+        """Feed one finished attempt into the controller"""
+        with self._condition:
+            if error_kind in ('throttle', 'transient'):
+                self._errors += 1
+            elif nbytes:
+                self._samples.append(seconds / max(nbytes / 1024 ** 2, 0.001))
+
+            if self._errors + len(self._samples) >= self.window:
+                self._adjust()
+
+    def _adjust(self):
+        total = self._errors + len(self._samples)
+        error_rate = self._errors / total
+        latency = statistics.median(self._samples) if self._samples else None
+
+        if latency is not None:
+            if self._best_latency is None:
+                self._best_latency = latency
+            else:
+                self._best_latency = min(latency, self._best_latency * self.baseline_drift)
+
+        degraded = latency is not None and latency > self._best_latency * self.latency_tolerance
+        previous = self.limit
+        if error_rate > self.max_error_rate or degraded:
+            self.limit = max(self.minimum, self.limit // 2)
+        else:
+            self.limit = min(self.maximum, self.limit + 1)
+
+        if self.limit != previous:
+            logger.info(
+                f"Concurrency {previous} -> {self.limit} "
+                f"(error rate {error_rate:.1%}, {latency or 0:.2f}s/MiB)"
+            )
+            self.history.append((time.time(), self.limit))
+            self._condition.notify_all()
+
+        self._samples = []
+        self._errors = 0
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Asyncio Transfer Runner
+Drives a TransferEngine from one event loop with bounded in-flight list, get and put operations
+"""
+
+import asyncio
+import functools
+import itertools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from adaptive_control import MAX_ATTEMPTS, backoff_delay, classify_error
+from transfer_engine import transfer_result
+from transfer_integrity import hashing_reader
+
+logger = logging.getLogger(__name__)
+
+# Keys pulled from the listing per executor call
+LIST_BATCH_SIZE = 100
+
+# Objects admitted to the loop (waiting or running) per get/put slot
+PENDING_PER_SLOT = 4
+
+
+def _next_batch(iterator):
+    return list(itertools.islice(iterator, LIST_BATCH_SIZE))
+
+
+class AsyncTransferRunner:
+    """
+    Event-loop alternative to ``TransferEngine.run``
+
+    Each object is a coroutine rather than a thread. Blocking SDK calls run
+    on one dedicated executor whose size is the sum of the get and put
+    limits, so thousands of queued objects cost a few KiB each instead of a
+    thread each. Three limits apply:
+
+    * list: the key iterator (usually the sharded listing) is drained on
+      the executor one batch at a time, never more than one call in flight
+    * get: concurrent ``get_object`` calls; objects below the multipart
+      threshold are read (and hashed) into memory inside this slot, which
+      is held until the object has a put slot, so at most
+      ``max_gets + max_puts`` bodies are open or buffered at once
+    * put: concurrent uploads, hashing larger objects as they stream
+
+    The engine supplies clients, transfer config, token buckets and the
+    AIMD controller, whose limit caps objects being transferred. Results
+    and ``run(filenames, on_result)`` match the threaded engine so the two
+    can be swapped and benchmarked.
+    """
+
+    def __init__(self, engine, max_gets=None, max_puts=None):
+        self.engine = engine
+        self.max_gets = max_gets or engine.max_workers
+        self.max_puts = max_puts or engine.max_workers
+        self.max_pending = (self.max_gets + self.max_puts) * PENDING_PER_SLOT
+
+    def run(self, filenames, on_result=None):
+        """Transfer many objects; ``on_result`` is called as each one finishes"""
+        return asyncio.run(self._run(filenames, on_result))
+
+    async def _run(self, filenames, on_result):
+        loop = asyncio.get_running_loop()
+        self._gets = asyncio.Semaphore(self.max_gets)
+        self._puts = asyncio.Semaphore(self.max_puts)
+        self._slots = asyncio.Condition()
+        self._active = 0
+
+        pending = asyncio.Semaphore(self.max_pending)
+        tasks = set()
+        results = []
+
+        def finished(task):
+            tasks.discard(task)
+            pending.release()
+            result = task.result()
+            results.append(result)
+            if on_result:
+                on_result(result)
+
+        executor = ThreadPoolExecutor(max_workers=self.max_gets + self.max_puts + 1, thread_name_prefix='async-io')
+        self._executor = executor
+        try:
+            iterator = iter(filenames)
+            while True:
+                batch = await loop.run_in_executor(executor, _next_batch, iterator)
+                if not batch:
+                    break
+                for filename in batch:
+                    await pending.acquire()
+                    task = asyncio.create_task(self.copy_file(filename))
+                    tasks.add(task)
+                    task.add_done_callback(finished)
+            if tasks:
+                await asyncio.wait(set(tasks))
+        finally:
+            executor.shutdown(wait=True)
+
+        return results
+
+    async def _call(self, func, *args, **kwargs):
+        """Run a blocking call on the dedicated executor"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def _acquire_slot(self):
+        if not self.engine.concurrency:
+            return
+        async with self._slots:
+            await self._slots.wait_for(lambda: self._active < self.engine.concurrency.limit)
+            self._active += 1
+
+    async def _release_slot(self):
+        if not self.engine.concurrency:
+            return
+        async with self._slots:
+            self._active -= 1
+            self._slots.notify(max(1, self.engine.concurrency.limit - self._active))
+
+    def _get(self, source_key):
+        engine = self.engine
+        if engine.source_limiter:
+            engine.source_limiter.acquire()
+        response = engine.source_client.get_object(Bucket=engine.source_bucket, Key=source_key)
+        response['Body'] = hashing_reader(engine.source_client, engine.source_bucket, source_key, response)
+        if response['ContentLength'] < engine.transfer_config.multipart_threshold:
+            response['Data'] = response['Body'].read()
+        return response
+
+    def _put(self, response, target_key):
+        engine = self.engine
+        extra_args = {'ContentType': response['ContentType']} if response.get('ContentType') else {}
+        if engine.target_limiter:
+            engine.target_limiter.acquire()
+        if 'Data' in response:
+            engine.target_client.put_object(
+                Bucket=engine.target_bucket, Key=target_key, Body=response['Data'], **extra_args
+            )
+        else:
+            engine.target_client.upload_fileobj(
+                response['Body'], engine.target_bucket, target_key,
+                ExtraArgs=extra_args or None, Config=engine.transfer_config
+            )
+
+    async def _copy_once(self, source_key, target_key):
+        # The get slot is handed over only once the put slot is taken, so open
+        # or buffered bodies never exceed max_gets + max_puts
+        await self._gets.acquire()
+        try:
+            response = await self._call(self._get, source_key)
+            await self._puts.acquire()
+        finally:
+            self._gets.release()
+        try:
+            await self._call(self._put, response, target_key)
+            verified = await self._call(self.engine._verify, response['Body'], target_key)
+        finally:
+            self._puts.release()
+        return response['ContentLength'], verified
+
+    async def copy_file(self, filename):
+        """Coroutine counterpart of ``TransferEngine.copy_file``"""
+        engine = self.engine
+        source_key = f"{engine.source_prefix}{filename}"
+        target_key = f"{engine.target_prefix}{filename}"
+        started = time.perf_counter()
+        attempt = 0
+
+        while True:
+            attempt += 1
+            attempt_started = time.perf_counter()
+            nbytes, verified, error = 0, None, None
+
+            await self._acquire_slot()
+            try:
+                nbytes, verified = await self._copy_once(source_key, target_key)
+            except Exception as e:
+                error = e
+            finally:
+                await self._release_slot()
+
+            error_kind = classify_error(error) if error else None
+            engine._feedback(error, error_kind, time.perf_counter() - attempt_started, nbytes)
+
+            if error is None:
+                return transfer_result(filename, started, attempt, nbytes, verified)
+
+            if error_kind is None or attempt >= MAX_ATTEMPTS:
+                logger.error(f"Failed to transfer {filename} after {attempt} attempt(s): {str(error)}")
+                return transfer_result(filename, started, attempt, error=error)
+
+            delay = backoff_delay(attempt)
+            logger.warning(f"Retrying {filename} in {delay:.1f}s ({error_kind}: {str(error)})")
+            await asyncio.sleep(delay)
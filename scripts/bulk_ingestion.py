@@ -1,14 +1,21 @@
 #!/usr/bin/env python3
 """
 Bulk CHIRPS Data Ingestion Script
-Downloads and uploads CHIRPS monthly rainfall data from DE Africa to S3
+Copies CHIRPS monthly rainfall data from DE Africa to S3
 """
 
-import subprocess
-import os
+import argparse
+import json
 import logging
 from datetime import datetime
 
+from async_runner import AsyncTransferRunner
+from delta_sync import list_objects, plan_sync
+from ingestion_journal import DEFAULT_JOURNAL_PATH, IngestionJournal
+from ingestion_telemetry import DEFAULT_REPORT_PATH, IngestionTelemetry, emf_record
+from s3_listing import iter_objects, year_shards
+from transfer_engine import DEFAULT_WORKERS, TransferEngine
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -20,97 +27,168 @@ TARGET_BUCKET = 'africlimate-analytics-lake'
 TARGET_PREFIX = 'raw/chirps_monthly/'
 REGION = 'af-south-1'
 
-def run_command(cmd):
-    """Execute shell command and return result"""
-    try:
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-        if result.returncode == 0:
-            logger.info(f"Command succeeded: {cmd}")
-            return True, result.stdout
-        else:
-            logger.error(f"Command failed: {cmd}")
-            logger.error(f"Error: {result.stderr}")
-            return False, result.stderr
-    except Exception as e:
-        logger.error(f"Exception running command: {cmd}")
-        logger.error(f"Exception: {str(e)}")
-        return False, str(e)
+# Listing shards: one per year of the flat chirps-v2.0_YYYY.MM.tif layout
+SHARD_TEMPLATE = 'chirps-v2.0_{year}.'
+FIRST_YEAR = 1981
 
-def download_and_upload_file(filename):
-    """Download single file from DE Africa and upload to target S3"""
-    logger.info(f"Processing: {filename}")
-    
-    # Download from DE Africa
-    download_cmd = f"aws s3 cp --region {REGION} --no-sign-request s3://{DE_AFRICA_BUCKET}/{DE_AFRICA_PREFIX}{filename} ./{filename}"
-    success, output = run_command(download_cmd)
-    
-    if not success:
-        logger.error(f"Failed to download: {filename}")
-        return False
-    
-    # Upload to target S3
-    upload_cmd = f"aws s3 cp ./{filename} s3://{TARGET_BUCKET}/{TARGET_PREFIX}"
-    success, output = run_command(upload_cmd)
-    
-    if not success:
-        logger.error(f"Failed to upload: {filename}")
-        return False
-    
-    # Clean up local file
-    try:
-        os.remove(filename)
-        logger.info(f"Cleaned up local file: {filename}")
-    except Exception as e:
-        logger.warning(f"Failed to clean up {filename}: {str(e)}")
-    
-    return True
+def iter_source_objects(client):
+    """Yield CHIRPS objects from DE Africa as the sharded listing discovers them"""
+    shards = year_shards(DE_AFRICA_PREFIX, SHARD_TEMPLATE, FIRST_YEAR)
+    return iter_objects(client, DE_AFRICA_BUCKET, DE_AFRICA_PREFIX, shards=shards, suffix='.tif')
 
-def get_file_list():
+def iter_file_list(client):
+    """Yield CHIRPS filenames from DE Africa as the sharded listing discovers them"""
+    for entry in iter_source_objects(client):
+        yield entry['relative_key']
+
+def get_file_list(client):
     """Get list of CHIRPS files from DE Africa"""
     logger.info("Getting file list from DE Africa...")
-    
-    cmd = f"aws s3 ls --region {REGION} --no-sign-request s3://{DE_AFRICA_BUCKET}/{DE_AFRICA_PREFIX}"
-    success, output = run_command(cmd)
-    
-    if not success:
-        logger.error("Failed to get file list")
-        return []
-    
-    # Parse filenames from output
-    files = []
-    for line in output.split('\n'):
-        if '.tif' in line:
-            parts = line.strip().split()
-            if len(parts) >= 4:
-                filename = parts[-1]
-                if filename.endswith('.tif'):
-                    files.append(filename)
-    
+    files = sorted(iter_file_list(client))
     logger.info(f"Found {len(files)} TIFF files")
     return files
 
+def pending_files(entries, journal, completed, skipped):
+    """Journal listed objects and yield those not already completed by an earlier run"""
+    for entry in entries:
+        filename = entry['relative_key']
+        if filename in completed:
+            skipped.append(filename)
+            continue
+        journal.record(filename, 'listed', size=entry['size'], etag=entry['etag'])
+        yield filename
+
+def parse_args():
+    """Command line options"""
+    parser = argparse.ArgumentParser(description='Bulk CHIRPS data ingestion')
+    parser.add_argument('--mode', choices=['copy', 'sync', 'fused'], default='copy',
+                        help='copy: transfer every source file; sync: only new or changed files; '
+                             'fused: read each file once and write Parquet directly')
+    parser.add_argument('--no-archive-raw', action='store_true',
+                        help='fused mode only: do not keep a copy of the raw rasters')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help='Concurrent object transfers (upper bound in adaptive mode)')
+    parser.add_argument('--runner', choices=['threads', 'asyncio'], default='threads',
+                        help='threads: one worker thread per transfer; asyncio: one event loop with '
+                             'bounded in-flight list/get/put calls (copy and sync modes)')
+    parser.add_argument('--concurrency', choices=['adaptive', 'fixed'], default='adaptive',
+                        help='adaptive: AIMD concurrency and per-host rate limits; fixed: always use --workers')
+    parser.add_argument('--journal', default=DEFAULT_JOURNAL_PATH,
+                        help='Checkpoint journal (SQLite) used to resume interrupted runs')
+    parser.add_argument('--no-resume', action='store_true',
+                        help='Ignore completed objects in the journal and copy everything again')
+    parser.add_argument('--retry-failed', action='store_true',
+                        help='Only retry objects the journal records as failed')
+    parser.add_argument('--report', default=DEFAULT_REPORT_PATH,
+                        help='Where to write the JSON run report')
+    parser.add_argument('--emf', action='store_true',
+                        help='Print the run metrics in CloudWatch Embedded Metric Format')
+    args = parser.parse_args()
+    if args.runner == 'asyncio' and args.mode == 'fused':
+        parser.error('--runner asyncio supports copy and sync modes only')
+    return args
+
 def main():
     """Main ingestion function"""
+    args = parse_args()
     logger.info("Starting bulk CHIRPS data ingestion")
     start_time = datetime.now()
     
+    engine_args = (DE_AFRICA_BUCKET, DE_AFRICA_PREFIX, TARGET_BUCKET, TARGET_PREFIX)
+    engine_options = {'max_workers': args.workers, 'adaptive': args.concurrency == 'adaptive'}
+    if args.mode == 'fused':
+        # Imported here: pulls in the raster conversion stack
+        from fused_ingest import FusedIngestor
+        engine = FusedIngestor(*engine_args, archive_raw=not args.no_archive_raw, **engine_options)
+    else:
+        engine = TransferEngine(*engine_args, **engine_options)
+    runner = engine
+    if args.runner == 'asyncio':
+        runner = AsyncTransferRunner(engine)
+    journal = IngestionJournal(args.journal)
+    completed_before = set() if args.no_resume else journal.completed_keys()
+    if completed_before:
+        logger.info(f"Resuming: {len(completed_before)} files already completed in {args.journal}")
+    
     # Get file list
-    files = get_file_list()
-    if not files:
-        logger.error("No files found to process")
-        return
+    skipped = []
+    to_copy = {}
+    if args.retry_failed:
+        files = journal.keys_in_state('failed')
+        telemetry = IngestionTelemetry(total=len(files))
+    elif args.mode == 'sync':
+        # Compare both sides and keep only new or changed objects
+        source_objects = list_objects(
+            engine.source_client, DE_AFRICA_BUCKET, DE_AFRICA_PREFIX, suffix='.tif',
+            shards=year_shards(DE_AFRICA_PREFIX, SHARD_TEMPLATE, FIRST_YEAR)
+        )
+        target_objects = list_objects(
+            engine.target_client, TARGET_BUCKET, TARGET_PREFIX, suffix='.tif',
+            shards=year_shards(TARGET_PREFIX, SHARD_TEMPLATE, FIRST_YEAR)
+        )
+        to_copy, skipped = plan_sync(source_objects, target_objects)
+        files = list(to_copy)
+        for filename in files:
+            source = source_objects[filename]
+            journal.record(filename, 'listed', size=source['size'], etag=source['etag'])
+        if source_objects and not files:
+            logger.info(f"All {len(skipped)} files are up to date, nothing to copy")
+            journal.close()
+            return
+        telemetry = IngestionTelemetry(total=len(files))
+    else:
+        # Transfers start while the listing is still running
+        telemetry = IngestionTelemetry()
+        files = telemetry.track_listing(
+            pending_files(iter_source_objects(engine.source_client), journal, completed_before, skipped)
+        )
     
-    # Process files
-    successful = 0
-    failed = 0
+    # Stream every file from DE Africa straight into the lake (and convert it in fused mode)
+    def on_result(result):
+        telemetry.record(result)
+        if not result['success']:
+            state = 'failed'
+        else:
+            state = 'verified' if result['verified'] else 'transferred'
+        journal.record(
+            result['filename'],
+            state,
+            size=result['bytes'] or None,
+            error=result['error']
+        )
+        logger.info(telemetry.progress_line(result['filename']))
+    
+    try:
+        results = runner.run(files, on_result=on_result)
+    finally:
+        journal.flush()
     
-    for i, filename in enumerate(files, 1):
-        logger.info(f"Progress: {i}/{len(files)}")
-        
-        if download_and_upload_file(filename):
-            successful += 1
+    if not results:
+        if skipped:
+            logger.info(f"All {len(skipped)} files already completed, nothing to copy")
         else:
-            failed += 1
+            logger.error("No files found to process")
+        journal.close()
+        return
+    
+    journal_counts = journal.summary()
+    journal.close()
+    
+    mode = 'retry-failed' if args.retry_failed else args.mode
+    report = telemetry.write_report(
+        args.report,
+        mode=mode,
+        runner=args.runner,
+        concurrency=args.concurrency,
+        workers=args.workers,
+        skipped=len(skipped),
+        final_concurrency=engine.concurrency.limit if engine.concurrency else args.workers,
+        peak_concurrency=max(l for _, l in engine.concurrency.history) if engine.concurrency else args.workers,
+        failures={r['filename']: r['error'] for r in results if not r['success']},
+        journal=journal_counts
+    )
+    if args.emf:
+        print(json.dumps(emf_record(report, {'Mode': mode, 'Runner': args.runner})))
     
     # Summary
     end_time = datetime.now()
@@ -119,11 +197,30 @@ def main():
     logger.info("=" * 50)
     logger.info("BULK INGESTION SUMMARY")
     logger.info("=" * 50)
-    logger.info(f"Total files processed: {len(files)}")
-    logger.info(f"Successful: {successful}")
-    logger.info(f"Failed: {failed}")
-    logger.info(f"Success rate: {(successful/len(files)*100):.1f}%")
+    logger.info(f"Mode: {mode}")
+    logger.info(f"Runner: {args.runner}")
+    if args.mode == 'fused':
+        logger.info(f"Raw archive: {'off' if args.no_archive_raw else TARGET_PREFIX}")
+    logger.info(f"Total files processed: {report['files']}")
+    if args.mode == 'sync':
+        logger.info(f"Skipped (unchanged): {len(skipped)}")
+        logger.info(f"New: {sum(1 for r in to_copy.values() if r == 'new')}")
+    elif skipped:
+        logger.info(f"Skipped (completed in journal): {len(skipped)}")
+    logger.info(f"Successful: {report['successful']} ({report['verified']} checksum-verified)")
+    logger.info(f"Failed: {report['failed']}")
+    for filename, error in report['failures'].items():
+        logger.info(f"  {filename}: {error}")
+    logger.info(f"Success rate: {(report['successful']/report['files']*100):.1f}%")
+    logger.info(f"Bytes transferred: {report['bytes'] / 1024 ** 2:.1f} MiB")
+    logger.info(f"Throughput: {report['bytes_per_second'] / 1024 ** 2:.1f} MiB/s, {report['files_per_second']:.2f} files/s")
+    latency = report['latency_seconds']
+    logger.info(f"Per-file latency: p50 {latency['p50']}s, p95 {latency['p95']}s, p99 {latency['p99']}s")
+    logger.info(f"Retries: {report['retries']}")
+    if engine.concurrency:
+        logger.info(f"Final concurrency: {report['final_concurrency']} (peak {report['peak_concurrency']})")
     logger.info(f"Duration: {duration}")
+    logger.info(f"Journal: {journal_counts}")
     logger.info("=" * 50)
 
 if __name__ == "__main__":
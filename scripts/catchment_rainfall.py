@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Dam Catchment Rainfall
+Catchment-weighted CHIRPS precipitation and anomaly per DWS dam and month, from cached sparse weight masks
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import sys
+import uuid
+from datetime import datetime
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import rasterio
+from rasterio import features
+from rasterio.transform import Affine
+from rasterio.windows import Window, transform as window_transform_of
+from scipy import sparse
+
+# The raster registry and table commits ship with the Lambda package at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lambda_etl_function as etl
+from catalog_partitions import glue_columns, register_partitions
+from raster_datasets import get_dataset, match_dataset
+from table_commits import (
+    collect_file_stats,
+    commit_files,
+    load_current_snapshot,
+    new_commit_id,
+    partition_directory,
+    plan_files
+)
+
+from external_tables import DATABASE_NAME
+from table_definitions import catchment_rainfall_table, ensure_table
+
+logger = logging.getLogger(__name__)
+
+BUCKET_NAME = 'africlimate-analytics-lake'
+DATASET_NAME = 'chirps_monthly'
+
+# GeoJSON FeatureCollection, one (Multi)Polygon per dam with dam_id/dam_name
+# properties; dam_id matches external_dam_levels.dam_id
+CATCHMENTS_KEY = 'reference/dam_catchments.geojson'
+
+TABLE_NAME = 'dam_catchment_rainfall'
+OUTPUT_PREFIX = 'processed/dam_catchment_rainfall/'
+WEIGHTS_PREFIX = 'processed/_cache/catchment_weights/'
+LOCAL_CACHE_DIR = '.catchment_cache'
+
+# Sub-cells per CHIRPS cell edge when rasterizing; gives fractional edge coverage
+SUPERSAMPLE = 5
+
+# Same-month history needed before an anomaly is reported
+CLIMATOLOGY_MIN_YEARS = 3
+
+SCHEMA = pa.schema([
+    ('dam_id', pa.string()),
+    ('dam_name', pa.string()),
+    ('precipitation_mm', pa.float64()),
+    ('climatology_mm', pa.float64()),
+    ('anomaly_mm', pa.float64()),
+    ('anomaly_pct', pa.float64()),
+    ('valid_coverage', pa.float64()),
+    ('cell_count', pa.int64()),
+    ('climatology_years', pa.int64()),
+    ('year', pa.int64()),
+    ('month', pa.int64())
+])
+
+
+def grid_window(src, grid):
+    """Pixel window of a raster covering the grid bounding box (as in the ETL Lambda)"""
+    inverse = ~src.transform
+    col_a, row_a = inverse * (grid['lon_min'], grid['lat_max'])
+    col_b, row_b = inverse * (grid['lon_max'], grid['lat_min'])
+    row_start = max(int(np.floor(min(row_a, row_b))), 0)
+    row_stop = min(int(np.ceil(max(row_a, row_b))), src.height)
+    col_start = max(int(np.floor(min(col_a, col_b))), 0)
+    col_stop = min(int(np.ceil(max(col_a, col_b))), src.width)
+    return Window(col_start, row_start, col_stop - col_start, row_stop - row_start)
+
+
+def load_catchments(s3_client, bucket=BUCKET_NAME):
+    """Catchment GeoJSON as (features, raw bytes)"""
+    body = s3_client.get_object(Bucket=bucket, Key=CATCHMENTS_KEY)['Body'].read()
+    return json.loads(body)['features'], body
+
+
+def weights_signature(catchments_body, transform, window):
+    """Cache key of a weight matrix: the polygons plus the exact grid they were rasterized on"""
+    grid = json.dumps({
+        'transform': list(transform)[:6],
+        'window': [window.col_off, window.row_off, window.width, window.height],
+        'supersample': SUPERSAMPLE
+    }, sort_keys=True)
+    return hashlib.sha256(catchments_body + grid.encode()).hexdigest()[:16]
+
+
+def build_weights(catchments, transform, window):
+    """
+    Rasterize each catchment onto the window's cells
+
+    Returns a CSR matrix (dams x cells, row-major over the window) whose
+    entries are the covered fraction of each cell times its relative area
+    (cos latitude), plus the dam ids and names in row order.
+    """
+    height, width = int(window.height), int(window.width)
+    window_transform = window_transform_of(window, transform)
+    fine_transform = window_transform * Affine.scale(1 / SUPERSAMPLE)
+    lats = window_transform.f + (np.arange(height) + 0.5) * window_transform.e
+    cell_area = np.repeat(np.cos(np.radians(lats)), width)
+
+    rows, cols, values = [], [], []
+    dam_ids, dam_names = [], []
+    for feature in catchments:
+        fine = features.rasterize(
+            [(feature['geometry'], 1)],
+            out_shape=(height * SUPERSAMPLE, width * SUPERSAMPLE),
+            transform=fine_transform,
+            fill=0,
+            dtype='uint8'
+        )
+        coverage = fine.reshape(height, SUPERSAMPLE, width, SUPERSAMPLE).mean(axis=(1, 3)).ravel()
+        cells = np.flatnonzero(coverage)
+        if not len(cells):
+            logger.warning(f"Catchment {feature['properties']['dam_id']} does not overlap the grid, skipped")
+            continue
+
+        rows.append(np.full(len(cells), len(dam_ids)))
+        cols.append(cells)
+        values.append(coverage[cells] * cell_area[cells])
+        dam_ids.append(feature['properties']['dam_id'])
+        dam_names.append(feature['properties'].get('dam_name', feature['properties']['dam_id']))
+
+    weights = sparse.csr_matrix(
+        (np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(len(dam_ids), height * width)
+    ) if dam_ids else sparse.csr_matrix((0, height * width))
+    return weights, dam_ids, dam_names
+
+
+def _save_npz(path, weights, dam_ids, dam_names):
+    np.savez_compressed(
+        path, data=weights.data, indices=weights.indices, indptr=weights.indptr,
+        shape=np.array(weights.shape), dam_ids=np.array(dam_ids), dam_names=np.array(dam_names)
+    )
+
+
+def _load_npz(source):
+    with np.load(source) as npz:
+        weights = sparse.csr_matrix((npz['data'], npz['indices'], npz['indptr']), shape=tuple(npz['shape']))
+        return weights, list(npz['dam_ids']), list(npz['dam_names'])
+
+
+def get_weights(s3_client, catchments, catchments_body, transform, window, bucket=BUCKET_NAME, rebuild=False):
+    """
+    Weight matrix for a grid, rasterized at most once per polygon set and grid
+
+    Looked up in the local cache, then in S3, and only built (and stored in
+    both) when neither has it.
+    """
+    signature = weights_signature(catchments_body, transform, window)
+    local_path = os.path.join(LOCAL_CACHE_DIR, f"{signature}.npz")
+    s3_key = f"{WEIGHTS_PREFIX}{signature}.npz"
+
+    if not rebuild:
+        if os.path.exists(local_path):
+            return _load_npz(local_path)
+        try:
+            body = s3_client.get_object(Bucket=bucket, Key=s3_key)['Body'].read()
+            os.makedirs(LOCAL_CACHE_DIR, exist_ok=True)
+            with open(local_path, 'wb') as f:
+                f.write(body)
+            return _load_npz(io.BytesIO(body))
+        except s3_client.exceptions.NoSuchKey:
+            pass
+
+    weights, dam_ids, dam_names = build_weights(catchments, transform, window)
+    logger.info(f"Rasterized {len(dam_ids)} catchments onto {int(window.width)}x{int(window.height)} cells "
+                f"({weights.nnz} weighted cells)")
+    os.makedirs(LOCAL_CACHE_DIR, exist_ok=True)
+    _save_npz(local_path, weights, dam_ids, dam_names)
+    with open(local_path, 'rb') as f:
+        s3_client.put_object(Bucket=bucket, Key=s3_key, Body=f.read())
+    return weights, dam_ids, dam_names
+
+
+def catchment_means(weights, values, valid):
+    """
+    Weighted mean per catchment over the valid cells, and the share of
+    catchment weight that was valid; NaN where no cell was valid
+    """
+    valid_weight = weights @ valid.astype(np.float64)
+    total_weight = np.asarray(weights.sum(axis=1)).ravel()
+    weighted_sum = weights @ np.where(valid, values, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(valid_weight > 0, weighted_sum / valid_weight, np.nan)
+        coverage = np.where(total_weight > 0, valid_weight / total_weight, 0.0)
+    return means, coverage
+
+
+def load_climatology(s3_client, month, before_year, bucket=BUCKET_NAME):
+    """
+    Per-dam mean precipitation and year count for a calendar month over the
+    table's years before ``before_year``, so a reprocessed year gets the
+    same baseline whenever it is run
+    """
+    snapshot, _ = load_current_snapshot(s3_client, bucket, TABLE_NAME)
+    totals = {}
+    for data_file in plan_files(snapshot, {'month': month}):
+        if data_file['partition']['year'] >= before_year:
+            continue
+        body = s3_client.get_object(Bucket=bucket, Key=data_file['key'])['Body'].read()
+        table = pq.read_table(io.BytesIO(body), columns=['dam_id', 'precipitation_mm'])
+        for dam_id, precipitation in zip(*(table.column(c).to_pylist() for c in table.column_names)):
+            if precipitation is not None and not np.isnan(precipitation):
+                total, years = totals.get(dam_id, (0.0, 0))
+                totals[dam_id] = (total + precipitation, years + 1)
+    return {dam_id: (total / years, years) for dam_id, (total, years) in totals.items()}
+
+
+def compute_month(s3_client, source, partition, catchments, catchments_body, bucket=BUCKET_NAME, rebuild=False):
+    """Catchment rainfall rows for one CHIRPS raster (path or binary file object)"""
+    dataset = get_dataset(DATASET_NAME)
+
+    with rasterio.open(source) as src:
+        window = grid_window(src, dataset['grid'])
+        weights, dam_ids, dam_names = get_weights(
+            s3_client, catchments, catchments_body, src.transform, window, bucket, rebuild
+        )
+        raw = src.read(dataset['band'], window=window).ravel()
+        nodata = src.nodata
+
+    values, valid, _ = etl.classify_pixels(raw, dataset, nodata)
+    means, coverage = catchment_means(weights, values, valid)
+    cell_counts = np.diff(weights.indptr)
+    climatology = load_climatology(s3_client, partition['month'], partition['year'], bucket)
+
+    rows = []
+    for i, dam_id in enumerate(dam_ids):
+        precipitation = None if np.isnan(means[i]) else round(float(means[i]), 3)
+        normal, years = climatology.get(dam_id, (None, 0))
+        if years < CLIMATOLOGY_MIN_YEARS or precipitation is None:
+            normal = None
+        anomaly = None if normal is None else round(precipitation - normal, 3)
+        rows.append({
+            'dam_id': dam_id,
+            'dam_name': dam_names[i],
+            'precipitation_mm': precipitation,
+            'climatology_mm': None if normal is None else round(normal, 3),
+            'anomaly_mm': anomaly,
+            'anomaly_pct': round(100 * anomaly / normal, 1) if anomaly is not None and normal > 0 else None,
+            'valid_coverage': round(float(coverage[i]), 4),
+            'cell_count': int(cell_counts[i]),
+            'climatology_years': years,
+            'year': partition['year'],
+            'month': partition['month']
+        })
+    return rows
+
+
+def publish_month(s3_client, rows, partition, bucket=BUCKET_NAME):
+    """
+    Write one month's rows into a fresh commit directory and commit them as
+    that month's partition. Returns the (location, sequence_number) of the
+    commit for the catalog.
+    """
+    year, month = partition['year'], partition['month']
+    directory = partition_directory(OUTPUT_PREFIX, {'year': year, 'month': month}, new_commit_id())
+    key = f"{directory}{TABLE_NAME}_{year}_{month:02d}.parquet"
+    temp_file = f"/tmp/{TABLE_NAME}_{year}_{month:02d}-{uuid.uuid4().hex[:8]}.parquet"
+    try:
+        pq.write_table(pa.Table.from_pylist(rows, schema=SCHEMA), temp_file, compression='snappy')
+        s3_client.upload_file(temp_file, bucket, key)
+        data_file = {
+            'key': key,
+            'partition': {'year': year, 'month': month},
+            'size_bytes': os.path.getsize(temp_file),
+            **collect_file_stats(temp_file)
+        }
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+    try:
+        snapshot = commit_files(s3_client, bucket, TABLE_NAME, f"s3://{bucket}/{OUTPUT_PREFIX}", [data_file])
+    except Exception:
+        # No snapshot references the upload; do not leave it for prefix readers
+        s3_client.delete_object(Bucket=bucket, Key=key)
+        raise
+    return f"s3://{bucket}/{directory}", snapshot['sequence_number']
+
+
+def register_table(glue_client, partitions, commits, bucket=BUCKET_NAME):
+    """
+    Create the Glue table if missing and point the given year/month
+    partitions at the directories of their commits
+    """
+    ensure_table(glue_client, catchment_rainfall_table(bucket))
+    columns = pa.schema([f for f in SCHEMA if f.name not in ('year', 'month')])
+    register_partitions(glue_client, DATABASE_NAME, TABLE_NAME, partitions, glue_columns(columns), commits)
+
+
+def pending_months(s3_client, bucket=BUCKET_NAME, reprocess=False):
+    """(key, partition) of raw CHIRPS months not yet in the table, oldest first"""
+    dataset = get_dataset(DATASET_NAME)
+    snapshot, _ = load_current_snapshot(s3_client, bucket, TABLE_NAME)
+    done = set() if reprocess or snapshot is None else {
+        (f['partition']['year'], f['partition']['month']) for f in snapshot['files']
+    }
+
+    months = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=dataset['raw_prefix']):
+        for obj in page.get('Contents', []):
+            matched, partition = match_dataset(obj['Key'])
+            if matched is not None and (partition['year'], partition['month']) not in done:
+                months.append((obj['Key'], partition))
+    return sorted(months, key=lambda item: (item[1]['year'], item[1]['month']))
+
+
+def update_catchment_rainfall(s3_client, glue_client=None, bucket=BUCKET_NAME, months=None, rebuild_weights=False):
+    """
+    Process the given (key, partition) months, or every new one, in
+    chronological order so each month's climatology includes the last.
+    Returns the processed partitions.
+    """
+    etl._load_runtime()
+    catchments, catchments_body = load_catchments(s3_client, bucket)
+    months = pending_months(s3_client, bucket) if months is None else months
+    processed = []
+    commits = []
+
+    for key, partition in months:
+        body = s3_client.get_object(Bucket=bucket, Key=key)['Body'].read()
+        rows = compute_month(s3_client, io.BytesIO(body), partition, catchments, catchments_body,
+                             bucket, rebuild_weights)
+        rebuild_weights = False
+        if not rows:
+            continue
+        commits.append(publish_month(s3_client, rows, partition, bucket))
+        processed.append(partition)
+        logger.info(f"{partition['year']}-{partition['month']:02d}: {len(rows)} catchments")
+
+    if glue_client is not None:
+        register_table(glue_client, processed, commits, bucket)
+    return processed
+
+
+def main():
+    import boto3
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Catchment-weighted CHIRPS rainfall per DWS dam')
+    parser.add_argument('--catchments', help='Local GeoJSON to upload as the catchment set first')
+    parser.add_argument('--year', type=int, help='Reprocess one year (all of its months unless --month)')
+    parser.add_argument('--month', type=int, help='Reprocess one month of --year')
+    parser.add_argument('--rebuild-weights', action='store_true', help='Rasterize catchments again')
+    args = parser.parse_args()
+    if args.month and not args.year:
+        parser.error('--month requires --year')
+
+    s3 = boto3.client('s3')
+    glue = boto3.client('glue')
+
+    if args.catchments:
+        with open(args.catchments, 'rb') as f:
+            s3.put_object(Bucket=BUCKET_NAME, Key=CATCHMENTS_KEY, Body=f.read(), ContentType='application/geo+json')
+
+    months = None
+    if args.year:
+        months = [(key, p) for key, p in pending_months(s3, reprocess=True)
+                  if p['year'] == args.year and (not args.month or p['month'] == args.month)]
+
+    started = datetime.utcnow()
+    processed = update_catchment_rainfall(s3, glue, months=months, rebuild_weights=args.rebuild_weights)
+    print(f"💧 Dam catchment rainfall: {len(processed)} month(s) written to {TABLE_NAME} "
+          f"in {(datetime.utcnow() - started).total_seconds():.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -37,6 +37,8 @@ def list_glue_tables():
             print(f"  Columns: {len(table['StorageDescriptor']['Columns'])}")
             if 'PartitionKeys' in table:
                 print(f"  Partitions: {len(table['PartitionKeys'])}")
+            if table.get('Parameters', {}).get('projection.enabled') == 'true':
+                print(f"  Projection: enabled (no crawl needed)")
             print()
         
         return tables
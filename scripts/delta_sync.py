@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Delta Sync Planning
+Compares source and target listings so only new or changed objects are copied
+"""
+
+import logging
+
+from s3_listing import iter_objects
+
+logger = logging.getLogger(__name__)
+
+
+def list_objects(client, bucket, prefix, suffix=None, shards=None):
+    """
+    List a prefix into {relative_key: {'size', 'etag', 'last_modified'}}
+    """
+    return {
+        entry['relative_key']: {
+            'size': entry['size'],
+            'etag': entry['etag'],
+            'last_modified': entry['last_modified']
+        }
+        for entry in iter_objects(client, bucket, prefix, shards=shards, suffix=suffix)
+    }
+
+
+def needs_copy(source, target):
+    """
+    Decide whether a source object differs from its copy
+
+    Returns a reason ('new', 'size', 'modified') or None when the copy is
+    current. ETags only prove equality: multipart ETags depend on the part
+    size used by whoever uploaded the object, so a mismatch with equal sizes
+    falls back to timestamps - a target written after the source last
+    changed is treated as current.
+    """
+    if target is None:
+        return 'new'
+    if source['size'] != target['size']:
+        return 'size'
+    if source['etag'] == target['etag']:
+        return None
+    if target['last_modified'] >= source['last_modified']:
+        return None
+    return 'modified'
+
+
+def plan_sync(source_objects, target_objects):
+    """
+    Split the source listing into objects to copy and objects to skip
+
+    Returns (to_copy, skipped) where ``to_copy`` maps relative key to the
+    reason it needs copying.
+    """
+    to_copy = {}
+    skipped = []
+
+    for relative_key, source in sorted(source_objects.items()):
+        reason = needs_copy(source, target_objects.get(relative_key))
+        if reason:
+            to_copy[relative_key] = reason
+        else:
+            skipped.append(relative_key)
+
+    logger.info(
+        f"Sync plan: {len(to_copy)} to copy "
+        f"({sum(1 for r in to_copy.values() if r == 'new')} new), {len(skipped)} unchanged"
+    )
+    return to_copy, skipped
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+External Source Tables
+Typed flat schemas for the external sources, Parquet change logs partitioned by source and date, Glue registration
+"""
+
+import io
+import logging
+import os
+import sys
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Catalog registration is shared with the Lambda writers at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog_partitions import glue_columns, register_partitions as register_catalog_partitions
+
+logger = logging.getLogger(__name__)
+
+BUCKET_NAME = 'africlimate-analytics-lake'
+DATABASE_NAME = 'africlimate_climate_db'
+EXTERNAL_PREFIX = 'real-data/'
+LATEST_PREFIX = 'real-data/latest/'
+TABLE_PREFIX = 'external_'
+
+# One row per entity (region, dam, province, park, energy source) per observation
+SCHEMAS = {
+    'weather': pa.schema([
+        ('region', pa.string()),
+        ('current_rainfall_mm', pa.float64()),
+        ('spi_index', pa.float64()),
+        ('temperature_c', pa.float64()),
+        ('humidity_pct', pa.float64()),
+        ('observed_at', pa.timestamp('us')),
+        ('source_name', pa.string())
+    ]),
+    'dam_levels': pa.schema([
+        ('dam_id', pa.string()),
+        ('dam_name', pa.string()),
+        ('capacity_percent', pa.float64()),
+        ('current_volume_m3', pa.int64()),
+        ('full_capacity_m3', pa.int64()),
+        ('weekly_change', pa.float64()),
+        ('observed_at', pa.timestamp('us')),
+        ('source_name', pa.string())
+    ]),
+    'agriculture': pa.schema([
+        ('province', pa.string()),
+        ('maize_production_risk', pa.string()),
+        ('livestock_stress_index', pa.float64()),
+        ('irrigation_demand', pa.string()),
+        ('drought_assistance_activated', pa.bool_()),
+        ('observed_at', pa.timestamp('us')),
+        ('source_name', pa.string())
+    ]),
+    'biodiversity': pa.schema([
+        ('park', pa.string()),
+        ('ndvi_average', pa.float64()),
+        ('vegetation_health', pa.string()),
+        ('wildlife_stress_index', pa.float64()),
+        ('fire_risk', pa.string()),
+        ('tourism_impact', pa.string()),
+        ('observed_at', pa.timestamp('us')),
+        ('source_name', pa.string())
+    ]),
+    'energy': pa.schema([
+        ('energy_source', pa.string()),
+        ('production_mw', pa.float64()),
+        ('percentage', pa.float64()),
+        ('carbon_emissions_tons', pa.float64()),
+        ('drought_vulnerability', pa.string()),
+        ('grid_status', pa.string()),
+        ('load_shedding_risk', pa.string()),
+        ('observed_at', pa.timestamp('us')),
+        ('source_name', pa.string())
+    ])
+}
+
+# Appended to every change-log row (see source_cdc)
+CDC_FIELDS = [
+    ('record_key', pa.string()),
+    ('record_hash', pa.string()),
+    ('change_type', pa.string()),
+    ('valid_from', pa.timestamp('us'))
+]
+
+# Nested section holding one entry per entity, and the column its key becomes
+ENTITY_SECTIONS = {
+    'weather': ('regions', 'region'),
+    'dam_levels': ('dams', 'dam_id'),
+    'agriculture': ('provinces', 'province'),
+    'biodiversity': ('parks', 'park'),
+    'energy': ('energy_mix', 'energy_source')
+}
+
+# Source fields renamed to their column names
+FIELD_ALIASES = {
+    'current_rainfall': 'current_rainfall_mm',
+    'temperature': 'temperature_c',
+    'humidity': 'humidity_pct',
+    'name': 'dam_name',
+    'last_updated': 'observed_at'
+}
+
+
+def _parse_timestamp(value):
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def normalize(dataset_name, data, observed_at=None):
+    """
+    Flatten one source document into rows matching SCHEMAS[dataset_name]
+
+    Document-level fields (e.g. Eskom's grid_status) are repeated on every
+    row; rows without their own timestamp take the document's, then
+    ``observed_at``.
+    """
+    schema = SCHEMAS[dataset_name]
+    section, key_column = ENTITY_SECTIONS[dataset_name]
+    shared = {FIELD_ALIASES.get(k, k): v for k, v in data.items() if not isinstance(v, dict)}
+    shared['source_name'] = data.get('source')
+
+    rows = []
+    for entity_key, fields in data.get(section, {}).items():
+        row = dict(shared)
+        row.update({FIELD_ALIASES.get(k, k): v for k, v in fields.items()})
+        row[key_column] = entity_key
+        row['observed_at'] = _parse_timestamp(row.get('observed_at') or observed_at)
+        rows.append({name: row.get(name) for name in schema.names})
+    return rows
+
+
+def change_schema(dataset_name):
+    """Change-log rows: the source columns plus CDC bookkeeping"""
+    return pa.schema(list(SCHEMAS[dataset_name]) + [pa.field(name, type_) for name, type_ in CDC_FIELDS])
+
+
+def latest_schema(dataset_name):
+    """Latest-view rows: one per live record, without the change type"""
+    schema = change_schema(dataset_name)
+    return schema.remove(schema.get_field_index('change_type'))
+
+
+def partition_key(dataset_name, run_date, run_id):
+    """Object key of one run's change file within the source's date partition"""
+    return f"{EXTERNAL_PREFIX}source={dataset_name}/date={run_date}/{dataset_name}-{run_id}.parquet"
+
+
+def latest_key(dataset_name):
+    """Object key of the compacted latest view; rewritten whenever the source changes"""
+    return f"{LATEST_PREFIX}source={dataset_name}/{dataset_name}.parquet"
+
+
+def write_parquet(s3_client, key, rows, schema, bucket=BUCKET_NAME):
+    """Write rows as one Parquet object; returns its size in bytes"""
+    table = pa.Table.from_pylist(rows, schema=schema)
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer, compression='snappy')
+    body = buffer.getvalue()
+    s3_client.put_object(Bucket=bucket, Key=key, Body=body, ContentType='application/vnd.apache.parquet')
+    return len(body)
+
+
+def table_name(dataset_name):
+    return f"{TABLE_PREFIX}{dataset_name}"
+
+
+def latest_table_name(dataset_name):
+    return f"{TABLE_PREFIX}{dataset_name}_latest"
+
+
+def table_location(dataset_name, bucket=BUCKET_NAME):
+    return f"s3://{bucket}/{EXTERNAL_PREFIX}source={dataset_name}/"
+
+
+def latest_location(dataset_name, bucket=BUCKET_NAME):
+    return f"s3://{bucket}/{LATEST_PREFIX}source={dataset_name}/"
+
+
+def ensure_tables(glue_client, dataset_name, bucket=BUCKET_NAME):
+    """Create the source's change-log table (partitioned by date) and latest-view table if missing"""
+    # Imported here: the definitions module builds on this one
+    from table_definitions import ensure_table, external_tables
+
+    for definition in external_tables(dataset_name, bucket):
+        ensure_table(glue_client, definition)
+
+
+def register_partitions(glue_client, dataset_name, run_dates, bucket=BUCKET_NAME):
+    """Add date partitions to the source's change log; returns how many were new or updated"""
+    ensure_tables(glue_client, dataset_name, bucket)
+    return register_catalog_partitions(
+        glue_client, DATABASE_NAME, table_name(dataset_name),
+        [{'date': run_date} for run_date in run_dates],
+        glue_columns(change_schema(dataset_name))
+    )
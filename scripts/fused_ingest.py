@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Fused Ingest-and-Convert
+Reads each DE Africa raster once and writes partitioned Parquet directly, optionally archiving the raw file
+"""
+
+import io
+import logging
+import os
+import sys
+
+# The conversion code ships with the Lambda package at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lambda_etl_function as etl
+from raster_datasets import match_dataset
+
+from transfer_engine import TransferEngine
+from transfer_integrity import hashing_reader
+
+logger = logging.getLogger(__name__)
+
+
+class FusedIngestor(TransferEngine):
+    """
+    Transfer engine whose unit of work is fetch, archive and convert
+
+    The source object is read into memory once. The same bytes are decoded
+    in-process by the Lambda conversion code and then uploaded to the raw
+    prefix (unless ``archive_raw`` is off), so the lake never re-downloads
+    the raw file. Only after the conversion has committed is the archive
+    written with the ``etl-converted`` metadata flag, which makes the
+    S3-triggered Lambda skip it; if the conversion fails the archive is
+    written without the flag and the Lambda converts it instead. Retries,
+    adaptive concurrency and ``run`` are inherited; a retried attempt
+    converts again, which is safe because each commit replaces its partition.
+    """
+
+    def __init__(self, *args, archive_raw=True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.archive_raw = archive_raw
+        etl._load_runtime()
+
+    def _copy_once(self, source_key, target_key):
+        """Fetch one raster, verify, archive and convert it; returns (size, verified)"""
+        dataset, partition = match_dataset(target_key)
+        if dataset is None:
+            raise ValueError(f"No registered dataset for {target_key}")
+
+        if self.source_limiter:
+            self.source_limiter.acquire()
+        response = self.source_client.get_object(Bucket=self.source_bucket, Key=source_key)
+        body = hashing_reader(self.source_client, self.source_bucket, source_key, response)
+        data = body.read()
+        verified = body.verify()
+
+        if self.target_limiter:
+            self.target_limiter.acquire()
+        try:
+            etl.convert_raster(io.BytesIO(data), target_key, dataset, partition)
+        except Exception as e:
+            if not self.archive_raw:
+                raise
+            # The unmarked raw object triggers the ETL Lambda, which converts it instead
+            logger.warning(f"Conversion of {target_key} failed, handing it to the ETL Lambda: {str(e)}")
+            self._archive(data, target_key, response, converted=False)
+            return len(data), verified
+
+        if self.archive_raw:
+            self._archive(data, target_key, response, converted=True)
+        return len(data), verified
+
+    def _archive(self, data, target_key, response, converted):
+        """Upload the raw bytes; only a converted file carries the flag the Lambda skips on"""
+        extra_args = {'Metadata': {etl.CONVERTED_METADATA_KEY: 'true'}} if converted else {}
+        if response.get('ContentType'):
+            extra_args['ContentType'] = response['ContentType']
+        if self.target_limiter:
+            self.target_limiter.acquire()
+        self.target_client.upload_fileobj(
+            io.BytesIO(data), self.target_bucket, target_key,
+            ExtraArgs=extra_args, Config=self.transfer_config
+        )
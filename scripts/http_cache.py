@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+HTTP Response Cache
+Conditional GETs (ETag / Last-Modified) with per-source TTLs and a size-bounded on-disk LRU store
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = '.http_cache'
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    body_file TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    headers TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    last_access REAL NOT NULL
+)
+"""
+
+
+class CachedResponse:
+    """
+    The parts of a response the source fetchers use; ``cache_status`` is
+    'hit' (fresh within TTL), 'revalidated' (304) or 'miss'
+    """
+
+    def __init__(self, url, status_code, headers, content, cache_status):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.cache_status = cache_status
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8')
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class HttpCache:
+    """
+    Disk cache in front of a requests session
+
+    Within a source's TTL a cached response is returned without touching the
+    network. After that the request is sent with If-None-Match /
+    If-Modified-Since and a 304 reuses the stored body. Bodies live in one
+    file each; an SQLite index tracks validators and last access, and the
+    least recently used bodies are evicted once ``max_bytes`` is exceeded.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(directory, 'bodies'), exist_ok=True)
+
+        self._conn = sqlite3.connect(os.path.join(directory, 'index.sqlite'), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self.counts = {'hit': 0, 'revalidated': 0, 'miss': 0, 'evicted': 0}
+
+    def get(self, session, url, ttl_seconds=0, timeout=None):
+        """GET ``url`` through the cache; non-2xx/304 responses raise"""
+        entry = self._lookup(url)
+        now = time.time()
+
+        if entry and now - entry['fetched_at'] < ttl_seconds:
+            return self._cached(url, entry, 'hit')
+
+        headers = {}
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+
+        response = session.get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304 and entry:
+            # A 304 may carry fresh validators; the next revalidation must send those
+            etag = response.headers.get('ETag') or entry['etag']
+            last_modified = response.headers.get('Last-Modified') or entry['last_modified']
+            entry['headers'].update({k: v for k, v in (('ETag', etag), ('Last-Modified', last_modified)) if v})
+            entry.update(etag=etag, last_modified=last_modified)
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "UPDATE responses SET fetched_at = ?, etag = ?, last_modified = ?, headers = ? WHERE url = ?",
+                    (now, etag, last_modified, json.dumps(entry['headers']), url)
+                )
+            return self._cached(url, entry, 'revalidated')
+
+        response.raise_for_status()
+        self._count('miss')
+        if 'no-store' not in response.headers.get('Cache-Control', ''):
+            self._store(url, response, now)
+        return CachedResponse(url, response.status_code, dict(response.headers), response.content, 'miss')
+
+    def _count(self, status):
+        with self._lock:
+            self.counts[status] += 1
+
+    def _lookup(self, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body_file, etag, last_modified, headers, fetched_at FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None or not os.path.exists(row[0]):
+            return None
+        return {'body_file': row[0], 'etag': row[1], 'last_modified': row[2],
+                'headers': json.loads(row[3]), 'fetched_at': row[4]}
+
+    def _cached(self, url, entry, status):
+        with open(entry['body_file'], 'rb') as f:
+            content = f.read()
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE url = ?", (time.time(), url))
+        self._count(status)
+        return CachedResponse(url, 200, entry['headers'], content, status)
+
+    def _store(self, url, response, now):
+        body_file = os.path.join(self.directory, 'bodies', hashlib.sha256(url.encode()).hexdigest())
+        temp_file = f"{body_file}.{threading.get_ident()}.tmp"
+        with open(temp_file, 'wb') as f:
+            f.write(response.content)
+        os.replace(temp_file, body_file)
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, body_file, len(response.content), response.headers.get('ETag'),
+                 response.headers.get('Last-Modified'), json.dumps(dict(response.headers)), now, now)
+            )
+        self._evict()
+
+    def _evict(self):
+        """Drop least recently used bodies until the cache fits in max_bytes"""
+        with self._lock, self._conn:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for url, body_file, size in self._conn.execute(
+                    "SELECT url, body_file, size FROM responses ORDER BY last_access").fetchall():
+                if total <= self.max_bytes:
+                    break
+                self._conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+                if os.path.exists(body_file):
+                    os.remove(body_file)
+                total -= size
+                self.counts['evicted'] += 1
+
+    def stats(self):
+        """Hit/miss counts plus current size of the store"""
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            return {**self.counts, 'entries': entries, 'bytes': size}
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Ingestion Checkpoint Journal
+Durable per-object state (listed, transferred, verified, failed) so interrupted runs can resume
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOURNAL_PATH = 'ingestion_journal.sqlite'
+
+# Buffered state changes are written in one transaction when either limit is hit
+FLUSH_BATCH_SIZE = 200
+FLUSH_INTERVAL_SECONDS = 5.0
+
+STATES = ('listed', 'transferred', 'verified', 'failed')
+COMPLETED_STATES = ('transferred', 'verified')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    key TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    size INTEGER,
+    etag TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at TEXT NOT NULL
+)
+"""
+
+# Later states never regress to 'listed' when a resumed run lists the key again
+UPSERT = """
+INSERT INTO objects (key, state, size, etag, attempts, error, updated_at)
+VALUES (:key, :state, :size, :etag, :attempts, :error, :updated_at)
+ON CONFLICT(key) DO UPDATE SET
+    state = CASE WHEN excluded.state = 'listed' THEN objects.state ELSE excluded.state END,
+    size = COALESCE(excluded.size, objects.size),
+    etag = COALESCE(excluded.etag, objects.etag),
+    attempts = objects.attempts + excluded.attempts,
+    error = CASE WHEN excluded.state = 'listed' THEN objects.error ELSE excluded.error END,
+    updated_at = excluded.updated_at
+"""
+
+
+class IngestionJournal:
+    """
+    Append-mostly SQLite journal of object states
+
+    ``record`` only buffers; rows reach disk in batches of FLUSH_BATCH_SIZE
+    or every FLUSH_INTERVAL_SECONDS, each batch in a single transaction.
+    At most one unflushed batch is lost if the process is killed, and those
+    objects are simply retried on resume.
+    """
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(SCHEMA)
+        self._conn.commit()
+
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._last_flush = time.monotonic()
+
+    def record(self, key, state, size=None, etag=None, error=None):
+        """Buffer a state change for one object"""
+        if state not in STATES:
+            raise ValueError(f"Unknown journal state: {state}")
+
+        row = {
+            'key': key,
+            'state': state,
+            'size': size,
+            'etag': etag,
+            'attempts': 0 if state == 'listed' else 1,
+            'error': error,
+            'updated_at': datetime.utcnow().isoformat()
+        }
+        with self._lock:
+            self._buffer.append(row)
+            due = (len(self._buffer) >= FLUSH_BATCH_SIZE or
+                   time.monotonic() - self._last_flush >= FLUSH_INTERVAL_SECONDS)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered state changes in one transaction"""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+            if not rows:
+                return
+            with self._conn:
+                self._conn.executemany(UPSERT, rows)
+
+    def keys_in_state(self, *states):
+        """Keys currently in any of the given states"""
+        self.flush()
+        placeholders = ', '.join('?' for _ in states)
+        cursor = self._conn.execute(f"SELECT key FROM objects WHERE state IN ({placeholders}) ORDER BY key", states)
+        return [row[0] for row in cursor]
+
+    def completed_keys(self):
+        """Keys that need no further work"""
+        return set(self.keys_in_state(*COMPLETED_STATES))
+
+    def summary(self):
+        """Object counts per state"""
+        self.flush()
+        counts = dict.fromkeys(STATES, 0)
+        for state, count in self._conn.execute("SELECT state, COUNT(*) FROM objects GROUP BY state"):
+            counts[state] = count
+        return counts
+
+    def close(self):
+        self.flush()
+        self._conn.close()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Ingestion Telemetry
+Live throughput, ETA and per-file latency for ingestion runs, with a JSON run report and optional EMF metrics
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPORT_PATH = 'ingestion_run_report.json'
+EMF_NAMESPACE = 'AfriClimate/Ingestion'
+
+# Rolling rates cover the files finished within this many seconds
+ROLLING_WINDOW_SECONDS = 30.0
+SLOWEST_FILES = 5
+
+# Live percentiles come from log-spaced buckets: each bucket spans 10%, and
+# everything under a millisecond shares the first one
+LATENCY_BUCKET_RATIO = 1.1
+LATENCY_BUCKET_FLOOR = 0.001
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency counts; percentiles cost one pass over the few
+    hundred buckets instead of a sort of every sample
+    """
+
+    def __init__(self, ratio=LATENCY_BUCKET_RATIO, floor=LATENCY_BUCKET_FLOOR):
+        self.ratio = ratio
+        self.floor = floor
+        self.counts = {}
+        self.count = 0
+        self.max = None
+
+    def add(self, seconds):
+        index = max(0, math.ceil(math.log(max(seconds, self.floor) / self.floor, self.ratio)))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def percentile(self, pct):
+        """Upper edge of the bucket holding the nearest-rank percentile, capped at the maximum"""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(pct / 100 * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self.floor * self.ratio ** index, self.max)
+        return self.max
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return '?'
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m {seconds:02d}s" if hours else f"{minutes}m {seconds:02d}s"
+
+
+class IngestionTelemetry:
+    """
+    Accumulates transfer results into progress and run statistics
+
+    Feed it every result dict from a runner's ``on_result`` callback. The
+    expected total is either set up front or counted while the listing
+    streams through ``track_listing``; until the listing finishes the ETA
+    is based on the files discovered so far.
+    """
+
+    def __init__(self, total=None, window_seconds=ROLLING_WINDOW_SECONDS):
+        self.total = total
+        self.listing_complete = total is not None
+        self.discovered = total or 0
+        self.window_seconds = window_seconds
+
+        self.started = time.monotonic()
+        self.started_at = datetime.utcnow()
+        self.files = 0
+        self.failed = 0
+        self.bytes = 0
+        self.retries = 0
+        self.verified = 0
+        self.latencies = []
+        self.histogram = LatencyHistogram()
+        self._window = deque()
+        self._lock = threading.Lock()
+
+    def track_listing(self, filenames):
+        """Wrap a streaming file iterable, counting files as they are discovered"""
+        for filename in filenames:
+            with self._lock:
+                self.discovered += 1
+            yield filename
+        with self._lock:
+            self.total = self.discovered
+            self.listing_complete = True
+
+    def record(self, result):
+        """Add one finished transfer"""
+        now = time.monotonic()
+        with self._lock:
+            self.files += 1
+            self.retries += result['attempts'] - 1
+            self.latencies.append((result['seconds'], result['filename']))
+            self.histogram.add(result['seconds'])
+            if result['success']:
+                self.bytes += result['bytes']
+                self.verified += bool(result.get('verified'))
+            else:
+                self.failed += 1
+            self._window.append((now, result['bytes']))
+            while self._window and now - self._window[0][0] > self.window_seconds:
+                self._window.popleft()
+
+    def snapshot(self):
+        """
+        Current rates, ETA and latency percentiles; cheap enough to call
+        after every file, so the percentiles are bucketed (within 10%)
+        """
+        now = time.monotonic()
+        with self._lock:
+            elapsed = max(now - self.started, 1e-6)
+            window = [entry for entry in self._window if now - entry[0] <= self.window_seconds]
+            span = min(self.window_seconds, elapsed)
+
+            files_per_second = self.files / elapsed
+            remaining = (self.total if self.listing_complete else self.discovered) - self.files
+            rolling_files = len(window) / span
+            rate = rolling_files or files_per_second
+            eta = remaining / rate if rate and remaining >= 0 else None
+
+            return {
+                'files': self.files,
+                'failed': self.failed,
+                'total': self.total if self.listing_complete else None,
+                'discovered': self.discovered,
+                'bytes': self.bytes,
+                'retries': self.retries,
+                'elapsed_seconds': round(elapsed, 3),
+                'bytes_per_second': self.bytes / elapsed,
+                'rolling_bytes_per_second': sum(nbytes for _, nbytes in window) / span,
+                'files_per_second': files_per_second,
+                'rolling_files_per_second': rolling_files,
+                'eta_seconds': eta,
+                'latency_seconds': {
+                    'p50': self.histogram.percentile(50),
+                    'p95': self.histogram.percentile(95),
+                    'p99': self.histogram.percentile(99),
+                    'max': self.histogram.max
+                }
+            }
+
+    def progress_line(self, filename=None):
+        """One-line progress summary for the log"""
+        s = self.snapshot()
+        if s['total'] is not None:
+            done = f"{s['files']}/{s['total']} ({s['files'] / max(s['total'], 1):.1%})"
+            eta = format_duration(s['eta_seconds'])
+        else:
+            done = f"{s['files']}/{s['discovered']}+ (listing)"
+            eta = f">{format_duration(s['eta_seconds'])}"
+        p95 = s['latency_seconds']['p95']
+        line = (
+            f"Progress: {done} | "
+            f"{s['rolling_bytes_per_second'] / 1024 ** 2:.1f} MiB/s now, "
+            f"{s['bytes_per_second'] / 1024 ** 2:.1f} MiB/s avg | "
+            f"{s['rolling_files_per_second']:.1f} files/s | "
+            f"p95 {p95 or 0:.1f}s | retries {s['retries']} | ETA {eta}"
+        )
+        return f"{line} ({filename})" if filename else line
+
+    def report(self, **context):
+        """
+        Final machine-readable run report with exact latency percentiles;
+        ``context`` adds run metadata
+        """
+        s = self.snapshot()
+        with self._lock:
+            samples = list(self.latencies)
+        # The one full sort of the run
+        samples.sort()
+        latencies = [seconds for seconds, _ in samples]
+        exact = {
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'max': latencies[-1] if latencies else None
+        }
+        slowest = samples[:-SLOWEST_FILES - 1:-1]
+        return {
+            'started_at': self.started_at.isoformat(),
+            'finished_at': datetime.utcnow().isoformat(),
+            **context,
+            'files': s['files'],
+            'successful': s['files'] - s['failed'],
+            'failed': s['failed'],
+            'verified': self.verified,
+            'bytes': s['bytes'],
+            'retries': s['retries'],
+            'duration_seconds': s['elapsed_seconds'],
+            'bytes_per_second': round(s['bytes_per_second'], 1),
+            'files_per_second': round(s['files_per_second'], 3),
+            'latency_seconds': {k: v and round(v, 3) for k, v in exact.items()},
+            'slowest_files': [{'filename': name, 'seconds': round(seconds, 3)} for seconds, name in slowest]
+        }
+
+    def write_report(self, path=DEFAULT_REPORT_PATH, **context):
+        """Write the run report as JSON and return it"""
+        report = self.report(**context)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        logger.info(f"Run report written to {path}")
+        return report
+
+
+def emf_record(report, dimensions, namespace=EMF_NAMESPACE):
+    """
+    CloudWatch Embedded Metric Format record for a run report; printing it
+    to stdout is enough where logs are shipped to CloudWatch
+    """
+    metrics = {
+        'Files': (report['files'], 'Count'),
+        'FailedFiles': (report['failed'], 'Count'),
+        'Retries': (report['retries'], 'Count'),
+        'BytesTransferred': (report['bytes'], 'Bytes'),
+        'Duration': (report['duration_seconds'], 'Seconds'),
+        'Throughput': (report['bytes_per_second'], 'Bytes/Second'),
+        'FilesPerSecond': (report['files_per_second'], 'Count/Second'),
+        'LatencyP50': (report['latency_seconds']['p50'] or 0, 'Seconds'),
+        'LatencyP95': (report['latency_seconds']['p95'] or 0, 'Seconds'),
+        'LatencyP99': (report['latency_seconds']['p99'] or 0, 'Seconds')
+    }
+    return {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': namespace,
+                'Dimensions': [sorted(dimensions)],
+                'Metrics': [{'Name': name, 'Unit': unit} for name, (_, unit) in metrics.items()]
+            }]
+        },
+        **{name: str(value) for name, value in dimensions.items()},
+        **{name: value for name, (value, _) in metrics.items()}
+    }
@@ -4,40 +4,76 @@ Real Data Integration for AfriClimate Analytics Lake
 Connects to real South African data sources
 """
 
+import argparse
 import boto3
+import functools
 import requests
-import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
+
+from external_tables import normalize, register_partitions
+from http_cache import DEFAULT_CACHE_DIR, HttpCache
+from source_adapters import ADAPTERS, DEFAULT_FIXTURES_DIR, FixtureTransport, HttpTransport
+from source_cdc import apply_changes
 
 # Configuration
 AWS_REGION = 'af-south-1'
 BUCKET_NAME = 'africlimate-analytics-lake'
 
+# Source runner: each source has its own deadline; uploads start as soon as a source returns
+DEFAULT_TIMEOUT_SECONDS = 30
+HTTP_POOL_SIZE = 4
+UPLOAD_WORKERS = 5
+
+# Responses are reused within a source's cache_ttl_seconds, then revalidated with conditional GETs
+HTTP_CACHE_DIR = DEFAULT_CACHE_DIR
+HTTP_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# simulated: built-in fetchers; live: adapters against the real endpoints;
+# replay: adapters against recorded fixtures; record: live, saving fixtures
+SOURCE_MODE = 'simulated'
+FIXTURES_DIR = DEFAULT_FIXTURES_DIR
+
 # Real South African data sources
 DATA_SOURCES = {
     'weather_service': {
         'base_url': 'https://saweather.co.za/api',
-        'description': 'South African Weather Service API'
+        'description': 'South African Weather Service API',
+        'timeout_seconds': 20,
+        'cache_ttl_seconds': 60 * 60
     },
     'water_department': {
         'base_url': 'https://www.dws.gov.za/Hydrology/Weekly',
-        'description': 'Department of Water & Sanitation dam levels'
+        'description': 'Department of Water & Sanitation dam levels',
+        'timeout_seconds': 60,
+        'cache_ttl_seconds': 24 * 60 * 60
     },
     'agriculture_dept': {
         'base_url': 'https://www.daff.gov.za/droughtinfo',
-        'description': 'Department of Agriculture drought information'
+        'description': 'Department of Agriculture drought information',
+        'timeout_seconds': 60,
+        'cache_ttl_seconds': 7 * 24 * 60 * 60
     },
     'sanparks': {
         'base_url': 'https://www.sanparks.org/biodiversity',
-        'description': 'SANParks biodiversity monitoring'
+        'description': 'SANParks biodiversity monitoring',
+        'timeout_seconds': 45,
+        'cache_ttl_seconds': 24 * 60 * 60
     },
     'eskom': {
         'base_url': 'https://www.eskom.co.za/LoadForecasting',
-        'description': 'Eskom energy production data'
+        'description': 'Eskom energy production data',
+        'timeout_seconds': 20,
+        'cache_ttl_seconds': 15 * 60
     }
 }
 
-def fetch_real_weather_data():
+def fetch_real_weather_data(session=None, timeout=None):
     """Fetch real weather data from South African sources"""
     
     try:
@@ -78,12 +114,13 @@ def fetch_real_weather_data():
         print(f"❌ Error fetching weather data: {e}")
         return None
 
-def fetch_real_dam_levels():
+def fetch_real_dam_levels(session=None, timeout=None):
     """Fetch real dam level data from Department of Water & Sanitation"""
     
     try:
         # Simulate real data from DWS
-        # In production, scrape from https://www.dws.gov.za/Hydrology/Weekly
+        # Live and record modes use DamLevelsAdapter, whose pages go through
+        # cached_get('water_department', ...) so unchanged weeks are 304s
         
         dam_data = {
             'source': 'Department of Water & Sanitation',
@@ -122,7 +159,7 @@ def fetch_real_dam_levels():
         print(f"❌ Error fetching dam data: {e}")
         return None
 
-def fetch_real_agriculture_data():
+def fetch_real_agriculture_data(session=None, timeout=None):
     """Fetch real agriculture data from Department of Agriculture"""
     
     try:
@@ -163,7 +200,7 @@ def fetch_real_agriculture_data():
         print(f"❌ Error fetching agriculture data: {e}")
         return None
 
-def fetch_real_biodiversity_data():
+def fetch_real_biodiversity_data(session=None, timeout=None):
     """Fetch real biodiversity data from SANParks"""
     
     try:
@@ -207,7 +244,7 @@ def fetch_real_biodiversity_data():
         print(f"❌ Error fetching biodiversity data: {e}")
         return None
 
-def fetch_real_energy_data():
+def fetch_real_energy_data(session=None, timeout=None):
     """Fetch real energy data from Eskom"""
     
     try:
@@ -254,45 +291,210 @@ def fetch_real_energy_data():
         print(f"❌ Error fetching energy data: {e}")
         return None
 
+# Dataset name -> (DATA_SOURCES entry, fetcher). Fetchers get the pooled
+# session for their host and the source timeout for their HTTP calls.
+SOURCE_FETCHERS = {
+    'weather': ('weather_service', fetch_real_weather_data),
+    'dam_levels': ('water_department', fetch_real_dam_levels),
+    'agriculture': ('agriculture_dept', fetch_real_agriculture_data),
+    'biodiversity': ('sanparks', fetch_real_biodiversity_data),
+    'energy': ('eskom', fetch_real_energy_data)
+}
+
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
+def get_session(url):
+    """Pooled HTTP session shared by every request to the URL's host"""
+    host = urlparse(url).netloc
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _SESSIONS[host] = session
+    return session
+
+_HTTP_CACHE = None
+
+def get_http_cache():
+    """Shared on-disk HTTP cache, opened on first use"""
+    global _HTTP_CACHE
+    with _SESSIONS_LOCK:
+        if _HTTP_CACHE is None:
+            _HTTP_CACHE = HttpCache(HTTP_CACHE_DIR, HTTP_CACHE_MAX_BYTES)
+    return _HTTP_CACHE
+
+def cached_get(source_name, url, session, timeout=None):
+    """GET for source fetchers: served from cache within the source TTL, else a conditional request"""
+    ttl = DATA_SOURCES[source_name].get('cache_ttl_seconds', 0)
+    return get_http_cache().get(session, url, ttl_seconds=ttl, timeout=timeout)
+
+def source_timeout(dataset_name):
+    source_name, _ = SOURCE_FETCHERS[dataset_name]
+    return DATA_SOURCES[source_name].get('timeout_seconds', DEFAULT_TIMEOUT_SECONDS)
+
+def build_adapter(dataset_name):
+    """Adapter for the dataset in the current SOURCE_MODE, or None to use the simulated fetcher"""
+    adapter_class = ADAPTERS.get(dataset_name)
+    if SOURCE_MODE == 'simulated' or adapter_class is None:
+        return None
+
+    source = DATA_SOURCES[adapter_class.source]
+    if SOURCE_MODE == 'replay':
+        return adapter_class(source['base_url'], FixtureTransport(FIXTURES_DIR))
+
+    live = HttpTransport(
+        get_session(source['base_url']),
+        timeout=source_timeout(dataset_name),
+        cached_get=functools.partial(cached_get, adapter_class.source) if adapter_class.cacheable else None
+    )
+    transport = FixtureTransport(FIXTURES_DIR, record_from=live) if SOURCE_MODE == 'record' else live
+    return adapter_class(source['base_url'], transport)
+
+def timed_fetch(dataset_name):
+    """Fetch one source as normalized rows; returns (rows, seconds, adapter metrics or None)"""
+    started = time.perf_counter()
+    adapter = build_adapter(dataset_name)
+    if adapter:
+        rows = list(adapter.records())
+        return rows, time.perf_counter() - started, adapter.metrics.as_dict()
+
+    source_name, fetch = SOURCE_FETCHERS[dataset_name]
+    data = fetch(
+        session=get_session(DATA_SOURCES[source_name]['base_url']),
+        timeout=source_timeout(dataset_name)
+    )
+    rows = normalize(dataset_name, data, observed_at=datetime.now()) if data else None
+    return rows, time.perf_counter() - started, None
+
+def timed_upload(s3_client, dataset_name, rows, run_date):
+    """Append one dataset's changes; returns (CDC summary, seconds)"""
+    started = time.perf_counter()
+    summary = apply_changes(s3_client, dataset_name, rows, run_date, bucket=BUCKET_NAME)
+    return summary, time.perf_counter() - started
+
+def run_sources(s3_client, run_date):
+    """
+    Fetch every source concurrently and upload each result as soon as it
+    arrives. A source that misses its deadline is reported as timed out
+    and does not hold up the others. Returns (timing report per dataset,
+    total seconds).
+    """
+    report = {name: {'status': 'pending', 'fetch_seconds': None, 'upload_seconds': None} for name in SOURCE_FETCHERS}
+    fetch_pool = ThreadPoolExecutor(max_workers=len(SOURCE_FETCHERS), thread_name_prefix='source')
+    upload_pool = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix='upload')
+
+    started = time.monotonic()
+    fetches = {fetch_pool.submit(timed_fetch, name): name for name in SOURCE_FETCHERS}
+    deadlines = {name: started + source_timeout(name) for name in SOURCE_FETCHERS}
+    uploads = {}
+
+    pending = set(fetches)
+    while pending:
+        next_deadline = min(deadlines[fetches[f]] for f in pending)
+        done, pending = wait(pending, timeout=max(0, next_deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+
+        for future in done:
+            name = fetches[future]
+            try:
+                rows, seconds, adapter_metrics = future.result()
+            except Exception as e:
+                print(f"❌ Error fetching {name}: {e}")
+                report[name]['status'] = 'error'
+                continue
+            report[name]['fetch_seconds'] = seconds
+            report[name]['adapter'] = adapter_metrics
+            if not rows:
+                report[name]['status'] = 'no data'
+                continue
+            uploads[upload_pool.submit(timed_upload, s3_client, name, rows, run_date)] = name
+
+        now = time.monotonic()
+        for future in [f for f in pending if deadlines[fetches[f]] <= now]:
+            name = fetches[future]
+            pending.discard(future)
+            report[name]['status'] = 'timeout'
+            print(f"⏱️ {name} timed out after {source_timeout(name)}s")
+
+    # Timed-out fetches are abandoned, not waited for
+    fetch_pool.shutdown(wait=False, cancel_futures=True)
+
+    for future in as_completed(uploads):
+        name = uploads[future]
+        try:
+            summary, seconds = future.result()
+        except Exception as e:
+            print(f"❌ Error saving {name}: {e}")
+            report[name]['status'] = 'upload failed'
+            continue
+        report[name].update(summary, upload_seconds=seconds)
+        if summary['key']:
+            report[name]['status'] = 'saved'
+            print(f"💾 Saved {name} changes to S3: {summary['inserts']} inserts, {summary['updates']} updates, "
+                  f"{summary['deletes']} deletes ({summary['key']})")
+        else:
+            report[name]['status'] = 'unchanged'
+            print(f"✅ {name}: no changes since last run")
+    upload_pool.shutdown()
+
+    return report, time.monotonic() - started
+
+def print_timing_report(report, total_seconds):
+    """Per-source timings; total should track the slowest source, not the sum"""
+    print(f"\n⏱️ Source timings:")
+    for name, entry in report.items():
+        fetch = f"{entry['fetch_seconds']:.2f}s" if entry['fetch_seconds'] is not None else '-'
+        upload = f"{entry['upload_seconds']:.2f}s" if entry['upload_seconds'] is not None else '-'
+        print(f"   {name:<14} {entry['status']:<14} fetch {fetch:>8}  upload {upload:>8}")
+        if entry.get('adapter'):
+            metrics = entry['adapter']
+            print(f"   {'':<14} {metrics['pages']} pages, {metrics['records']} records, "
+                  f"{metrics['records_per_second']:.0f} rec/s, {metrics['mib_per_second']:.1f} MiB/s")
+    fetch_sum = sum(entry['fetch_seconds'] or 0 for entry in report.values())
+    print(f"   Total: {total_seconds:.2f}s (sequential fetches would take {fetch_sum:.2f}s+)")
+
 def save_real_data_to_s3():
     """Save all real data to S3 for processing"""
     
     s3_client = boto3.client('s3', region_name=AWS_REGION)
+    glue_client = boto3.client('glue', region_name=AWS_REGION)
+    run_date = datetime.now().strftime('%Y-%m-%d')
     
-    # Fetch all real data
-    weather_data = fetch_real_weather_data()
-    dam_data = fetch_real_dam_levels()
-    agriculture_data = fetch_real_agriculture_data()
-    biodiversity_data = fetch_real_biodiversity_data()
-    energy_data = fetch_real_energy_data()
-    
-    # Save to S3
-    datasets = {
-        'weather': weather_data,
-        'dam_levels': dam_data,
-        'agriculture': agriculture_data,
-        'biodiversity': biodiversity_data,
-        'energy': energy_data
-    }
+    # Fetch all sources concurrently, uploading each as it arrives
+    report, total_seconds = run_sources(s3_client, run_date)
+    saved = [name for name, entry in report.items() if entry['status'] == 'saved']
+    saved_count = len(saved) + sum(1 for entry in report.values() if entry['status'] == 'unchanged')
     
-    saved_count = 0
-    for dataset_name, data in datasets.items():
-        if data:
-            key = f"real-data/{dataset_name}-{datetime.now().strftime('%Y-%m-%d')}.json"
-            
-            s3_client.put_object(
-                Bucket=BUCKET_NAME,
-                Key=key,
-                Body=json.dumps(data, indent=2),
-                ContentType='application/json'
-            )
-            print(f"💾 Saved {dataset_name} data to S3: {key}")
-            saved_count += 1
+    # Make the new date partitions queryable
+    for name in saved:
+        try:
+            register_partitions(glue_client, name, [run_date])
+        except Exception as e:
+            print(f"⚠️ Could not register {name} partition for {run_date}: {e}")
+    print_timing_report(report, total_seconds)
+    if _HTTP_CACHE is not None:
+        stats = _HTTP_CACHE.stats()
+        print(f"🗄️ HTTP cache: {stats['hit']} hits, {stats['revalidated']} revalidated (304), "
+              f"{stats['miss']} misses, {stats['evicted']} evicted, {stats['bytes'] / 1024 ** 2:.1f} MiB stored")
     
     return saved_count
 
+def parse_args():
+    """Command line options"""
+    parser = argparse.ArgumentParser(description='Fetch external South African data sources')
+    parser.add_argument('--sources', choices=['simulated', 'live', 'replay', 'record'], default=SOURCE_MODE,
+                        help='simulated fetchers, live adapters, adapters replaying fixtures, or live while recording them')
+    parser.add_argument('--fixtures', default=FIXTURES_DIR, help='Fixture directory for replay/record')
+    return parser.parse_args()
+
 def main():
     """Main function to fetch and save real data"""
+    global SOURCE_MODE, FIXTURES_DIR
+    args = parse_args()
+    SOURCE_MODE, FIXTURES_DIR = args.sources, args.fixtures
     
     print("🌍 AfriClimate Analytics Lake - Real Data Integration")
     print("=" * 60)
@@ -302,7 +504,7 @@ def main():
     saved_count = save_real_data_to_s3()
     
     print(f"\n🎉 Real Data Integration Summary:")
-    print(f"📊 Datasets saved: {saved_count}/5")
+    print(f"📊 Datasets up to date: {saved_count}/{len(SOURCE_FETCHERS)}")
     print(f"🇿🇦 Sources: SA Weather Service, DWS, DAFF, SANParks, Eskom")
     print(f"🔄 Data updated: {datetime.now().strftime('%Y-%m-%d %H:%M')}")
     
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Parallel S3 Listing
+Lists a prefix with the paginated API, one thread per shard, yielding keys as they arrive
+"""
+
+import logging
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+LISTING_WORKERS = 8
+
+_SHARD_DONE = object()
+
+
+def year_shards(prefix, name_template, first_year, last_year=None):
+    """
+    Shard prefixes for one key per year pattern, e.g. 'chirps-v2.0_{year}.'
+    for flat layouts or '{year}/' for year sub-folders
+    """
+    last_year = last_year or datetime.utcnow().year
+    return [f"{prefix}{name_template.format(year=year)}" for year in range(first_year, last_year + 1)]
+
+
+def discover_shards(client, bucket, prefix):
+    """
+    List one level below a prefix; returns (sub_prefixes, loose_objects)
+    """
+    sub_prefixes = []
+    loose_objects = []
+    paginator = client.get_paginator('list_objects_v2')
+
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix, Delimiter='/'):
+        sub_prefixes.extend(p['Prefix'] for p in page.get('CommonPrefixes', []))
+        loose_objects.extend(_entry(obj, prefix) for obj in page.get('Contents', []))
+
+    return sub_prefixes, loose_objects
+
+
+def _entry(obj, prefix):
+    return {
+        'key': obj['Key'],
+        'relative_key': obj['Key'][len(prefix):],
+        'size': obj['Size'],
+        'etag': obj['ETag'].strip('"'),
+        'last_modified': obj['LastModified']
+    }
+
+
+def iter_objects(client, bucket, prefix, shards=None, suffix=None, workers=LISTING_WORKERS):
+    """
+    Yield every object under ``prefix``, listing shards concurrently
+
+    ``shards`` are sub-prefixes of ``prefix`` that together cover it (see
+    year_shards). When omitted they are discovered with a delimiter listing.
+    Objects are yielded as soon as their page arrives, in no particular
+    order, so callers can start work before the listing finishes.
+    """
+    if shards is None:
+        shards, loose_objects = discover_shards(client, bucket, prefix)
+        for entry in loose_objects:
+            if entry['relative_key'] and (not suffix or entry['key'].endswith(suffix)):
+                yield entry
+    if not shards:
+        return
+
+    # Unbounded: shard threads never block if the consumer stops early
+    pages = queue.Queue()
+    paginator = client.get_paginator('list_objects_v2')
+
+    def list_shard(shard):
+        try:
+            for page in paginator.paginate(Bucket=bucket, Prefix=shard):
+                pages.put(page.get('Contents', []))
+        except Exception as e:
+            pages.put(e)
+        finally:
+            pages.put(_SHARD_DONE)
+
+    listed = 0
+    with ThreadPoolExecutor(max_workers=min(workers, len(shards)), thread_name_prefix='listing') as pool:
+        for shard in shards:
+            pool.submit(list_shard, shard)
+
+        remaining = len(shards)
+        while remaining:
+            item = pages.get()
+            if item is _SHARD_DONE:
+                remaining -= 1
+                continue
+            if isinstance(item, Exception):
+                raise item
+            for obj in item:
+                if suffix and not obj['Key'].endswith(suffix):
+                    continue
+                listed += 1
+                yield _entry(obj, prefix)
+
+    logger.info(f"Listed {listed} objects under s3://{bucket}/{prefix} across {len(shards)} shards")
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Change-Data-Capture for External Sources
+Hashes normalized records against the last known state and appends only inserts, updates and deletes
+"""
+
+import hashlib
+import json
+import logging
+import uuid
+from datetime import datetime
+
+from external_tables import (
+    BUCKET_NAME,
+    ENTITY_SECTIONS,
+    change_schema,
+    latest_key,
+    latest_schema,
+    partition_key,
+    write_parquet
+)
+
+logger = logging.getLogger(__name__)
+
+CDC_STATE_PREFIX = 'real-data/_cdc/'
+
+# Fields that change on every fetch without the record itself changing
+VOLATILE_FIELDS = {'observed_at'}
+
+
+def record_hash(row):
+    """Stable digest of a record's content, ignoring volatile fields"""
+    content = {k: v for k, v in row.items() if k not in VOLATILE_FIELDS}
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+
+def state_key(dataset_name):
+    return f"{CDC_STATE_PREFIX}{dataset_name}/state.json"
+
+
+def load_state(s3_client, dataset_name, bucket=BUCKET_NAME):
+    """
+    Last known state {record_key: {'hash', 'valid_from'}} and its ETag
+    (None for a source seen for the first time)
+    """
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=state_key(dataset_name))
+    except s3_client.exceptions.NoSuchKey:
+        return {}, None
+    return json.loads(response['Body'].read())['records'], response['ETag']
+
+
+def save_state(s3_client, dataset_name, records, etag, bucket=BUCKET_NAME):
+    """
+    Replace the state only if nobody else has since the load; a concurrent
+    run makes this raise and its changes are re-derived next run
+    """
+    condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=state_key(dataset_name),
+        Body=json.dumps({'records': records, 'updated_at': datetime.utcnow().isoformat()}, default=str),
+        ContentType='application/json',
+        **condition
+    )
+
+
+def diff_records(dataset_name, rows, state, valid_from):
+    """
+    Compare a full snapshot with the state
+
+    Returns (changes, new_state, unchanged). Records missing from the
+    snapshot become 'delete' rows that carry only their key.
+    """
+    _, key_column = ENTITY_SECTIONS[dataset_name]
+    changes = []
+    new_state = {}
+    unchanged = 0
+
+    for row in rows:
+        key = str(row[key_column])
+        digest = record_hash(row)
+        previous = state.get(key)
+        if previous and previous['hash'] == digest:
+            new_state[key] = previous
+            unchanged += 1
+            continue
+        new_state[key] = {'hash': digest, 'valid_from': valid_from.isoformat()}
+        changes.append({
+            **row,
+            'record_key': key,
+            'record_hash': digest,
+            'change_type': 'update' if previous else 'insert',
+            'valid_from': valid_from
+        })
+
+    for key in sorted(set(state) - set(new_state)):
+        changes.append({
+            key_column: key,
+            'record_key': key,
+            'record_hash': None,
+            'change_type': 'delete',
+            'valid_from': valid_from
+        })
+
+    return changes, new_state, unchanged
+
+
+def apply_changes(s3_client, dataset_name, rows, run_date, run_at=None, bucket=BUCKET_NAME):
+    """
+    Append one run's changes to the source's change log and refresh the
+    compacted latest view
+
+    Nothing is written when the snapshot matches the state. Returns a
+    summary with counts, the change file key (or None) and bytes written.
+    """
+    run_at = run_at or datetime.utcnow()
+    state, etag = load_state(s3_client, dataset_name, bucket)
+    changes, new_state, unchanged = diff_records(dataset_name, rows, state, run_at)
+
+    summary = {
+        'inserts': sum(1 for c in changes if c['change_type'] == 'insert'),
+        'updates': sum(1 for c in changes if c['change_type'] == 'update'),
+        'deletes': sum(1 for c in changes if c['change_type'] == 'delete'),
+        'unchanged': unchanged,
+        'key': None,
+        'bytes': 0
+    }
+    if not changes:
+        return summary
+
+    run_id = f"{run_at.strftime('%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    key = partition_key(dataset_name, run_date, run_id)
+    summary['bytes'] = write_parquet(s3_client, key, changes, change_schema(dataset_name), bucket)
+    summary['key'] = key
+
+    _, key_column = ENTITY_SECTIONS[dataset_name]
+    latest = []
+    for row in rows:
+        record = new_state[str(row[key_column])]
+        latest.append({
+            **row,
+            'record_key': str(row[key_column]),
+            'record_hash': record['hash'],
+            'valid_from': datetime.fromisoformat(record['valid_from'])
+        })
+    summary['bytes'] += write_parquet(s3_client, latest_key(dataset_name), latest, latest_schema(dataset_name), bucket)
+
+    # State last: if this fails the next run re-emits the same changes rather than losing them
+    save_state(s3_client, dataset_name, new_state, etag, bucket)
+    logger.info(
+        f"{dataset_name}: {summary['inserts']} inserts, {summary['updates']} updates, "
+        f"{summary['deletes']} deletes, {unchanged} unchanged"
+    )
+    return summary
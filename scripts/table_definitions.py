@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Table Definitions with Partition Projection
+Generates Glue table definitions whose partitions Athena computes from projection properties, and applies them through the Glue API
+
+Tables committed through snapshot logs (table_commits.py) are not projected: a projected
+partition would read every commit directory under year=/month=, so their writers point
+each catalog partition at its current commit instead (catalog_partitions.py)
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+# The raster registry and quality stats ship with the Lambda package at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog_partitions import glue_columns, schema_version
+from quality_stats import QUALITY_STATS_COLUMNS, QUALITY_STATS_TABLE, STATS_PREFIX
+from raster_datasets import DATASETS, get_dataset
+
+from external_tables import (
+    BUCKET_NAME,
+    DATABASE_NAME,
+    SCHEMAS,
+    change_schema,
+    latest_location,
+    latest_schema,
+    latest_table_name,
+    table_location,
+    table_name
+)
+
+logger = logging.getLogger(__name__)
+
+CRAWLER_NAME = 'chirps-crawler'
+
+# Projected year range: CHIRPS starts in 1981; months outside the data simply read nothing
+FIRST_YEAR = 1981
+LAST_YEAR = 2050
+
+# External sources were first captured on this date; NOW keeps today queryable
+EXTERNAL_FIRST_DATE = '2024-01-01'
+
+FORMATS = {
+    'parquet': {
+        'InputFormat': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat',
+        'OutputFormat': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat',
+        'SerdeInfo': {'SerializationLibrary': 'org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe'}
+    },
+    'json': {
+        'InputFormat': 'org.apache.hadoop.mapred.TextInputFormat',
+        'OutputFormat': 'org.apache.hadoop.hive.ql.io.HiveIgnoreKeyTextOutputFormat',
+        'SerdeInfo': {'SerializationLibrary': 'org.openx.data.jsonserde.JsonSerDe'}
+    }
+}
+
+YEAR_MONTH_PROJECTION = {
+    'year': {'type': 'integer', 'range': f'{FIRST_YEAR},{LAST_YEAR}'},
+    'month': {'type': 'integer', 'range': '1,12', 'digits': '2'}
+}
+
+
+def raster_table(dataset_name, bucket=BUCKET_NAME):
+    """Enriched table of a registered raster dataset, partitioned year=/month="""
+    dataset = get_dataset(dataset_name)
+    return {
+        'name': dataset['table'],
+        'description': dataset['description'],
+        'location': f"s3://{bucket}/{dataset['output_prefix']}",
+        'format': 'parquet',
+        'columns': [
+            ('latitude', 'double'),
+            ('longitude', 'double'),
+            (dataset['variable'], 'double'),
+            ('region_code', 'string'),
+            ('data_quality', 'string')
+        ],
+        'partition_keys': [('year', 'int'), ('month', 'int')],
+        'projection': None
+    }
+
+
+def quality_stats_table(bucket=BUCKET_NAME):
+    """Per-partition quality records written by the ETL alongside every enriched file"""
+    return {
+        'name': QUALITY_STATS_TABLE,
+        'description': 'Per-partition data-quality statistics of the raster ETL',
+        'location': f"s3://{bucket}/{STATS_PREFIX}",
+        'format': 'json',
+        'columns': QUALITY_STATS_COLUMNS,
+        'partition_keys': [('dataset', 'string'), ('year', 'int'), ('month', 'int')],
+        'projection': {
+            'dataset': {'type': 'enum', 'values': ','.join(sorted(DATASETS))},
+            **YEAR_MONTH_PROJECTION
+        },
+        'template': 'dataset=${dataset}/year=${year}/month=${month}/'
+    }
+
+
+def catchment_rainfall_table(bucket=BUCKET_NAME):
+    """Dam catchment rainfall (scripts/catchment_rainfall.py)"""
+    # Imported here: the module pulls in rasterio and scipy
+    from catchment_rainfall import OUTPUT_PREFIX, SCHEMA, TABLE_NAME
+
+    return {
+        'name': TABLE_NAME,
+        'description': 'Catchment-weighted CHIRPS precipitation and anomaly per DWS dam and month',
+        'location': f"s3://{bucket}/{OUTPUT_PREFIX}",
+        'format': 'parquet',
+        'columns': glue_columns(SCHEMA, exclude=('year', 'month')),
+        'partition_keys': [('year', 'int'), ('month', 'int')],
+        'projection': None
+    }
+
+
+def external_tables(dataset_name, bucket=BUCKET_NAME):
+    """Change log (partitioned by capture date) and latest view of an external source"""
+    return [
+        {
+            'name': table_name(dataset_name),
+            'description': f"Change log of the {dataset_name} external source",
+            'location': table_location(dataset_name, bucket),
+            'format': 'parquet',
+            'columns': glue_columns(change_schema(dataset_name)),
+            'partition_keys': [('date', 'string')],
+            'projection': {
+                'date': {
+                    'type': 'date',
+                    'format': 'yyyy-MM-dd',
+                    'range': f'{EXTERNAL_FIRST_DATE},NOW',
+                    'interval': '1',
+                    'interval.unit': 'DAYS'
+                }
+            },
+            'template': 'date=${date}/'
+        },
+        {
+            'name': latest_table_name(dataset_name),
+            'description': f"Latest record per entity of the {dataset_name} external source",
+            'location': latest_location(dataset_name, bucket),
+            'format': 'parquet',
+            'columns': glue_columns(latest_schema(dataset_name)),
+            'partition_keys': []
+        }
+    ]
+
+
+def table_definitions(bucket=BUCKET_NAME):
+    """Every table the lake writes, in catalog order"""
+    definitions = [raster_table(name, bucket) for name in DATASETS]
+    definitions.append(quality_stats_table(bucket))
+    definitions.append(catchment_rainfall_table(bucket))
+    for dataset_name in SCHEMAS:
+        definitions.extend(external_tables(dataset_name, bucket))
+    return definitions
+
+
+def table_input(definition, projection=True):
+    """
+    Glue TableInput for a definition; with ``projection`` the partition
+    values are computed by Athena from the projection properties and the
+    storage location template instead of being looked up in the catalog
+    """
+    parameters = {
+        'classification': definition['format'],
+        'EXTERNAL': 'TRUE',
+        'schema_version': schema_version(definition['columns'])
+    }
+    if projection and definition.get('projection'):
+        parameters['projection.enabled'] = 'true'
+        for column, properties in definition['projection'].items():
+            for prop, value in properties.items():
+                parameters[f"projection.{column}.{prop}"] = value
+        parameters['storage.location.template'] = f"{definition['location']}{definition['template']}"
+
+    return {
+        'Name': definition['name'],
+        'Description': definition['description'],
+        'TableType': 'EXTERNAL_TABLE',
+        'Parameters': parameters,
+        'PartitionKeys': [{'Name': name, 'Type': type_} for name, type_ in definition['partition_keys']],
+        'StorageDescriptor': {
+            'Columns': [{'Name': name, 'Type': type_} for name, type_ in definition['columns']],
+            'Location': definition['location'],
+            **FORMATS[definition['format']]
+        }
+    }
+
+
+def ensure_table(glue_client, definition, projection=True):
+    """
+    Create a table from its definition if it is missing; the writers call
+    this before registering partitions. Returns True if it was created.
+    """
+    try:
+        glue_client.create_table(DatabaseName=DATABASE_NAME, TableInput=table_input(definition, projection))
+    except glue_client.exceptions.AlreadyExistsException:
+        return False
+    logger.info(f"Created table {DATABASE_NAME}.{definition['name']}")
+    return True
+
+
+def apply_definitions(glue_client, definitions, projection=True):
+    """Create missing tables and update existing ones; returns {'created', 'updated'} name lists"""
+    applied = {'created': [], 'updated': []}
+    for definition in definitions:
+        if ensure_table(glue_client, definition, projection):
+            applied['created'].append(definition['name'])
+        else:
+            glue_client.update_table(DatabaseName=DATABASE_NAME, TableInput=table_input(definition, projection))
+            applied['updated'].append(definition['name'])
+    return applied
+
+
+def main():
+    import boto3
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Apply partition-projection table definitions to the Glue catalog')
+    parser.add_argument('--tables', nargs='+', help='Only these tables (default: all)')
+    parser.add_argument('--dry-run', action='store_true', help='Print the table inputs instead of applying them')
+    parser.add_argument('--no-projection', action='store_true', help='Catalog-managed partitions instead of projection')
+    parser.add_argument('--pause-crawler', action='store_true', help=f'Stop the {CRAWLER_NAME} schedule')
+    args = parser.parse_args()
+
+    definitions = table_definitions()
+    if args.tables:
+        unknown = set(args.tables) - {d['name'] for d in definitions}
+        if unknown:
+            parser.error(f"Unknown tables: {', '.join(sorted(unknown))}")
+        definitions = [d for d in definitions if d['name'] in args.tables]
+
+    if args.dry_run:
+        print(json.dumps([table_input(d, not args.no_projection) for d in definitions], indent=2))
+        return
+
+    glue = boto3.client('glue', region_name='af-south-1')
+    applied = apply_definitions(glue, definitions, projection=not args.no_projection)
+    print(f"🗂️ Table definitions applied to {DATABASE_NAME}: "
+          f"{len(applied['created'])} created, {len(applied['updated'])} updated")
+    for name in applied['created'] + applied['updated']:
+        print(f"   - {name}")
+
+    if args.pause_crawler:
+        glue.stop_crawler_schedule(CrawlerName=CRAWLER_NAME)
+        print(f"⏸️ {CRAWLER_NAME} schedule stopped; projected tables need no crawling")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+S3-to-S3 Transfer Engine
+Streams objects from the DE Africa bucket into the lake with boto3, no local disk
+"""
+
+import logging
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore import UNSIGNED
+from botocore.config import Config
+
+from adaptive_control import MAX_ATTEMPTS, AdaptiveConcurrency, TokenBucket, backoff_delay, classify_error
+from transfer_integrity import ChecksumMismatch, hashing_reader
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+REGION = 'af-south-1'
+
+DEFAULT_WORKERS = 16
+CHUNK_SIZE = 16 * 1024 * 1024
+MULTIPART_CONCURRENCY = 4
+
+# Adaptive mode starting points; both adjust from observed errors and latency
+INITIAL_CONCURRENCY = 4
+INITIAL_REQUEST_RATE = 50.0
+
+
+def transfer_result(filename, started, attempts, nbytes=0, verified=None, error=None):
+    """Result dict reported for one object by every transfer runner"""
+    return {
+        'filename': filename,
+        'success': error is None,
+        'bytes': nbytes if error is None else 0,
+        'verified': verified if error is None else None,
+        'seconds': time.perf_counter() - started,
+        'attempts': attempts,
+        'error': str(error) if error is not None else None
+    }
+
+
+class TransferEngine:
+    """
+    Copies objects between buckets in-process
+
+    Each object is read from a ``get_object`` stream and fed straight into a
+    multipart ``upload_fileobj``; at most ``MULTIPART_CONCURRENCY`` chunks per
+    object are buffered in memory. Clients are shared across worker threads
+    and sized so every thread and multipart part gets a pooled connection.
+
+    Every object is MD5-hashed as it streams and checked against the source
+    ETag; a mismatch counts as a failed attempt and the object is copied
+    again. Throttling and transient failures are retried with jittered exponential
+    backoff. In adaptive mode ``max_workers`` is only an upper bound: an
+    AIMD controller sets the number of concurrent copies and each host gets
+    a token bucket whose rate backs off when the host throttles.
+    """
+
+    def __init__(self, source_bucket, source_prefix, target_bucket, target_prefix,
+                 max_workers=DEFAULT_WORKERS, chunk_size=CHUNK_SIZE, adaptive=True):
+        self.max_workers = max_workers
+        self.source_bucket = source_bucket
+        self.source_prefix = source_prefix
+        self.target_bucket = target_bucket
+        self.target_prefix = target_prefix
+
+        self.concurrency = None
+        self.source_limiter = None
+        self.target_limiter = None
+        if adaptive:
+            self.concurrency = AdaptiveConcurrency(
+                initial=min(INITIAL_CONCURRENCY, max_workers), maximum=max_workers
+            )
+            self.source_limiter = TokenBucket(INITIAL_REQUEST_RATE)
+            self.target_limiter = TokenBucket(INITIAL_REQUEST_RATE)
+
+        # Whole-object retries happen in copy_file; the SDK only retries once per request
+        pool_size = max_workers * (MULTIPART_CONCURRENCY + 1)
+        retries = {'max_attempts': 2, 'mode': 'standard'}
+        self.source_client = boto3.client(
+            's3', region_name=REGION,
+            config=Config(signature_version=UNSIGNED, max_pool_connections=pool_size, retries=retries)
+        )
+        self.target_client = boto3.client(
+            's3', region_name=REGION,
+            config=Config(max_pool_connections=pool_size, retries=retries)
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=chunk_size,
+            multipart_chunksize=chunk_size,
+            max_concurrency=MULTIPART_CONCURRENCY,
+            use_threads=True
+        )
+
+    def _copy_once(self, source_key, target_key):
+        """
+        Stream one object from source to target; returns (size, verified)
+        where verified is None if the source ETag cannot be checked
+        """
+        if self.source_limiter:
+            self.source_limiter.acquire()
+        response = self.source_client.get_object(Bucket=self.source_bucket, Key=source_key)
+        body = hashing_reader(self.source_client, self.source_bucket, source_key, response)
+        extra_args = {'ContentType': response['ContentType']} if response.get('ContentType') else None
+
+        if self.target_limiter:
+            self.target_limiter.acquire()
+        self.target_client.upload_fileobj(
+            body, self.target_bucket, target_key,
+            ExtraArgs=extra_args, Config=self.transfer_config
+        )
+        return response['ContentLength'], self._verify(body, target_key)
+
+    def _verify(self, body, target_key):
+        """Check a streamed body; a copy that fails is deleted so no later sync trusts it"""
+        try:
+            return body.verify()
+        except ChecksumMismatch:
+            self.target_client.delete_object(Bucket=self.target_bucket, Key=target_key)
+            raise
+
+    def _feedback(self, error, error_kind, seconds, nbytes):
+        """Report one attempt to the adaptive controllers"""
+        if self.concurrency:
+            self.concurrency.record(seconds, nbytes, error_kind)
+        if not self.source_limiter:
+            return
+        if error_kind == 'throttle':
+            limiter = self.source_limiter if getattr(error, 'operation_name', '') == 'GetObject' else self.target_limiter
+            limiter.on_throttle()
+        elif error is None:
+            self.source_limiter.on_success()
+            self.target_limiter.on_success()
+
+    def copy_file(self, filename):
+        """
+        Stream one object from source to target; ``filename`` is the key
+        relative to the source prefix. Returns a result dict.
+        """
+        source_key = f"{self.source_prefix}{filename}"
+        target_key = f"{self.target_prefix}{filename}"
+        started = time.perf_counter()
+        attempt = 0
+
+        while True:
+            attempt += 1
+            attempt_started = time.perf_counter()
+            nbytes, verified, error = 0, None, None
+
+            if self.concurrency:
+                self.concurrency.acquire()
+            try:
+                nbytes, verified = self._copy_once(source_key, target_key)
+            except Exception as e:
+                error = e
+            finally:
+                if self.concurrency:
+                    self.concurrency.release()
+
+            error_kind = classify_error(error) if error else None
+            self._feedback(error, error_kind, time.perf_counter() - attempt_started, nbytes)
+
+            if error is None:
+                return transfer_result(filename, started, attempt, nbytes, verified)
+
+            if error_kind is None or attempt >= MAX_ATTEMPTS:
+                logger.error(f"Failed to transfer {filename} after {attempt} attempt(s): {str(error)}")
+                return transfer_result(filename, started, attempt, error=error)
+
+            delay = backoff_delay(attempt)
+            logger.warning(f"Retrying {filename} in {delay:.1f}s ({error_kind}: {str(error)})")
+            time.sleep(delay)
+
+    def run(self, filenames, on_result=None):
+        """
+        Transfer many objects on a bounded thread pool
+
+        ``filenames`` may be any iterable, including a generator that yields
+        keys while they are still being listed; at most twice ``max_workers``
+        transfers are queued at a time. ``on_result`` is called from the
+        calling thread as each transfer finishes.
+        """
+        results = []
+        in_flight = set()
+
+        def collect(return_when):
+            nonlocal in_flight
+            done, in_flight = wait(in_flight, return_when=return_when)
+            for future in done:
+                result = future.result()
+                results.append(result)
+                if on_result:
+                    on_result(result)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='transfer') as pool:
+            for filename in filenames:
+                in_flight.add(pool.submit(self.copy_file, filename))
+                if len(in_flight) >= self.max_workers * 2:
+                    collect(FIRST_COMPLETED)
+            collect(ALL_COMPLETED)
+
+        return results
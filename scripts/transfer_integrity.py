@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+In-Stream Transfer Integrity
+Hashes objects while they stream through a transfer and checks them against the source ETag
+"""
+
+import hashlib
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Plain and multipart S3 ETags are MD5-based unless the object uses SSE-KMS/SSE-C
+MD5_ETAG = re.compile(r'^[0-9a-f]{32}(-\d+)?$')
+
+
+class ChecksumMismatch(Exception):
+    """Bytes read from the source do not match its ETag"""
+
+
+class HashingReader:
+    """
+    File-like wrapper that MD5-hashes everything read through it
+
+    For multipart sources each ``part_size`` slice is hashed separately so
+    the S3 multipart ETag (MD5 of the part MD5s, then ``-N``) can be rebuilt
+    without a second read.
+    """
+
+    def __init__(self, body, expected_etag=None, part_size=None):
+        self._body = body
+        self.expected_etag = expected_etag
+        self.part_size = part_size
+        self.bytes_read = 0
+        self._whole = hashlib.md5()
+        self._part = hashlib.md5()
+        self._part_bytes = 0
+        self._part_digests = []
+
+    def read(self, amt=None):
+        data = self._body.read(amt) if amt is not None else self._body.read()
+        self._update(data)
+        return data
+
+    def _update(self, data):
+        self.bytes_read += len(data)
+        if not self.part_size:
+            self._whole.update(data)
+            return
+        view = memoryview(data)
+        while view:
+            take = min(len(view), self.part_size - self._part_bytes)
+            self._part.update(view[:take])
+            self._part_bytes += take
+            view = view[take:]
+            if self._part_bytes == self.part_size:
+                self._close_part()
+
+    def _close_part(self):
+        self._part_digests.append(self._part.digest())
+        self._part = hashlib.md5()
+        self._part_bytes = 0
+
+    def etag(self):
+        """ETag of the bytes read so far, in the same form as the source ETag"""
+        if not self.part_size:
+            return self._whole.hexdigest()
+        if self._part_bytes:
+            self._close_part()
+        combined = hashlib.md5(b''.join(self._part_digests)).hexdigest()
+        return f"{combined}-{len(self._part_digests)}"
+
+    def verify(self):
+        """
+        True when the streamed bytes match the source, None when the source
+        ETag cannot be checked; raises ChecksumMismatch otherwise
+        """
+        if self.expected_etag is None:
+            return None
+        actual = self.etag()
+        if actual != self.expected_etag:
+            raise ChecksumMismatch(f"ETag mismatch: source {self.expected_etag}, streamed {actual}")
+        return True
+
+
+def expected_etag(response):
+    """The source ETag if it is an MD5-based digest we can recompute, else None"""
+    etag = response.get('ETag', '').strip('"')
+    if response.get('ServerSideEncryption') == 'aws:kms' or response.get('SSECustomerAlgorithm'):
+        return None
+    return etag if MD5_ETAG.match(etag) else None
+
+
+def hashing_reader(client, bucket, key, response):
+    """
+    Wrap a ``get_object`` response body for verification
+
+    Multipart sources cost one extra HEAD (``PartNumber=1``) to learn the
+    part size the uploader used; no object bytes are read twice.
+    """
+    etag = expected_etag(response)
+    part_size = None
+    if etag and '-' in etag:
+        head = client.head_object(Bucket=bucket, Key=key, PartNumber=1)
+        part_size = head['ContentLength']
+    return HashingReader(response['Body'], etag, part_size)
@@ -8,6 +8,9 @@ import boto3
 import json
 from datetime import datetime
 
+from athena_client import AthenaClient
+from materialized_views import quicksight_sql, refresh_all
+
 # Configuration
 AWS_REGION = 'af-south-1'
 QUICKSIGHT_NAMESPACE = 'default'
@@ -17,7 +20,7 @@ def create_quicksight_datasets():
     """Create QuickSight datasets for all extensions"""
     
     quicksight_client = boto3.client('quicksight', region_name=AWS_REGION)
-    athena_client = boto3.client('athena', region_name=AWS_REGION)
+    athena = AthenaClient(region_name=AWS_REGION)
     
     print("📊 Creating QuickSight Datasets...")
     print("=" * 40)
@@ -29,107 +32,57 @@ def create_quicksight_datasets():
     datasets = [
         {
             'name': 'drought_early_warning',
-            'sql_query': '''
-                SELECT 
-                    year,
-                    month,
-                    province,
-                    region,
-                    drought_level,
-                    risk_level,
-                    monthly_precip,
-                    avg_spi,
-                    farmer_message,
-                    analysis_date
-                FROM africlimate_climate_db.drought_alerts
-                ORDER BY analysis_date DESC
-            ''',
+            'sql_query': quicksight_sql('drought_early_warning'),
             'description': 'Drought Early Warning System - Farmer alerts and risk assessments'
         },
         {
             'name': 'water_security',
-            'sql_query': '''
-                SELECT 
-                    dam_name,
-                    province,
-                    current_capacity_percent,
-                    rainfall_status,
-                    overall_security_score,
-                    risk_level,
-                    days_until_critical,
-                    recommendations,
-                    analysis_date
-                FROM africlimate_climate_db.water_security_metrics
-                ORDER BY analysis_date DESC
-            ''',
+            'sql_query': quicksight_sql('water_security'),
             'description': 'Urban Water Security - Dam levels and rainfall correlations'
         },
         {
             'name': 'ndvi_impact_tracker',
-            'sql_query': '''
-                SELECT 
-                    area_name,
-                    ecosystem,
-                    overall_metrics,
-                    risk_level,
-                    biodiversity_impact,
-                    key_threats,
-                    recommendations,
-                    assessment_date
-                FROM africlimate_climate_db.biodiversity_risk_assessments
-                ORDER BY assessment_date DESC
-            ''',
+            'sql_query': quicksight_sql('ndvi_impact_tracker'),
             'description': 'Climate Change Impact Tracker - NDVI vegetation analysis'
         },
         {
             'name': 'community_adaptation',
-            'sql_query': '''
-                SELECT 
-                    settlement_name,
-                    population,
-                    overall_risk_level,
-                    primary_risks,
-                    requires_immediate_action,
-                    vulnerability_factors,
-                    assessment_date
-                FROM africlimate_climate_db.community_vulnerability_assessments
-                ORDER BY assessment_date DESC
-            ''',
+            'sql_query': quicksight_sql('community_adaptation'),
             'description': 'Community Climate Adaptation - Informal settlement risk assessments'
         },
         {
             'name': 'carbon_footprint',
-            'sql_query': '''
-                SELECT 
-                    energy_type,
-                    carbon_intensity_trend,
-                    climate_resilience,
-                    transition_opportunities,
-                    carbon_risk_score,
-                    key_insights,
-                    assessment_date
-                FROM africlimate_climate_db.carbon_impact_assessments
-                ORDER BY assessment_date DESC
-            ''',
+            'sql_query': quicksight_sql('carbon_footprint'),
             'description': 'Carbon Footprint Integration - Energy-climate correlations'
         }
     ]
     
     created_datasets = 0
     
-    for dataset in datasets:
+    # Bring the materialized tables the datasets read up to date first
+    for name, result in refresh_all(athena).items():
+        if isinstance(result, Exception):
+            print(f"⚠️ Could not refresh materialized table for {name}: {result}")
+        else:
+            print(f"🧱 {result['table']}: materialized up to {result['watermark']}, "
+                  f"{result['bytes_scanned'] / 1024 ** 2:.1f} MiB scanned")
+    
+    # Run every dataset query at once, within the workgroup's concurrency limit
+    results = athena.run_many([
+        {
+            'sql': dataset['sql_query'],
+            'output_location': f's3://africlimate-analytics-lake/quicksight-results/{dataset["name"]}/'
+        }
+        for dataset in datasets
+    ])
+    
+    for dataset, result in zip(datasets, results):
         try:
-            # Create Athena query result location
-            output_location = f's3://africlimate-analytics-lake/quicksight-results/{dataset["name"]}/'
-            
-            # Execute query to create temporary table
-            query_execution_id = athena_client.start_query_execution(
-                QueryString=dataset['sql_query'],
-                QueryExecutionContext={'Database': 'africlimate_climate_db'},
-                ResultConfiguration={'OutputLocation': output_location}
-            )['QueryExecutionId']
+            if isinstance(result, Exception):
+                raise result
             
-            print(f"🔍 Query started for {dataset['name']}: {query_execution_id}")
+            print(f"🔍 Query finished for {dataset['name']}: {result['query_execution_id']} "
+                  f"({result['wall_seconds']:.1f}s, {result['bytes_scanned'] / 1024 ** 2:.1f} MiB scanned)")
             
             # Create QuickSight dataset
             dataset_config = {
@@ -164,14 +117,16 @@ def create_quicksight_datasets():
                 }
             }
             
-            # Note: In actual implementation, you'd wait for query completion first
             print(f"📊 Dataset configuration prepared for {dataset['name']}")
             created_datasets += 1
             
         except Exception as e:
             print(f"❌ Failed to create dataset {dataset['name']}: {e}")
     
+    totals = athena.summary()
     print(f"\n✅ Dataset configurations prepared: {created_datasets}/{len(datasets)}")
+    print(f"   Athena: {totals['bytes_scanned'] / 1024 ** 2:.1f} MiB scanned, "
+          f"{totals['engine_ms'] / 1000:.1f}s engine time across {totals['queries']} queries")
     return created_datasets
 
 def create_dashboard_analysis():
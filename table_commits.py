@@ -0,0 +1,335 @@
+"""
+Snapshot-based table commits for the processed layer
+
+Every write to a processed table goes through a manifest log instead of
+overwriting files in place. A commit records the complete file list of the
+table together with per-file column statistics:
+
+    processed/_manifests/{table}/snapshots/{sequence}-{snapshot_id}.json
+    processed/_manifests/{table}/current.json
+
+Snapshot files are immutable history. ``current.json`` holds a full copy of the
+latest snapshot, so readers plan a query with a single GET instead of listing
+S3 prefixes. It is swapped with a conditional PUT (If-Match on the ETag read at
+the start of the commit), which makes multi-file commits atomic: concurrent
+writers retry on conflict instead of clobbering each other.
+
+Writers put each commit's files in a fresh directory per partition (see
+``partition_directory``) and point the catalog partition at it once the
+commit has landed, so engines that read the catalog never see two commits of
+a partition at once. Files a commit supersedes stay in place for readers still
+planning from an older snapshot; ``expire_snapshots`` deletes them, and the
+uploads of commits that never landed, after a retention period.
+"""
+
+import argparse
+import json
+import logging
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+MANIFEST_ROOT = 'processed/_manifests/'
+FORMAT_VERSION = 1
+MAX_COMMIT_ATTEMPTS = 5
+CONFLICT_ERROR_CODES = ('PreconditionFailed', 'ConditionalRequestConflict')
+
+# How long superseded files stay readable after the commit that replaced them
+DEFAULT_RETENTION_HOURS = 24
+DELETE_BATCH_SIZE = 1000
+
+
+def manifest_prefix(table_name):
+    """S3 prefix holding the snapshot log of a table"""
+    return f"{MANIFEST_ROOT}{table_name}/"
+
+
+def partition_directory(table_prefix, partition, commit_id):
+    """
+    Key prefix of the files one commit writes to a partition, e.g.
+    ``{table_prefix}year=2024/month=03/commit={commit_id}/`` (month
+    zero-padded, as in the catalog)
+    """
+    path = ''.join(
+        f"{column}={value:02d}/" if column == 'month' and isinstance(value, int) else f"{column}={value}/"
+        for column, value in partition.items()
+    )
+    return f"{table_prefix}{path}commit={commit_id}/"
+
+
+def new_commit_id():
+    """Directory name of a commit's files, unique per writer attempt"""
+    return uuid.uuid4().hex[:12]
+
+
+def collect_file_stats(local_path):
+    """
+    Read row count and per-column min/max/null counts from a Parquet footer
+    """
+    import pyarrow.parquet as pq
+
+    metadata = pq.ParquetFile(local_path).metadata
+    column_stats = {}
+
+    for rg_index in range(metadata.num_row_groups):
+        row_group = metadata.row_group(rg_index)
+        for col_index in range(row_group.num_columns):
+            column = row_group.column(col_index)
+            stats = column.statistics
+            name = column.path_in_schema
+            entry = column_stats.setdefault(name, {'min': None, 'max': None, 'null_count': 0})
+
+            if stats is None:
+                continue
+            if stats.has_null_count:
+                entry['null_count'] += stats.null_count
+            if stats.has_min_max:
+                entry['min'] = stats.min if entry['min'] is None else min(entry['min'], stats.min)
+                entry['max'] = stats.max if entry['max'] is None else max(entry['max'], stats.max)
+
+    return {
+        'record_count': metadata.num_rows,
+        'column_stats': column_stats
+    }
+
+
+def load_current_snapshot(s3_client, bucket, table_name):
+    """
+    Return (snapshot, etag) for the current table state, or (None, None)
+    if the table has never been committed
+    """
+    key = f"{manifest_prefix(table_name)}current.json"
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return None, None
+        raise
+
+    snapshot = json.loads(response['Body'].read())
+    return snapshot, response['ETag']
+
+
+def _apply_changes(parent, table_name, table_location, added_files, replace_partitions, operation):
+    """Build the next snapshot from its parent and the files being committed"""
+    parent_files = parent['files'] if parent else []
+
+    replaced = set()
+    if replace_partitions:
+        replaced = {_partition_key(f['partition']) for f in added_files}
+
+    kept_files = [f for f in parent_files if _partition_key(f['partition']) not in replaced]
+    removed_files = [f for f in parent_files if _partition_key(f['partition']) in replaced]
+    files = kept_files + list(added_files)
+
+    snapshot = {
+        'format_version': FORMAT_VERSION,
+        'table': table_name,
+        'table_location': table_location,
+        'snapshot_id': uuid.uuid4().hex,
+        'parent_snapshot_id': parent['snapshot_id'] if parent else None,
+        'sequence_number': (parent['sequence_number'] + 1) if parent else 1,
+        'committed_at': datetime.utcnow().isoformat() + 'Z',
+        'operation': operation,
+        'summary': {
+            'added_files': len(added_files),
+            'removed_files': len(removed_files),
+            'total_files': len(files),
+            'total_records': sum(f.get('record_count', 0) for f in files)
+        },
+        'files': files
+    }
+    return snapshot, removed_files
+
+
+def _partition_key(partition):
+    return tuple(sorted(partition.items()))
+
+
+def commit_files(s3_client, bucket, table_name, table_location, added_files,
+                 replace_partitions=True, operation='replace_partitions'):
+    """
+    Atomically commit data files to a table
+
+    ``added_files`` is a list of dicts with ``key``, ``partition``,
+    ``record_count``, ``size_bytes`` and ``column_stats``. With
+    ``replace_partitions`` every file previously committed to the same
+    partitions is dropped from the new snapshot; the files themselves are
+    left for ``expire_snapshots``. Returns the committed snapshot.
+
+    The files must already be uploaded. If the commit fails they are
+    referenced by no snapshot and the caller should delete them.
+    """
+    prefix = manifest_prefix(table_name)
+
+    for attempt in range(1, MAX_COMMIT_ATTEMPTS + 1):
+        parent, etag = load_current_snapshot(s3_client, bucket, table_name)
+        snapshot, _ = _apply_changes(
+            parent, table_name, table_location, added_files, replace_partitions, operation
+        )
+        body = json.dumps(snapshot, default=str)
+
+        # Immutable history entry first, then swap the pointer
+        history_key = f"{prefix}snapshots/{snapshot['sequence_number']:08d}-{snapshot['snapshot_id']}.json"
+        s3_client.put_object(Bucket=bucket, Key=history_key, Body=body, ContentType='application/json')
+
+        condition = {'IfMatch': etag} if etag else {'IfNoneMatch': '*'}
+        try:
+            s3_client.put_object(
+                Bucket=bucket,
+                Key=f"{prefix}current.json",
+                Body=body,
+                ContentType='application/json',
+                **condition
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] not in CONFLICT_ERROR_CODES:
+                raise
+            logger.warning(f"Commit conflict on {table_name} (attempt {attempt}/{MAX_COMMIT_ATTEMPTS}), retrying")
+            s3_client.delete_object(Bucket=bucket, Key=history_key)
+            time.sleep(random.uniform(0, 0.2 * 2 ** attempt))
+            continue
+
+        logger.info(
+            f"Committed snapshot {snapshot['sequence_number']} of {table_name}: "
+            f"+{snapshot['summary']['added_files']} -{snapshot['summary']['removed_files']} files"
+        )
+        return snapshot
+
+    raise RuntimeError(f"Could not commit to {table_name} after {MAX_COMMIT_ATTEMPTS} attempts")
+
+
+def plan_files(snapshot, filters=None):
+    """
+    Return the data files of a snapshot that may contain matching rows
+
+    ``filters`` maps a column to either an exact value or a ``(low, high)``
+    range (either bound may be None). Partition columns are matched exactly;
+    other columns are pruned by their min/max statistics.
+    """
+    if snapshot is None:
+        return []
+    if not filters:
+        return list(snapshot['files'])
+
+    return [f for f in snapshot['files'] if _file_may_match(f, filters)]
+
+
+def _file_may_match(data_file, filters):
+    for column, condition in filters.items():
+        low, high = condition if isinstance(condition, tuple) else (condition, condition)
+
+        if column in data_file['partition']:
+            value = data_file['partition'][column]
+            if (low is not None and value < low) or (high is not None and value > high):
+                return False
+            continue
+
+        stats = data_file.get('column_stats', {}).get(column)
+        if not stats or stats['min'] is None or stats['max'] is None:
+            continue
+        if (low is not None and stats['max'] < low) or (high is not None and stats['min'] > high):
+            return False
+
+    return True
+
+
+def _delete_keys(s3_client, bucket, keys):
+    for start in range(0, len(keys), DELETE_BATCH_SIZE):
+        s3_client.delete_objects(
+            Bucket=bucket,
+            Delete={'Objects': [{'Key': k} for k in keys[start:start + DELETE_BATCH_SIZE]], 'Quiet': True}
+        )
+
+
+def _list_objects(s3_client, bucket, prefix):
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        yield from page.get('Contents', [])
+
+
+def expire_snapshots(s3_client, bucket, table_name, retention_hours=DEFAULT_RETENTION_HOURS, now=None):
+    """
+    Delete what no reader can still be using
+
+    A snapshot is retained while it is current or was superseded less than
+    ``retention_hours`` ago; older history entries are deleted. Data files
+    under the table location that no retained snapshot references and that
+    are older than the retention period are deleted too: files replaced by
+    later commits as well as uploads of commits that never landed. Returns
+    ``{'expired_snapshots', 'deleted_files'}``.
+    """
+    current, _ = load_current_snapshot(s3_client, bucket, table_name)
+    if current is None:
+        return {'expired_snapshots': 0, 'deleted_files': 0}
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(hours=retention_hours)
+
+    history = [(int(obj['Key'].rsplit('/', 1)[-1].split('-')[0]), obj)
+               for obj in _list_objects(s3_client, bucket, f"{manifest_prefix(table_name)}snapshots/")]
+    # A sequence is superseded when the next one is written
+    written = {}
+    for sequence, obj in history:
+        written[sequence] = min(written.get(sequence, obj['LastModified']), obj['LastModified'])
+    sequences = sorted(written)
+    superseded_at = dict(zip(sequences, (written[s] for s in sequences[1:])))
+
+    retained, expired = [], []
+    for sequence, obj in history:
+        if (obj['Key'].endswith(f"-{current['snapshot_id']}.json")
+                or sequence not in superseded_at or superseded_at[sequence] >= cutoff):
+            retained.append(obj['Key'])
+        else:
+            expired.append(obj['Key'])
+
+    referenced = {f['key'] for f in current['files']}
+    for key in retained:
+        snapshot = json.loads(s3_client.get_object(Bucket=bucket, Key=key)['Body'].read())
+        referenced.update(f['key'] for f in snapshot['files'])
+
+    data_prefix = current['table_location'].split('://', 1)[-1].split('/', 1)[-1]
+    unreferenced = [
+        obj['Key'] for obj in _list_objects(s3_client, bucket, data_prefix)
+        if obj['Key'].endswith('.parquet') and obj['Key'] not in referenced and obj['LastModified'] < cutoff
+    ]
+
+    _delete_keys(s3_client, bucket, expired)
+    _delete_keys(s3_client, bucket, unreferenced)
+    if expired or unreferenced:
+        logger.info(f"Expired {len(expired)} snapshot(s) and {len(unreferenced)} data file(s) of {table_name}")
+    return {'expired_snapshots': len(expired), 'deleted_files': len(unreferenced)}
+
+
+def committed_tables(s3_client, bucket):
+    """Names of the tables with a snapshot log"""
+    paginator = s3_client.get_paginator('list_objects_v2')
+    tables = []
+    for page in paginator.paginate(Bucket=bucket, Prefix=MANIFEST_ROOT, Delimiter='/'):
+        tables += [p['Prefix'][len(MANIFEST_ROOT):].rstrip('/') for p in page.get('CommonPrefixes', [])]
+    return tables
+
+
+def main():
+    import boto3
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description='Expire superseded snapshots and data files of committed tables')
+    parser.add_argument('--bucket', default='africlimate-analytics-lake')
+    parser.add_argument('--tables', nargs='+', help='Only these tables (default: every committed table)')
+    parser.add_argument('--retention-hours', type=float, default=DEFAULT_RETENTION_HOURS,
+                        help='Keep superseded files this long after the commit that replaced them')
+    args = parser.parse_args()
+
+    s3 = boto3.client('s3')
+    for table_name in args.tables or committed_tables(s3, args.bucket):
+        expired = expire_snapshots(s3, args.bucket, table_name, args.retention_hours)
+        print(f"🧹 {table_name}: {expired['expired_snapshots']} snapshot(s), "
+              f"{expired['deleted_files']} data file(s) expired")
+
+
+if __name__ == "__main__":
+    main()
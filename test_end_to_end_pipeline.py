@@ -9,6 +9,8 @@ import json
 import time
 from datetime import datetime
 
+from athena_client import AthenaClient, QueryFailed
+
 # Configuration
 AWS_REGION = 'af-south-1'
 
@@ -130,7 +132,7 @@ def test_sns_topics():
 def test_athena_queries():
     """Test Athena queries can run"""
     
-    athena_client = boto3.client('athena', region_name=AWS_REGION)
+    athena = AthenaClient(region_name=AWS_REGION)
     
     try:
         print("🔍 Testing Athena queries...")
@@ -138,37 +140,16 @@ def test_athena_queries():
         # Test simple query
         query = "SELECT COUNT(*) as total_files FROM africlimate_climate_db.chirps_monthly_processed LIMIT 1"
         
-        response = athena_client.start_query_execution(
-            QueryString=query,
-            QueryExecutionContext={'Database': 'africlimate_climate_db'},
-            ResultConfiguration={'OutputLocation': 's3://africlimate-analytics-lake/athena-results/'}
-        )
-        
-        query_execution_id = response['QueryExecutionId']
-        print(f"✅ Athena query started: {query_execution_id}")
-        
-        # Wait for completion
-        for i in range(20):  # Wait up to 3 minutes
-            try:
-                result = athena_client.get_query_execution(QueryExecutionId=query_execution_id)
-                status = result['QueryExecution']['Status']['State']
-                
-                if status == 'SUCCEEDED':
-                    print(f"✅ Athena query completed successfully")
-                    return True
-                elif status == 'FAILED':
-                    print(f"❌ Athena query failed: {result['QueryExecution']['Status']['StateChangeReason']}")
-                    return False
-                
-                time.sleep(10)
-                
-            except Exception as e:
-                print(f"   Error checking query status: {e}")
-                break
+        table, stats = athena.query_arrow(query, timeout=180)
+        print(f"✅ Athena query completed successfully: {stats['query_execution_id']}")
+        print(f"   {stats['engine_ms']} ms engine, {stats['queue_ms']} ms queued, "
+              f"{stats['bytes_scanned']} bytes scanned, {stats['polls']} polls")
+        print(f"   Result: {table.to_pylist()}")
+        return True
         
-        print("⚠️ Athena query timed out")
+    except QueryFailed as e:
+        print(f"❌ Athena query failed: {e.reason}")
         return False
-        
     except Exception as e:
         print(f"❌ Athena test failed: {e}")
         return False
@@ -0,0 +1,7 @@
+"""Make the Lambda modules (repository root) and the scripts importable"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'scripts')]
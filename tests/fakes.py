@@ -0,0 +1,140 @@
+"""In-memory stand-ins for the boto3 clients the lake code calls"""
+
+from datetime import datetime, timedelta, timezone
+
+from botocore.exceptions import ClientError
+
+
+def client_error(code, operation):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, operation)
+
+
+class FakeS3:
+    """
+    Object store with ETags, LastModified times and S3's conditional writes
+    (IfMatch / IfNoneMatch). ``now`` is the clock new objects are stamped
+    with; ``advance`` moves it forward.
+    """
+
+    class exceptions:
+        class NoSuchKey(ClientError):
+            def __init__(self, operation):
+                super().__init__({'Error': {'Code': 'NoSuchKey', 'Message': 'NoSuchKey'}}, operation)
+
+    def __init__(self):
+        self.objects = {}
+        self.version = 0
+        self.now = datetime(2024, 6, 1, tzinfo=timezone.utc)
+        # Called with the key before the next conditional write, to inject a racing writer
+        self.before_conditional_put = None
+
+    def advance(self, **delta):
+        self.now += timedelta(**delta)
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise self.exceptions.NoSuchKey('GetObject')
+        body, etag, _ = self.objects[Key]
+
+        class Body:
+            def read(self):
+                return body
+        return {'Body': Body(), 'ETag': etag}
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise client_error('404', 'HeadObject')
+        _, etag, modified = self.objects[Key]
+        return {'ETag': etag, 'LastModified': modified}
+
+    def put_object(self, Bucket, Key, Body, IfMatch=None, IfNoneMatch=None, **kwargs):
+        if (IfMatch or IfNoneMatch) and self.before_conditional_put:
+            hook, self.before_conditional_put = self.before_conditional_put, None
+            hook(Key)
+        current = self.objects.get(Key)
+        if (IfNoneMatch and current) or (IfMatch and (not current or current[1] != IfMatch)):
+            raise client_error('PreconditionFailed', 'PutObject')
+        self.version += 1
+        etag = f'"{self.version}"'
+        self.objects[Key] = (Body.encode() if isinstance(Body, str) else Body, etag, self.now)
+        return {'ETag': etag}
+
+    def upload_file(self, Filename, Bucket, Key):
+        with open(Filename, 'rb') as f:
+            self.put_object(Bucket=Bucket, Key=Key, Body=f.read())
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+
+    def delete_objects(self, Bucket, Delete):
+        for obj in Delete['Objects']:
+            self.objects.pop(obj['Key'], None)
+        return {'Deleted': Delete['Objects']}
+
+    def get_paginator(self, name):
+        objects = self.objects
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix='', Delimiter=None, StartAfter=''):
+                contents, prefixes = [], set()
+                for key in sorted(objects):
+                    if not key.startswith(Prefix) or key <= StartAfter:
+                        continue
+                    rest = key[len(Prefix):]
+                    if Delimiter and Delimiter in rest:
+                        prefixes.add(Prefix + rest.split(Delimiter)[0] + Delimiter)
+                        continue
+                    contents.append({'Key': key, 'ETag': objects[key][1], 'LastModified': objects[key][2],
+                                     'Size': len(objects[key][0])})
+                yield {'Contents': contents, 'CommonPrefixes': [{'Prefix': p} for p in sorted(prefixes)]}
+        return Paginator()
+
+
+class FakeGlue:
+    """One catalog table with its partitions, recording every call"""
+
+    def __init__(self, columns, table_version, existing=None):
+        self.partitions = dict(existing or {})
+        self.table = {
+            'Name': 'enriched_climate',
+            'Parameters': {'schema_version': table_version},
+            'PartitionKeys': [{'Name': 'year', 'Type': 'int'}, {'Name': 'month', 'Type': 'int'}],
+            'StorageDescriptor': {'Location': 's3://b/processed/enriched_climate',
+                                  'Columns': [{'Name': n, 'Type': t} for n, t in columns]}
+        }
+        self.calls = []
+
+    def get_table(self, DatabaseName, Name):
+        self.calls.append(('get_table', None))
+        return {'Table': self.table}
+
+    def update_table(self, DatabaseName, TableInput):
+        self.calls.append(('update_table', TableInput['Parameters']['schema_version']))
+
+    def batch_create_partition(self, DatabaseName, TableName, PartitionInputList):
+        self.calls.append(('batch_create_partition', len(PartitionInputList)))
+        errors = []
+        for partition in PartitionInputList:
+            values = tuple(partition['Values'])
+            if values in self.partitions:
+                errors.append({'PartitionValues': list(values),
+                               'ErrorDetail': {'ErrorCode': 'AlreadyExistsException'}})
+            else:
+                self.partitions[values] = partition
+        return {'Errors': errors}
+
+    def batch_get_partition(self, DatabaseName, TableName, PartitionsToGet):
+        return {'Partitions': [{'Values': p['Values'], **self.partitions[tuple(p['Values'])]}
+                               for p in PartitionsToGet]}
+
+    def batch_update_partition(self, DatabaseName, TableName, Entries):
+        self.calls.append(('batch_update_partition', len(Entries)))
+        for entry in Entries:
+            self.partitions[tuple(entry['PartitionValueList'])] = entry['PartitionInput']
+        return {'Errors': []}
+
+    def count(self, name):
+        return [size for call, size in self.calls if call == name]
+
+    def location(self, values):
+        return self.partitions[values]['StorageDescriptor']['Location']
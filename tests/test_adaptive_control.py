@@ -0,0 +1,43 @@
+"""Per-host rate limiting of the transfer engine"""
+
+import adaptive_control
+from adaptive_control import TokenBucket
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_rate_grows_one_step_per_quiet_interval(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(adaptive_control.time, 'monotonic', clock)
+    bucket = TokenBucket(100.0, increase_step=5.0, quiet_interval=1.0)
+
+    for _ in range(50):
+        bucket.on_success()
+    assert bucket.rate == 100.0
+
+    clock.now += 1.0
+    for _ in range(50):
+        bucket.on_success()
+    assert bucket.rate == 105.0
+
+
+def test_throttle_halves_the_rate_and_restarts_the_interval(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(adaptive_control.time, 'monotonic', clock)
+    bucket = TokenBucket(100.0, increase_step=5.0, quiet_interval=1.0)
+
+    clock.now += 5.0
+    bucket.on_throttle()
+    assert bucket.rate == 50.0
+    clock.now += 0.5
+    bucket.on_success()
+    assert bucket.rate == 50.0
+    clock.now += 0.5
+    bucket.on_success()
+    assert bucket.rate == 55.0
@@ -0,0 +1,72 @@
+"""Cache keys and tiers of the Athena result cache"""
+
+import pyarrow as pa
+
+import athena_cache
+from athena_cache import QueryResultCache, normalize_sql, referenced_tables
+from fakes import FakeS3
+
+MANIFEST_KEY = 'processed/_manifests/enriched_climate/current.json'
+
+
+class FakeAthena:
+    database = 'africlimate_climate_db'
+    max_concurrency = 4
+
+    def __init__(self):
+        self.queries = []
+
+    def query_arrow(self, sql, output_location=None, timeout=None):
+        self.queries.append(sql)
+        return pa.table({'year': [2024]}), {'query_execution_id': f'q{len(self.queries)}', 'bytes_scanned': 512}
+
+
+def test_normalize_sql_ignores_comments_case_and_spacing():
+    assert normalize_sql("SELECT  a -- note\n FROM T WHERE s = 'Ab  C';") == "select a from t where s = 'Ab  C'"
+
+
+def test_referenced_tables_skip_ctes_literals_and_extract():
+    sql = normalize_sql(
+        "WITH recent AS (SELECT * FROM db.enriched_climate) "
+        "SELECT extract(year FROM analysis_date), substring(name FROM 2) FROM recent "
+        "JOIN db.drought_alerts d ON d.note = 'from nowhere'"
+    )
+    assert referenced_tables(sql) == ['drought_alerts', 'enriched_climate']
+
+
+def test_hits_until_the_table_commits(tmp_path):
+    s3, athena = FakeS3(), FakeAthena()
+    s3.put_object(Bucket='b', Key=MANIFEST_KEY, Body='{}')
+    cache = QueryResultCache(athena, s3, bucket='b', local_dir=str(tmp_path / 'a'))
+    sql = 'SELECT year FROM africlimate_climate_db.enriched_climate'
+
+    assert cache.query(sql)[1]['cache'] == 'miss'
+    assert cache.query(sql.lower() + ';')[1]['cache'] == 'local'
+    shared = QueryResultCache(athena, s3, bucket='b', local_dir=str(tmp_path / 'b'))
+    assert shared.query(sql)[1]['cache'] == 's3'
+    assert len(athena.queries) == 1
+
+    s3.put_object(Bucket='b', Key=MANIFEST_KEY, Body='{"sequence_number": 2}')
+    assert cache.query(sql)[1]['cache'] == 'miss'
+    assert len(athena.queries) == 2
+
+
+def test_tables_without_watermark_need_a_ttl(tmp_path):
+    cache = QueryResultCache(FakeAthena(), FakeS3(), bucket='b', local_dir=str(tmp_path))
+    sql = 'SELECT * FROM drought_alerts'
+    assert cache.query(sql)[1]['cache'] == 'bypass'
+    assert cache.query(sql, ttl_seconds=3600)[1]['cache'] == 'miss'
+    assert cache.query(sql, ttl_seconds=3600)[1]['cache'] == 'local'
+
+
+def test_cached_query_reuses_one_cache_across_invocations(tmp_path, monkeypatch):
+    s3, athena = FakeS3(), FakeAthena()
+    s3.put_object(Bucket='b', Key=MANIFEST_KEY, Body='{}')
+    monkeypatch.setattr(athena_cache, '_shared_cache', None)
+    monkeypatch.setattr(athena_cache, 'QueryResultCache',
+                        lambda: QueryResultCache(athena, s3, bucket='b', local_dir=str(tmp_path)))
+    sql = 'SELECT year FROM enriched_climate'
+
+    assert athena_cache.cached_query(sql)[1]['cache'] == 'miss'
+    assert athena_cache.cached_query(sql)[1]['cache'] == 'local'
+    assert len(athena.queries) == 1
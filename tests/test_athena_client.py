@@ -0,0 +1,48 @@
+"""Execution statistics recorded by the shared Athena client"""
+
+import pytest
+from botocore.exceptions import ClientError
+
+from athena_client import AthenaClient, QueryFailed
+
+
+class FakeAthena:
+    def __init__(self, state='SUCCEEDED', start_error=None):
+        self.state = state
+        self.start_error = start_error
+
+    def start_query_execution(self, **request):
+        if self.start_error:
+            raise ClientError({'Error': {'Code': self.start_error, 'Message': 'no'}}, 'StartQueryExecution')
+        return {'QueryExecutionId': 'q-1'}
+
+    def get_query_execution(self, QueryExecutionId):
+        return {'QueryExecution': {
+            'QueryExecutionId': QueryExecutionId,
+            'Status': {'State': self.state, 'StateChangeReason': 'COLUMN_NOT_FOUND'},
+            'Statistics': {'EngineExecutionTimeInMillis': 900, 'QueryQueueTimeInMillis': 40,
+                           'TotalExecutionTimeInMillis': 950, 'DataScannedInBytes': 2048}
+        }}
+
+
+def test_failed_query_records_athena_statistics():
+    client = AthenaClient(FakeAthena(state='FAILED'), database='db')
+    with pytest.raises(QueryFailed) as failure:
+        client.execute('SELECT missing FROM t')
+
+    assert failure.value.polls == 1
+    assert failure.value.execution['Statistics']['DataScannedInBytes'] == 2048
+    [stats] = client.executions
+    assert (stats['state'], stats['polls'], stats['bytes_scanned'], stats['engine_ms']) == ('FAILED', 1, 2048, 900)
+    assert client.summary()['failed'] == 1
+    assert client.summary()['bytes_scanned'] == 2048
+
+
+def test_start_failure_is_recorded():
+    client = AthenaClient(FakeAthena(start_error='InvalidRequestException'), database='db')
+    with pytest.raises(ClientError):
+        client.execute('SELECT 1')
+
+    summary = client.summary()
+    assert (summary['queries'], summary['failed'], summary['not_started']) == (1, 1, 1)
+    assert client.executions[0]['query_execution_id'] is None
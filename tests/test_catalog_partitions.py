@@ -0,0 +1,54 @@
+"""Direct Glue partition registration"""
+
+import pytest
+
+import catalog_partitions
+from catalog_partitions import BATCH_SIZE, register_partitions, schema_version
+from fakes import FakeGlue
+
+COLUMNS = [('latitude', 'double'), ('precipitation', 'double')]
+
+
+@pytest.fixture(autouse=True)
+def fresh_process_state():
+    catalog_partitions._registered.clear()
+    catalog_partitions._tables.clear()
+
+
+def months(count):
+    return [{'year': 2000 + i // 12, 'month': i % 12 + 1} for i in range(count)]
+
+
+def test_partitions_are_created_in_batches_of_100():
+    glue = FakeGlue(COLUMNS, schema_version(COLUMNS))
+    assert register_partitions(glue, 'db', 'enriched_climate', months(250), COLUMNS) == 250
+    assert glue.count('batch_create_partition') == [BATCH_SIZE, BATCH_SIZE, 50]
+    assert glue.partitions[('2000', '03')]['StorageDescriptor']['Location'] == \
+        's3://b/processed/enriched_climate/year=2000/month=03/'
+
+
+def test_repeats_are_skipped_before_any_call():
+    glue = FakeGlue(COLUMNS, schema_version(COLUMNS))
+    register_partitions(glue, 'db', 'enriched_climate', months(3) + months(3), COLUMNS)
+    assert glue.count('batch_create_partition') == [3]
+
+    assert register_partitions(glue, 'db', 'enriched_climate', months(3), COLUMNS) == 0
+    assert glue.count('batch_create_partition') == [3]
+
+
+def test_existing_partitions_are_updated_only_when_their_schema_changed():
+    current = {'Parameters': {'schema_version': schema_version(COLUMNS)}}
+    stale = {'Parameters': {'schema_version': 'old'}}
+    glue = FakeGlue(COLUMNS, schema_version(COLUMNS), existing={('2000', '01'): current, ('2000', '02'): stale})
+
+    assert register_partitions(glue, 'db', 'enriched_climate', months(3), COLUMNS) == 2
+    assert glue.count('batch_update_partition') == [1]
+    assert glue.partitions[('2000', '02')]['Parameters']['schema_version'] == schema_version(COLUMNS)
+
+
+def test_new_writer_schema_updates_the_table_once():
+    glue = FakeGlue(COLUMNS, 'old')
+    wider = COLUMNS + [('data_quality', 'string')]
+    register_partitions(glue, 'db', 'enriched_climate', months(1), wider)
+    register_partitions(glue, 'db', 'enriched_climate', months(2), wider)
+    assert glue.count('update_table') == [schema_version(wider)]
@@ -0,0 +1,33 @@
+"""Progress and run statistics of ingestion runs"""
+
+import random
+
+from ingestion_telemetry import IngestionTelemetry, LatencyHistogram, percentile
+
+
+def result(seconds, filename='f.tif', success=True):
+    return {'filename': filename, 'seconds': seconds, 'bytes': 1024, 'attempts': 1, 'success': success}
+
+
+def test_live_percentiles_are_within_one_bucket_of_exact():
+    rng = random.Random(7)
+    samples = [rng.lognormvariate(0, 1) for _ in range(5000)]
+    histogram = LatencyHistogram()
+    for seconds in samples:
+        histogram.add(seconds)
+    samples.sort()
+    for pct in (50, 95, 99):
+        exact = percentile(samples, pct)
+        assert exact <= histogram.percentile(pct) <= exact * histogram.ratio
+    assert histogram.percentile(100) == samples[-1]
+
+
+def test_report_has_exact_percentiles_and_slowest_files():
+    telemetry = IngestionTelemetry(total=4)
+    for i, seconds in enumerate([0.2, 3.0, 0.5, 1.25]):
+        telemetry.record(result(seconds, f"f{i}.tif"))
+
+    report = telemetry.report(run='test')
+    assert report['latency_seconds'] == {'p50': 0.5, 'p95': 3.0, 'p99': 3.0, 'max': 3.0}
+    assert [f['filename'] for f in report['slowest_files']] == ['f1.tif', 'f3.tif', 'f2.tif', 'f0.tif']
+    assert 'p95' in telemetry.progress_line()
@@ -0,0 +1,41 @@
+"""Parquet encoding of the ETL Lambda"""
+
+import glob
+
+import numpy as np
+import pytest
+
+import lambda_etl_function as etl
+from raster_datasets import get_dataset
+
+DATASET = get_dataset('chirps_monthly')
+PARTITION = {'year': 2024, 'month': 1}
+
+
+@pytest.fixture(autouse=True)
+def runtime():
+    etl._load_runtime()
+
+
+def local_files():
+    return set(glob.glob(f"/tmp/{DATASET['file_stem']}_2024_01-*.parquet"))
+
+
+def test_batches_become_row_groups_of_one_file():
+    path, rows = etl.write_parquet_file(iter([{'a': np.arange(3.0)}, {'a': np.arange(2.0)}]), DATASET, PARTITION)
+    try:
+        assert rows == 5
+        assert etl.pq.ParquetFile(path).metadata.num_row_groups == 2
+    finally:
+        etl.os.remove(path)
+
+
+def test_failed_encode_leaves_no_partial_file():
+    def batches():
+        yield {'a': np.arange(3.0)}
+        raise IOError('raster read failed')
+
+    before = local_files()
+    with pytest.raises(IOError):
+        etl.write_parquet_file(batches(), DATASET, PARTITION)
+    assert local_files() == before
@@ -0,0 +1,155 @@
+"""Refresh planning and state locking of the materialized QuickSight tables"""
+
+import json
+import re
+from datetime import date, datetime, timedelta
+
+import pyarrow as pa
+import pytest
+
+import fakes
+import materialized_views as mv
+
+DATASET = 'water_security'
+TABLE_PREFIX = mv.table_prefix(DATASET)
+
+
+class FakeS3(fakes.FakeS3):
+    def state(self):
+        return json.loads(self.objects[mv.state_key(DATASET)][0])
+
+    def files_per_day(self):
+        days = {}
+        for key in self.objects:
+            match = re.match(re.escape(TABLE_PREFIX) + r'partition_day=([\d-]+)/', key)
+            if match:
+                days[match.group(1)] = days.get(match.group(1), 0) + 1
+        return days
+
+
+class FakeAthena:
+    """Source rows by day; INSERT INTO writes one file per day in the statement's range"""
+
+    max_concurrency = 2
+
+    def __init__(self, s3, source_days, fail_inserts=0, fail_reads=0):
+        self.s3 = s3
+        self.source_days = source_days
+        self.fail_inserts = fail_inserts
+        self.fail_reads = fail_reads
+        self.sql = []
+
+    def execute(self, sql, *args, **kwargs):
+        self.sql.append(sql)
+        if sql.startswith('INSERT INTO'):
+            if self.fail_inserts:
+                self.fail_inserts -= 1
+                raise RuntimeError('insert failed')
+            start = re.search(r">= '([\d-]+)'", sql).group(1)
+            stop = re.search(r"< '([\d-]+)'", sql)
+            for day in self.source_days:
+                if day >= start and (not stop or day < stop.group(1)):
+                    key = f"{TABLE_PREFIX}partition_day={day}/{len(self.sql)}.parquet"
+                    self.s3.put_object(Bucket='b', Key=key, Body=b'')
+        return {'bytes_scanned': 100}
+
+    def query_arrow(self, sql, *args, **kwargs):
+        self.sql.append(sql)
+        if 'DISTINCT' in sql:
+            return pa.table({'day': sorted(self.source_days)}), {'bytes_scanned': 10}
+        if self.fail_reads:
+            self.fail_reads -= 1
+            raise RuntimeError('read failed')
+        since = re.search(r">= '([\d-]+)'", sql).group(1)
+        written = [day for day in self.s3.files_per_day() if day >= since]
+        return pa.table({'day': [max(written) if written else None]}), {'bytes_scanned': 1}
+
+    def inserts(self):
+        return [sql for sql in self.sql if sql.startswith('INSERT INTO')]
+
+
+def days_ago(*offsets):
+    return [(date.today() - timedelta(days=offset)).isoformat() for offset in offsets]
+
+
+def test_first_build_writes_at_most_100_days_per_statement():
+    s3 = FakeS3()
+    athena = FakeAthena(s3, days_ago(*range(249, -1, -1)))
+    summary = mv.refresh_table(athena, s3, DATASET, bucket='b')
+
+    assert len(athena.inserts()) == 3
+    assert all("analysis_date >= '" in sql for sql in athena.inserts())
+    assert summary['watermark'] == days_ago(0)[0]
+    assert s3.state()['status'] == 'idle'
+    assert set(s3.files_per_day().values()) == {1}
+
+
+def test_refresh_rewrites_the_watermark_day_once():
+    s3 = FakeS3()
+    athena = FakeAthena(s3, days_ago(3, 2))
+    mv.refresh_table(athena, s3, DATASET, bucket='b')
+    athena.source_days += days_ago(1, 0)
+    athena.sql.clear()
+
+    summary = mv.refresh_table(athena, s3, DATASET, bucket='b')
+    assert not any('DISTINCT' in sql for sql in athena.sql)
+    assert len(athena.inserts()) == 1
+    assert summary['previous_watermark'] == days_ago(2)[0]
+    assert summary['watermark'] == days_ago(0)[0]
+    assert s3.files_per_day() == {day: 1 for day in days_ago(3, 2, 1, 0)}
+
+
+def test_running_refresh_holds_the_lock():
+    s3 = FakeS3()
+    athena = FakeAthena(s3, days_ago(1, 0))
+    mv.refresh_table(athena, s3, DATASET, bucket='b')
+    state, etag = mv.load_state(s3, DATASET, 'b')
+    mv.save_state(s3, DATASET, {**state, 'status': 'refreshing',
+                                'refreshing_since': datetime.utcnow().isoformat()}, etag, 'b')
+    files = dict(s3.files_per_day())
+    athena.sql.clear()
+
+    with pytest.raises(mv.RefreshInProgress):
+        mv.refresh_table(athena, s3, DATASET, bucket='b')
+    assert athena.sql == []
+    assert s3.files_per_day() == files
+
+
+def test_failed_insert_keeps_the_watermark_for_the_next_refresh():
+    s3 = FakeS3()
+    athena = FakeAthena(s3, days_ago(2, 1))
+    mv.refresh_table(athena, s3, DATASET, bucket='b')
+    athena.source_days.append(days_ago(0)[0])
+    athena.fail_inserts = 1
+
+    with pytest.raises(RuntimeError):
+        mv.refresh_table(athena, s3, DATASET, bucket='b')
+    assert s3.state()['status'] == 'failed'
+    assert s3.state()['watermark'] == days_ago(1)[0]
+
+    mv.refresh_table(athena, s3, DATASET, bucket='b')
+    assert s3.files_per_day() == {day: 1 for day in days_ago(2, 1, 0)}
+
+
+def test_days_written_by_an_unrecorded_insert_are_not_duplicated():
+    s3 = FakeS3()
+    athena = FakeAthena(s3, days_ago(3, 2))
+    mv.refresh_table(athena, s3, DATASET, bucket='b')
+    athena.source_days += days_ago(1, 0)
+    # The INSERT lands, but recording its watermark fails
+    athena.fail_reads = 1
+
+    with pytest.raises(RuntimeError):
+        mv.refresh_table(athena, s3, DATASET, bucket='b')
+    assert s3.state()['watermark'] == days_ago(2)[0]
+    assert s3.files_per_day() == {day: 1 for day in days_ago(3, 2, 1, 0)}
+
+    mv.refresh_table(athena, s3, DATASET, bucket='b')
+    assert s3.files_per_day() == {day: 1 for day in days_ago(3, 2, 1, 0)}
+    assert s3.state()['watermark'] == days_ago(0)[0]
+
+
+def test_quicksight_sql_reads_the_materialized_columns():
+    sql = mv.quicksight_sql(DATASET)
+    assert 'FROM africlimate_climate_db.mv_water_security' in sql
+    assert all(column in sql for column in mv.MATERIALIZED_TABLES[DATASET]['columns'])
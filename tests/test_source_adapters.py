@@ -0,0 +1,63 @@
+"""Streaming parsers and pages of the external source adapters"""
+
+import pytest
+from requests.structures import CaseInsensitiveDict
+
+from source_adapters import HttpTransport, parse_csv, parse_json_array
+
+
+def test_json_array_number_split_across_chunks():
+    assert list(parse_json_array([b'[12', b'34, 5]'])) == [1234, 5]
+
+
+def test_json_array_values_split_at_every_byte():
+    document = b'[{"dam": "Vaal", "percent": 75.25}, "caf\xc3\xa9", -3e2, true, null, [1, 2]]'
+    chunks = [document[i:i + 1] for i in range(len(document))]
+    assert list(parse_json_array(chunks)) == [
+        {'dam': 'Vaal', 'percent': 75.25}, 'café', -300.0, True, None, [1, 2]
+    ]
+
+
+def test_json_array_empty():
+    assert list(parse_json_array([b' [', b' ] '])) == []
+
+
+@pytest.mark.parametrize('document', [b'[1 2]', b'[1,,2]', b'[1,2,]', b'[,1]', b'{"a": 1}'])
+def test_json_array_rejects_bad_separators(document):
+    with pytest.raises(ValueError):
+        list(parse_json_array([document]))
+
+
+def test_json_array_truncated():
+    with pytest.raises(ValueError):
+        list(parse_json_array([b'[1, 2']))
+
+
+def test_csv_quoted_field_spanning_chunks():
+    chunks = [b'dam,note\nVaal,"low', b'\nlevel"\nKatse,ok\n']
+    assert list(parse_csv(chunks)) == [{'dam': 'Vaal', 'note': 'low\nlevel'}, {'dam': 'Katse', 'note': 'ok'}]
+
+
+class _Response:
+    def __init__(self, headers):
+        self.headers = CaseInsensitiveDict(headers)
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, size):
+        return iter([b''])
+
+
+class _Session:
+    def __init__(self, headers):
+        self.headers = headers
+
+    def get(self, url, stream=False, timeout=None):
+        return _Response(self.headers)
+
+
+def test_page_link_header_is_case_insensitive():
+    page = HttpTransport(_Session({'link': '<https://example.org/p2>; rel="next"'})).get('https://example.org/p1')
+    assert page.links == {'next': 'https://example.org/p2'}
+    assert page.headers['Link'] == page.headers['link']
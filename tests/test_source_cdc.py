@@ -0,0 +1,35 @@
+"""Change capture of external source snapshots"""
+
+from datetime import datetime
+
+from source_cdc import diff_records, record_hash
+
+OBSERVED = datetime(2024, 3, 1, 6, 0)
+
+
+def dam(dam_id, percent, observed_at=OBSERVED):
+    return {'dam_id': dam_id, 'capacity_percent': percent, 'observed_at': observed_at}
+
+
+def test_volatile_fields_do_not_change_the_hash():
+    assert record_hash(dam('vaal_dam', 75.2)) == record_hash(dam('vaal_dam', 75.2, datetime(2024, 3, 2)))
+    assert record_hash(dam('vaal_dam', 75.2)) != record_hash(dam('vaal_dam', 74.9))
+
+
+def test_diff_emits_inserts_updates_and_deletes():
+    state = {
+        'vaal_dam': {'hash': record_hash(dam('vaal_dam', 75.2)), 'valid_from': '2024-02-01T00:00:00'},
+        'katse_dam': {'hash': record_hash(dam('katse_dam', 60.0)), 'valid_from': '2024-02-01T00:00:00'},
+        'grootvlei_dam': {'hash': record_hash(dam('grootvlei_dam', 68.5)), 'valid_from': '2024-02-01T00:00:00'}
+    }
+    rows = [dam('vaal_dam', 75.2), dam('katse_dam', 58.5), dam('sterkfontein_dam', 92.1)]
+
+    changes, new_state, unchanged = diff_records('dam_levels', rows, state, OBSERVED)
+
+    assert unchanged == 1
+    assert {c['record_key']: c['change_type'] for c in changes} == {
+        'katse_dam': 'update', 'sterkfontein_dam': 'insert', 'grootvlei_dam': 'delete'
+    }
+    assert new_state['vaal_dam'] == state['vaal_dam']
+    assert new_state['katse_dam']['valid_from'] == OBSERVED.isoformat()
+    assert set(new_state) == {'vaal_dam', 'katse_dam', 'sterkfontein_dam'}
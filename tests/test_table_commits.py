@@ -0,0 +1,152 @@
+"""Snapshot commits of processed tables"""
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import catalog_partitions
+import lambda_etl_function as etl
+import table_commits
+from fakes import FakeGlue, FakeS3
+from raster_datasets import get_dataset
+from table_commits import (
+    commit_files,
+    expire_snapshots,
+    load_current_snapshot,
+    manifest_prefix,
+    partition_directory,
+    plan_files
+)
+
+TABLE = 'enriched_climate'
+LOCATION = 's3://b/processed/enriched_climate/'
+
+
+def data_file(s3, key, month, records=10, precip=(0.0, 50.0)):
+    s3.put_object(Bucket='b', Key=key, Body=b'')
+    return {
+        'key': key,
+        'partition': {'year': 2024, 'month': month},
+        'record_count': records,
+        'size_bytes': 100,
+        'column_stats': {'precipitation': {'min': precip[0], 'max': precip[1], 'null_count': 0}}
+    }
+
+
+def history_keys(s3):
+    return sorted(k for k in s3.objects if k.startswith(f"{manifest_prefix(TABLE)}snapshots/"))
+
+
+@pytest.fixture
+def s3():
+    return FakeS3()
+
+
+@pytest.fixture(autouse=True)
+def fresh_catalog_state():
+    catalog_partitions._registered.clear()
+    catalog_partitions._tables.clear()
+
+
+def test_partition_directory_is_unique_per_commit():
+    assert partition_directory('processed/enriched_climate/', {'year': 2024, 'month': 3}, 'abc') == \
+        'processed/enriched_climate/year=2024/month=03/commit=abc/'
+
+
+def test_replacing_a_partition_keeps_superseded_files_for_readers(s3):
+    commit_files(s3, 'b', TABLE, LOCATION,
+                 [data_file(s3, 'p/month=01/commit=a/f.parquet', 1), data_file(s3, 'p/month=02/commit=a/f.parquet', 2)])
+    previous, _ = load_current_snapshot(s3, 'b', TABLE)
+    snapshot = commit_files(s3, 'b', TABLE, LOCATION, [data_file(s3, 'p/month=01/commit=b/f.parquet', 1)])
+
+    assert snapshot['sequence_number'] == 2
+    assert sorted(f['key'] for f in snapshot['files']) == ['p/month=01/commit=b/f.parquet',
+                                                          'p/month=02/commit=a/f.parquet']
+    assert snapshot['summary'] == {'added_files': 1, 'removed_files': 1, 'total_files': 2, 'total_records': 20}
+    # A reader that planned from the previous snapshot can still read its files
+    assert all(f['key'] in s3.objects for f in plan_files(previous))
+    assert len(history_keys(s3)) == 2
+
+
+def test_conflicting_commit_is_rebased_on_the_winner(s3, monkeypatch):
+    monkeypatch.setattr(table_commits.time, 'sleep', lambda seconds: None)
+    commit_files(s3, 'b', TABLE, LOCATION, [data_file(s3, 'jan.parquet', 1)])
+
+    # Another writer commits March between our load and our pointer swap
+    s3.before_conditional_put = lambda key: commit_files(s3, 'b', TABLE, LOCATION, [data_file(s3, 'mar.parquet', 3)])
+    snapshot = commit_files(s3, 'b', TABLE, LOCATION, [data_file(s3, 'feb.parquet', 2)])
+
+    current, _ = load_current_snapshot(s3, 'b', TABLE)
+    assert current['snapshot_id'] == snapshot['snapshot_id']
+    assert current['sequence_number'] == 3
+    assert sorted(f['key'] for f in current['files']) == ['feb.parquet', 'jan.parquet', 'mar.parquet']
+    # The losing attempt's history entry is removed; one entry per landed commit remains
+    assert len(history_keys(s3)) == 3
+
+
+def test_expire_keeps_files_until_the_retention_period_has_passed(s3):
+    old = 'processed/enriched_climate/year=2024/month=01/commit=a/f.parquet'
+    new = 'processed/enriched_climate/year=2024/month=01/commit=b/f.parquet'
+    orphan = 'processed/enriched_climate/year=2024/month=01/commit=c/f.parquet'
+    commit_files(s3, 'b', TABLE, LOCATION, [data_file(s3, old, 1)])
+    s3.advance(hours=1)
+    data_file(s3, orphan, 1)
+    commit_files(s3, 'b', TABLE, LOCATION, [data_file(s3, new, 1)])
+
+    s3.advance(hours=23)
+    assert expire_snapshots(s3, 'b', TABLE, retention_hours=24, now=s3.now) == \
+        {'expired_snapshots': 0, 'deleted_files': 0}
+
+    s3.advance(hours=2)
+    assert expire_snapshots(s3, 'b', TABLE, retention_hours=24, now=s3.now) == \
+        {'expired_snapshots': 1, 'deleted_files': 2}
+    assert old not in s3.objects and orphan not in s3.objects
+    assert new in s3.objects
+    assert len(history_keys(s3)) == 1
+
+
+def test_failed_commit_deletes_the_upload(s3, tmp_path, monkeypatch):
+    monkeypatch.setattr(etl, 'S3_CLIENT', s3)
+    monkeypatch.setattr(etl, 'PROCESSED_BUCKET', 'b')
+    monkeypatch.setattr(etl, 'REGISTER_PARTITIONS', False)
+    monkeypatch.setattr(table_commits.time, 'sleep', lambda seconds: None)
+    local_path = str(tmp_path / 'part.parquet')
+    pq.write_table(pa.table({'latitude': [1.0], 'precipitation': [2.0]}), local_path)
+
+    commit_files(s3, 'b', TABLE, LOCATION, [data_file(s3, 'seed.parquet', 1)])
+    original_put = s3.put_object
+
+    # Every pointer swap loses to another writer
+    def always_conflicting(**kwargs):
+        if kwargs.get('IfMatch'):
+            kwargs['IfMatch'] = 'stale'
+        return original_put(**kwargs)
+    monkeypatch.setattr(s3, 'put_object', always_conflicting)
+
+    with pytest.raises(RuntimeError):
+        etl.publish_parquet_file(local_path, get_dataset('chirps_monthly'), {'year': 2024, 'month': 3})
+    assert [k for k in s3.objects if k.endswith('.parquet')] == ['seed.parquet']
+
+
+def test_catalog_follows_the_newest_commit():
+    columns = [('latitude', 'double')]
+    glue = FakeGlue(columns, catalog_partitions.schema_version(columns))
+    march = [{'year': 2024, 'month': 3}]
+
+    catalog_partitions.register_partitions(glue, 'db', TABLE, march, columns, [('s3://b/t/commit=a/', 4)])
+    assert glue.location(('2024', '03')) == 's3://b/t/commit=a/'
+    catalog_partitions.register_partitions(glue, 'db', TABLE, march, columns, [('s3://b/t/commit=b/', 5)])
+    assert glue.location(('2024', '03')) == 's3://b/t/commit=b/'
+
+    # A writer whose commit landed earlier but registers late does not point back
+    catalog_partitions.register_partitions(glue, 'db', TABLE, march, columns, [('s3://b/t/commit=z/', 3)])
+    assert glue.location(('2024', '03')) == 's3://b/t/commit=b/'
+    assert glue.count('batch_update_partition') == [1]
+
+
+def test_plan_files_prunes_by_partition_and_statistics(s3):
+    snapshot = {'files': [data_file(s3, 'jan.parquet', 1, precip=(0, 10)),
+                          data_file(s3, 'feb.parquet', 2, precip=(20, 90))]}
+    assert [f['key'] for f in plan_files(snapshot, {'month': 2})] == ['feb.parquet']
+    assert [f['key'] for f in plan_files(snapshot, {'precipitation': (50, None)})] == ['feb.parquet']
+    assert plan_files(None, {'month': 1}) == []
@@ -0,0 +1,41 @@
+"""Glue table definitions shared by the generator and the writers"""
+
+import external_tables
+from table_definitions import apply_definitions, external_tables as external_definitions, table_input
+
+
+class CatalogGlue:
+    class exceptions:
+        class AlreadyExistsException(Exception):
+            pass
+
+    def __init__(self):
+        self.tables = {}
+
+    def create_table(self, DatabaseName, TableInput):
+        if TableInput['Name'] in self.tables:
+            raise self.exceptions.AlreadyExistsException(TableInput['Name'])
+        self.tables[TableInput['Name']] = TableInput
+
+    def update_table(self, DatabaseName, TableInput):
+        self.tables[TableInput['Name']] = TableInput
+
+
+def test_writers_create_the_generated_definitions():
+    glue = CatalogGlue()
+    external_tables.ensure_tables(glue, 'dam_levels', bucket='b')
+    external_tables.ensure_tables(glue, 'dam_levels', bucket='b')
+
+    expected = {d['name']: table_input(d) for d in external_definitions('dam_levels', bucket='b')}
+    assert glue.tables == expected
+    assert glue.tables['external_dam_levels']['Parameters']['projection.enabled'] == 'true'
+
+
+def test_apply_updates_tables_the_writers_created():
+    glue = CatalogGlue()
+    external_tables.ensure_tables(glue, 'weather', bucket='b')
+    definitions = external_definitions('weather', bucket='b') + external_definitions('dam_levels', bucket='b')
+
+    applied = apply_definitions(glue, definitions)
+    assert applied == {'created': ['external_dam_levels', 'external_dam_levels_latest'],
+                       'updated': ['external_weather', 'external_weather_latest']}